@@ -1,3 +1,7 @@
+import re
+
+import numpy as np
+
 def apply_mutations(sequence, mutations):
     """
     Apply a list of mutations to a protein sequence.
@@ -46,6 +50,103 @@ def apply_mutations(sequence, mutations):
     return "".join(seq_list)
 
 
+MUTATION_RE = re.compile(r"([A-Za-z])(\d+)([A-Za-z])")
+
+def parse_mutations(mutations, report=True):
+    """
+    Parses mutation strings like 'A12V' into arrays.
+
+    Returns (positions, original, new, names): 0-indexed positions (int64), the
+    expected and new residues as uint8 codes and the mutation strings that
+    could be parsed, in the same order. Malformed strings are left out, and
+    printed when report is set.
+    """
+    positions, original, new, names = [], [], [], []
+    for mutation in mutations:
+        match = MUTATION_RE.fullmatch(mutation)
+        if match is None:
+            if report:
+                print(f"Invalid mutation format for {mutation}.")
+            continue
+        original.append(match.group(1))
+        positions.append(int(match.group(2)) - 1)
+        new.append(match.group(3))
+        names.append(mutation)
+    return (np.array(positions, dtype=np.int64),
+            np.frombuffer("".join(original).encode(), dtype=np.uint8),
+            np.frombuffer("".join(new).encode(), dtype=np.uint8),
+            names)
+
+def validate_mutations(wild_type, positions, original, names, max_warnings=10):
+    """
+    Checks all the mutations against the wild type sequence (a uint8 array) at once.
+
+    Returns the masks (in_range, mismatch). Mutations whose expected residue
+    does not match the wild type are kept, like apply_mutations does. The
+    first max_warnings problems are printed by name, followed by the counts.
+    """
+    in_range = (positions >= 0) & (positions < len(wild_type))
+    mismatch = np.zeros(len(positions), dtype=bool)
+    mismatch[in_range] = wild_type[positions[in_range]] != original[in_range]
+    if max_warnings:
+        for k in np.flatnonzero(~in_range)[:max_warnings]:
+            print(f"Position {positions[k] + 1} in mutation {names[k]} is out of range for the sequence length {len(wild_type)}.")
+        for k in np.flatnonzero(mismatch)[:max_warnings]:
+            print(f"Warning: At position {positions[k] + 1}, expected '{chr(original[k])}' but found '{chr(wild_type[positions[k]])}'. Applying mutation anyway.")
+        if np.count_nonzero(~in_range) or np.count_nonzero(mismatch):
+            print(f"{np.count_nonzero(~in_range)} mutations out of range, {np.count_nonzero(mismatch)} do not match the wild type.")
+    return in_range, mismatch
+
+def write_variant_records(outfile, buffer, positions, new, names, selected, deltas=False):
+    """
+    Writes the records of the selected mutations to an open binary file.
+
+    buffer is a bytearray holding the wild type. Every variant is made by
+    changing one byte of it and restoring it after its record is written.
+    With deltas only the mutation names are written, one per line, as the
+    compact form of the variants.
+    """
+    if deltas:
+        outfile.write(b"".join(b"%s\n" % names[k].encode() for k in selected))
+        return
+    for k in selected:
+        pos = positions[k]
+        wild_type = buffer[pos]
+        buffer[pos] = new[k]
+        outfile.write(b">%s\n%s\n" % (names[k].encode(), buffer))
+        buffer[pos] = wild_type
+
+def write_variants(sequence, mutations, output_file, buffer_size=1 << 20, deltas=False):
+    """
+    Writes one FASTA record per single mutation, '>A12V' followed by the mutated sequence.
+
+    The mutations are parsed and validated once and written from a shared
+    copy of the wild type (see write_variant_records). Returns the number of
+    variants written.
+    """
+    positions, original, new, names = parse_mutations(mutations)
+    wild_type = np.frombuffer(sequence.encode(), dtype=np.uint8)
+    in_range, mismatch = validate_mutations(wild_type, positions, original, names)
+    selected = np.flatnonzero(in_range)
+    with open(output_file, "wb", buffering=buffer_size) as outfile:
+        write_variant_records(outfile, bytearray(wild_type), positions, new, names, selected, deltas)
+    return len(selected)
+
+def read_mutation_list(path):
+    """Reads one mutation per line, skipping empty lines."""
+    mutations = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                mutation = line.strip()  # Remove leading/trailing whitespace
+                if mutation:  # Ensure the line is not empty
+                    mutations.append(mutation)
+    except FileNotFoundError:
+        print(f"Error: {path} not found.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    return mutations
+
 # Example usage:
 protein_sequence = ("MSLVPATNYIYTPLNQLKGGTIVNVYGVVKFFKPPYLSKGTDYCSVVTIVDQTNVKLTCLLFSGNYEALPIIYKNGDIV"
                     "RFHRLKIQVYKKETQGITSSGFASLTFEGTLGAPIIPRTSSKYFNFTTEDHKMVEALRVWASTHMSPSWTLLKLCDVQPM"
@@ -56,27 +157,12 @@ protein_sequence = ("MSLVPATNYIYTPLNQLKGGTIVNVYGVVKFFKPPYLSKGTDYCSVVTIVDQTNVKLTC
                     "VRSGHEDLELLDLSAPFLIQGTIHHYGCKQCSSLRSIQNLNSLVDKTSWIPSSVAEALGIVPLQYVFVMTFTLDDGTG"
                     "VLEAYLMDSDKFFQIPASEVLMDDDLQKSVDMIMDMFCPPGIKIDAYPWLECFIKSYNVTNGTDNQICYQIFDTTVAEDVI")
 
-mutations = []
-try:
-    with open("output_file.txt", "r") as f:
-        for line in f:
-            mutation = line.strip()  # Remove leading/trailing whitespace
-            if mutation:  # Ensure the line is not empty
-                mutations.append(mutation)
-except FileNotFoundError:
-    print("Error: output_file.txt not found.")
-except Exception as e:
-    print(f"An error occurred: {e}")
-
-# Apply each mutation individually and print the mutated sequence.
-for mutation in mutations:
-    mutated_sequence = apply_mutations(protein_sequence, [mutation])
-    
-    # Write the mutated sequence to a file
+if __name__ == '__main__':
+    mutations = read_mutation_list("output_file.txt")
+
+    # Write every single mutant of the list as one FASTA record
     try:
-        with open("mutated_sequences.txt", "a") as outfile:  # Open in append mode
-            outfile.write(f"Mutated Sequence for mutation {mutation}:\n")
-            outfile.write(mutated_sequence + "\n")
-            outfile.write("-" * 50 + "\n")  # Separator for better readability
+        count = write_variants(protein_sequence, mutations, "mutated_sequences.fasta")
+        print(f"{count} mutated sequences written to mutated_sequences.fasta")
     except Exception as e:
         print(f"An error occurred while writing to file: {e}")
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import mmap
+import os
+from array import array
+
+def index_path(arc_file):
+    """Returns the path of the frame index stored next to the arc file."""
+    return f"{arc_file}.idx"
+
+class FrameIndex:
+    """
+    Byte offsets of every frame of a TINKER ARC file.
+
+    offsets[k] is the position of the header line of frame k, and one extra
+    offset at the end holds the file size, so frame k is always the byte range
+    offsets[k]:offsets[k + 1].
+    """
+
+    def __init__(self, arc_file, header, offsets):
+        self.arc_file = arc_file
+        self.header = header
+        self.offsets = offsets
+        self._file = None
+        self._map = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _mapped(self):
+        if self._map is None:
+            self._file = open(self.arc_file, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def frame_bytes(self, k):
+        """Returns the raw bytes of frame k (0-indexed), header line included."""
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError(f"frame {k} is out of range for {len(self)} frames")
+        return self._mapped()[self.offsets[k]:self.offsets[k + 1]]
+
+    def frame_lines(self, k):
+        """Returns the lines of frame k (0-indexed) as strings."""
+        return self.frame_bytes(k).decode('utf-8').splitlines()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+def build_frame_index(arc_file):
+    """
+    Scans the arc file once through mmap and records where every copy of the header line starts.
+    """
+    with open(arc_file, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return FrameIndex(arc_file, "", array('q', [0]))
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = mm.find(b"\n")
+            first_line = mm[:end + 1] if end != -1 else mm[:]
+            header = first_line.decode('utf-8').strip()
+
+            offsets = array('q', [0])
+            needle = b"\n" + first_line
+            position = mm.find(needle, 0)
+            while position != -1:
+                offsets.append(position + 1)
+                position = mm.find(needle, position + 1)
+            offsets.append(size)
+    return FrameIndex(arc_file, header, offsets)
+
+def save_frame_index(index):
+    """Writes the index next to the trajectory, with the file size and mtime it was built from."""
+    stat = os.stat(index.arc_file)
+    meta = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'header': index.header}
+    tmp_path = index_path(index.arc_file) + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(json.dumps(meta).encode('utf-8') + b"\n")
+        index.offsets.tofile(file)
+    os.replace(tmp_path, index_path(index.arc_file))
+
+def read_frame_index(arc_file):
+    """Reads a stored index, returns None when it is missing or older than the trajectory."""
+    try:
+        with open(index_path(arc_file), 'rb') as file:
+            meta = json.loads(file.readline())
+            stat = os.stat(arc_file)
+            if meta['size'] != stat.st_size or meta['mtime_ns'] != stat.st_mtime_ns:
+                return None
+            offsets = array('q')
+            offsets.frombytes(file.read())
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    return FrameIndex(arc_file, meta['header'], offsets)
+
+def load_frame_index(arc_file):
+    """
+    Returns the frame index of the arc file, building and storing it on first use.
+    """
+    index = read_frame_index(arc_file)
+    if index is None:
+        index = build_frame_index(arc_file)
+        try:
+            save_frame_index(index)
+        except OSError as e:
+            print(f"Warning: Could not store the frame index for {arc_file}. {e}")
+    return index
+
+def digests_path(arc_file):
+    """Returns the path of the frame digests stored next to the frame index."""
+    return f"{arc_file}.idx.sha256"
+
+def frame_digests(arc_file):
+    """
+    Returns the SHA-256 digest (32 bytes) of every frame of the arc file.
+
+    The digests are stored next to the frame index with the size and mtime of
+    the trajectory, so the file is only hashed again after it changes.
+    """
+    stat = os.stat(arc_file)
+    try:
+        with open(digests_path(arc_file), 'rb') as file:
+            meta = json.loads(file.readline())
+            if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+                data = file.read()
+                return [data[k:k + 32] for k in range(0, len(data), 32)]
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    index = load_frame_index(arc_file)
+    try:
+        digests = [hashlib.sha256(index.frame_bytes(k)).digest() for k in range(len(index))]
+    finally:
+        index.close()
+    meta = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    tmp_path = digests_path(arc_file) + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(json.dumps(meta).encode('utf-8') + b"\n")
+            file.write(b"".join(digests))
+        os.replace(tmp_path, digests_path(arc_file))
+    except OSError as e:
+        print(f"Warning: Could not store the frame digests for {arc_file}. {e}")
+    return digests
@@ -0,0 +1,133 @@
+import numpy as np
+
+from arc_index import load_frame_index
+from trajectory_cache import read_trajectory_cache
+
+# One record per atom, coordinates of the frame the table was read from
+ATOM_DTYPE = np.dtype([
+    ('atom_num', np.int32),
+    ('atom_sym', 'U8'),
+    ('atom_type', np.int32),
+    ('xyz', np.float64, (3,)),
+])
+
+def is_box_line(parts):
+    """The optional periodic box line holds six floats instead of an atom record."""
+    try:
+        int(parts[0])
+        return False
+    except ValueError:
+        return True
+
+def parse_frame(frame_bytes):
+    """
+    Parses one frame of a TINKER XYZ/ARC file.
+
+    Returns (atoms, connect_ptr, connect_idx): a structured array with
+    ATOM_DTYPE and the CSR connectivity, where the atoms bonded to atom k are
+    connect_idx[connect_ptr[k]:connect_ptr[k + 1]] (atom numbers, 0 removed).
+    """
+    lines = frame_bytes.split(b"\n")
+    n_atoms = int(lines[0].split()[0])
+    body = lines[1:]
+    if body and body[0].split() and is_box_line(body[0].split()):
+        body = body[1:]
+
+    atoms = np.empty(n_atoms, dtype=ATOM_DTYPE)
+    connect_ptr = np.zeros(n_atoms + 1, dtype=np.int64)
+    connect = []
+    k = 0
+    for line in body:
+        if k == n_atoms:
+            break
+        parts = line.split()
+        if len(parts) < 6:  # Skip empty or incomplete lines
+            continue
+        atoms[k] = (int(parts[0]), parts[1].decode(), int(parts[5]),
+                    (float(parts[2]), float(parts[3]), float(parts[4])))
+        bonded = [int(num) for num in parts[6:] if num != b"0"]
+        connect.extend(bonded)
+        connect_ptr[k + 1] = connect_ptr[k] + len(bonded)
+        k += 1
+    if k < n_atoms:
+        raise ValueError(f"The frame has {k} atom lines but its header declares {n_atoms} atoms.")
+    return atoms, connect_ptr, np.array(connect, dtype=np.int32)
+
+def read_atom_table(arc_file, frame=0):
+    """
+    Reads the atom table and connectivity of one frame (0-indexed) of an arc file.
+
+    The binary cache of the trajectory is used when it is up to date.
+    """
+    cache = read_trajectory_cache(arc_file)
+    if cache is not None:
+        return cache.atom_table(frame)
+    index = load_frame_index(arc_file)
+    try:
+        return parse_frame(index.frame_bytes(frame))
+    finally:
+        index.close()
+
+def _frame_layout(frame_bytes):
+    """
+    Positions of the x, y and z tokens of every atom in the whitespace-split frame.
+
+    TINKER writes the same header, box line and connectivity in every frame,
+    so the positions found in one frame are valid for all of them.
+    """
+    lines = frame_bytes.split(b"\n")
+    n_atoms = int(lines[0].split()[0])
+    position = len(lines[0].split())
+    columns = []
+    for line in lines[1:]:
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) >= 6 and not is_box_line(parts) and len(columns) < n_atoms:
+            columns.append(position + 2)
+        position += len(parts)
+    columns = np.array(columns, dtype=np.int64)
+    return np.stack([columns, columns + 1, columns + 2], axis=1), position
+
+def load_coordinates(arc_file, frames=None, mmap_path=None, use_cache=True):
+    """
+    Loads the coordinates of all frames (or the given 0-indexed frames) of an arc file.
+
+    Returns an array of shape (n_frames, n_atoms, 3). Unless use_cache is
+    False, the frames are read from the binary cache of the trajectory when
+    it is up to date (see trajectory_cache) and the array is float32: the
+    memory-mapped cache itself for all frames, a copy of the given frames
+    otherwise, so callers convert the blocks they work on. Without the cache
+    the coordinates are parsed from the text as float64; when mmap_path is
+    given the array is written to that .npy file and returned memory-mapped,
+    so it can be reopened later with np.load(mmap_path, mmap_mode='r').
+    """
+    cache = read_trajectory_cache(arc_file) if use_cache and mmap_path is None else None
+    if cache is not None:
+        if frames is None:
+            return cache.coords
+        return cache.coords[np.asarray(list(frames), dtype=np.int64)]
+    index = load_frame_index(arc_file)
+    try:
+        if frames is None:
+            frames = range(len(index))
+        frames = list(frames)
+        columns, n_tokens = _frame_layout(index.frame_bytes(frames[0] if frames else 0))
+        shape = (len(frames), len(columns), 3)
+        if mmap_path is not None:
+            coords = np.lib.format.open_memmap(mmap_path, mode='w+', dtype=np.float64, shape=shape)
+        else:
+            coords = np.empty(shape, dtype=np.float64)
+
+        for out, k in enumerate(frames):
+            tokens = index.frame_bytes(k).split()
+            if len(tokens) != n_tokens:
+                # The layout of this frame differs, fall back to a full parse
+                coords[out] = parse_frame(index.frame_bytes(k))[0]['xyz']
+                continue
+            coords[out] = np.array(tokens)[columns].astype(np.float64)
+        if mmap_path is not None:
+            coords.flush()
+        return coords
+    finally:
+        index.close()
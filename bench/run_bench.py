@@ -0,0 +1,164 @@
+"""
+Offline benchmarks of the EDA pipeline on a synthetic trajectory.
+
+The stand-in archive/analyze executables in bench/bin are put first on the
+PATH, so no TINKER install or real protein is needed. Every scenario runs in
+its own interpreter so its peak RSS is its own.
+
+    python bench/run_bench.py --residues 60 --frames 20 --workers 4 --latency 0.05
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+SCENARIOS = ('parse', 'pairs-archive', 'pairs-native', 'aggregate')
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(usage, children) / 1024.0  # ru_maxrss is in KiB on Linux
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def scenario_parse(arc_file, args):
+    """Frame index, atom table, coordinates and topology, each from a cold start."""
+    import numpy as np
+
+    from arc_index import index_path, load_frame_index
+    from atom_table import load_coordinates, read_atom_table
+    from topology import Topology, topology_path
+    from trajectory_cache import cache_path, convert_trajectory, read_trajectory_cache
+
+    for path in (index_path(arc_file), topology_path(arc_file)):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(cache_path(arc_file), ignore_errors=True)
+    size_mb = os.path.getsize(arc_file) / 1e6
+    index, t_index = timed(load_frame_index, arc_file)
+    _, t_index_warm = timed(load_frame_index, arc_file)
+    (atoms, ptr, idx), t_atoms = timed(read_atom_table, arc_file)
+    coords, t_coords = timed(load_coordinates, arc_file)
+    _, t_topology = timed(Topology.build, atoms, ptr, idx)
+    _, t_convert = timed(convert_trajectory, arc_file)
+    _, t_open = timed(read_trajectory_cache, arc_file)
+    _, t_cached = timed(lambda: np.array(load_coordinates(arc_file)))  # Reads the memory-mapped cache
+    return {
+        'frames': len(index),
+        'index MB/s': size_mb / t_index,
+        'index warm s': t_index_warm,
+        'atom table s': t_atoms,
+        'coordinates MB/s': size_mb / t_coords,
+        'topology s': t_topology,
+        'binary convert s': t_convert,
+        'binary open ms': 1000 * t_open,
+        'binary coords s': t_cached,
+    }
+
+def scenario_pairs(arc_file, args, extractor):
+    """All pairs of the synthetic protein through archive_sep_pair and the stub TINKER."""
+    import new_main
+
+    os.environ['PATH'] = os.path.join(BENCH_DIR, 'bin') + os.pathsep + os.environ['PATH']
+    os.environ['TINKER_STUB_LATENCY'] = str(args.latency)
+    prm_file = os.path.join(os.path.dirname(arc_file), 'synthetic.prm')
+    open(prm_file, 'w').close()
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        _, _, residues = new_main.open_trajectory(arc_file, binary_cache=False)  # Pairs are extracted from the arc text
+        residues = residues[:args.pair_residues + 1]
+        n_pairs = (len(residues) - 1) * (len(residues) - 2) // 2
+        _, elapsed = timed(new_main.archive_sep_pair, residues, prm_file, workers=args.workers,
+                           extractor=extractor, batch_size=args.batch_size)
+    return {'pairs': n_pairs, 'pairs/s': n_pairs / elapsed, 'elapsed s': elapsed}
+
+def scenario_aggregate(arc_file, args):
+    """Streaming statistics: pushing frame values, merging partial results and writing pair lines."""
+    import new_main
+    from stats import RunningStats
+
+    n_values = 1_000_000
+    stats = RunningStats()
+    _, t_push = timed(lambda: [stats.push(float(k % 97)) for k in range(n_values)])
+    parts = [RunningStats(100, float(k), 10.0) for k in range(100_000)]
+    total = RunningStats()
+    _, t_merge = timed(lambda: [total.merge(part) for part in parts])
+    components = {name: RunningStats(100, -1.0, 5.0) for name in
+                  ("Intermolecular Energy", "Van der Waals", "Atomic Multipoles", "Polarization")}
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        _, t_record = timed(lambda: [new_main.record_pair_result(k, k + 1, components) for k in range(10_000)])
+    return {'push/s': n_values / t_push, 'merge/s': len(parts) / t_merge, 'pair lines/s': 10_000 / t_record}
+
+def run_scenario(name, args):
+    from synthetic import write_arc
+
+    workdir = tempfile.mkdtemp(prefix="eda_bench_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)  # energy_analysis.txt and the scratch files stay in the temporary directory
+        arc_file = os.path.join(workdir, 'synthetic.arc')
+        write_arc(arc_file, args.residues, args.atoms_per_residue, args.frames, args.waters)
+        if name == 'parse':
+            result = scenario_parse(arc_file, args)
+        elif name == 'aggregate':
+            result = scenario_aggregate(arc_file, args)
+        else:
+            result = scenario_pairs(arc_file, args, extractor=name.split('-', 1)[1])
+        result['peak RSS MB'] = peak_rss_mb()
+        return result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EDA pipeline offline.")
+    parser.add_argument("--scenario", choices=SCENARIOS, action='append',
+                        help="Scenario to run, can be repeated (default: all).")
+    parser.add_argument("--residues", type=int, default=60)
+    parser.add_argument("--atoms-per-residue", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--waters", type=int, default=0)
+    parser.add_argument("--pair-residues", type=int, default=12,
+                        help="Only the first residues take part in the pair scenarios.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay of every stub TINKER call in seconds.")
+    parser.add_argument("--json", action='store_true', help="Print one JSON line per scenario.")
+    parser.add_argument("--child", action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.scenario[0], args)))
+        return
+
+    options = ['--residues', args.residues, '--atoms-per-residue', args.atoms_per_residue, '--frames', args.frames,
+               '--waters', args.waters, '--pair-residues', args.pair_residues, '--workers', args.workers,
+               '--batch-size', args.batch_size, '--latency', args.latency]
+    for name in args.scenario or SCENARIOS:
+        command = [sys.executable, os.path.abspath(__file__), '--child', '--scenario', name] + [str(o) for o in options]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"{name}: failed\n{output.stderr}")
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps({'scenario': name, **result}))
+        else:
+            print(f"{name}:")
+            for key, value in result.items():
+                print(f"  {key:<18} {value:12.3f}" if isinstance(value, float) else f"  {key:<18} {value:12d}")
+
+if __name__ == '__main__':
+    main()
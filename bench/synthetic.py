@@ -0,0 +1,82 @@
+"""
+Synthetic TINKER ARC/XYZ trajectories for the benchmarks.
+
+Every residue is a backbone N, CA, C, O, an H on N and a side chain hanging
+from CA, residues are joined by C-N peptide bonds along a jittered helix, and
+optional water molecules are appended after the protein.
+"""
+import argparse
+import math
+import random
+
+def build_system(n_residues, atoms_per_residue=10, n_waters=0):
+    """
+    Returns (symbols, types, bonds, coords) for a synthetic protein.
+
+    bonds is a list of 0-indexed atom pairs and coords a list of [x, y, z].
+    """
+    if atoms_per_residue < 5:
+        raise ValueError("A residue needs at least 5 atoms (N, CA, C, O, H).")
+    symbols, types, bonds, coords = [], [], [], []
+    previous_c = None
+    for r in range(n_residues):
+        angle = r * 100.0 * math.pi / 180.0
+        cx, cy, cz = 2.3 * math.cos(angle), 2.3 * math.sin(angle), 1.5 * r
+        base = len(symbols)
+        backbone = [('N', 7), ('CA', 8), ('C', 9), ('O', 10), ('H', 12)]
+        side = [(f"C{'BGDEZH'[k % 6]}", 11) for k in range(atoms_per_residue - 5)]
+        for k, (sym, atom_type) in enumerate(backbone + side):
+            symbols.append(sym)
+            types.append(atom_type)
+            radius = 1.0 + 0.6 * k
+            coords.append([cx + radius * math.cos(angle), cy + radius * math.sin(angle), cz + 0.3 * (k % 3)])
+        n, ca, c, o, h = range(base, base + 5)
+        bonds += [(n, ca), (ca, c), (c, o), (n, h)]
+        previous = ca
+        for k in range(len(side)):
+            bonds.append((previous, base + 5 + k))
+            previous = base + 5 + k
+        if previous_c is not None:
+            bonds.append((previous_c, n))
+        previous_c = c
+
+    extent = 1.5 * n_residues + 10.0
+    for _ in range(n_waters):
+        o = len(symbols)
+        x, y, z = (random.uniform(-15.0, 15.0), random.uniform(-15.0, 15.0), random.uniform(-5.0, extent))
+        symbols += ['O', 'H', 'H']
+        types += [247, 248, 248]
+        coords += [[x, y, z], [x + 0.96, y, z], [x - 0.24, y + 0.93, z]]
+        bonds += [(o, o + 1), (o, o + 2)]
+    return symbols, types, bonds, coords
+
+def write_arc(path, n_residues, atoms_per_residue=10, n_frames=10, n_waters=0, jitter=0.2, seed=0):
+    """Writes a trajectory of n_frames jittered copies of the synthetic system, returns its atom count."""
+    random.seed(seed)
+    symbols, types, bonds, coords = build_system(n_residues, atoms_per_residue, n_waters)
+    n_atoms = len(symbols)
+    connect = [[] for _ in range(n_atoms)]
+    for a, b in bonds:
+        connect[a].append(b + 1)
+        connect[b].append(a + 1)
+    tails = [f"{types[k]:6d}" + "".join(f"{num:6d}" for num in sorted(connect[k])) + "\n" for k in range(n_atoms)]
+    heads = [f"{k + 1:6d}  {symbols[k]:<3s}" for k in range(n_atoms)]
+    with open(path, 'w') as file:
+        for _ in range(n_frames):
+            lines = [f"{n_atoms:6d}  Synthetic benchmark system\n"]
+            for k in range(n_atoms):
+                x, y, z = (v + random.uniform(-jitter, jitter) for v in coords[k])
+                lines.append(f"{heads[k]}{x:12.6f}{y:12.6f}{z:12.6f}{tails[k]}")
+            file.write("".join(lines))
+    return n_atoms
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a synthetic TINKER ARC trajectory.")
+    parser.add_argument("path")
+    parser.add_argument("--residues", type=int, default=50)
+    parser.add_argument("--atoms-per-residue", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--waters", type=int, default=0)
+    args = parser.parse_args()
+    n_atoms = write_arc(args.path, args.residues, args.atoms_per_residue, args.frames, args.waters)
+    print(f"Wrote {args.frames} frames of {n_atoms} atoms to {args.path}")
@@ -0,0 +1,219 @@
+"""
+Resident EDA server: loads a trajectory once and answers pair and reference residue queries over a Unix socket.
+
+    python eda_daemon.py serve eda.sock --arc EDA-test/test.arc --prm EDA-test/amoebabio18.prm --workers 4
+    python eda_daemon.py query eda.sock pair 3 7
+    python eda_daemon.py query eda.sock reference 112 --top 20
+    python eda_daemon.py query eda.sock info
+    python eda_daemon.py query eda.sock shutdown
+
+Requests and replies are single JSON lines. A request is {"op": "info"},
+{"op": "pair", "i": 3, "j": 7}, {"op": "reference", "residues": [112], "top": 20}
+or {"op": "shutdown"}; the reply holds "ok" and either the result or "error".
+Energies come from memory, then from the result cache, and only the pairs
+found in neither are evaluated.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import time
+
+import new_main
+from energy_parser import REPORTED_COMPONENTS
+from read_sep_arc import reference_pairs
+from result_cache import ResultCache
+from topology import load_topology
+from trajectory_cache import read_trajectory_cache
+
+class EDADaemon:
+    """
+    The trajectory state kept between queries: frame index, binary cache,
+    topology and residue list, the result cache, the pool of pair workers
+    and the energies of every pair seen so far.
+
+    The trajectory is reloaded when the arc file changes on disk. close()
+    stops the workers.
+    """
+
+    def __init__(self, arc_file, prm_file, cache_dir=None, workers=1, extractor='native'):
+        self.arc_file = os.path.abspath(arc_file)
+        self.prm_file = os.path.abspath(prm_file)
+        self.cache_dir = os.path.abspath(cache_dir) if cache_dir is not None else None
+        self.workers = workers
+        self.extractor = extractor
+        self.stat = None
+        self.pair_pool = None
+        self.load()
+
+    def load(self):
+        start = time.perf_counter()
+        self.close()
+        _, self.frames, self.residues = new_main.open_trajectory(self.arc_file)
+        if self.frames is None:
+            raise ValueError(f"Could not read the frames of {self.arc_file}.")
+        self.topology = load_topology(self.arc_file)  # Read back from the cache open_trajectory stored
+        self.trajectory_cache = read_trajectory_cache(self.arc_file)
+        self.result_cache = ResultCache(self.cache_dir, self.arc_file, self.prm_file) if self.cache_dir else None
+        self.pair_pool = new_main.PairPool(self.arc_file, self.workers)
+        self.results = {}
+        stat = os.stat(self.arc_file)
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        print(f"Loaded {self.arc_file} in {time.perf_counter() - start:.2f} s: {self.topology.summary()}")
+
+    def _check_trajectory(self):
+        stat = os.stat(self.arc_file)
+        if (stat.st_size, stat.st_mtime_ns) != self.stat:
+            print(f"{self.arc_file} changed, reloading.")
+            self.load()
+
+    def close(self):
+        if self.pair_pool is not None:
+            self.pair_pool.close()
+            self.pair_pool = None
+
+    def evaluate(self, pairs):
+        """Returns {(i, j): energy_components} of the pairs, evaluating only the ones not in memory."""
+        missing = {pair for pair in pairs if pair not in self.results}
+        if missing:
+            results = new_main.archive_sep_pair(self.residues, self.prm_file, extractor=self.extractor, pairs=missing,
+                                                pair_pool=self.pair_pool, result_cache=self.result_cache,
+                                                trajectory_cache=self.trajectory_cache)
+            self.results.update(results or {})
+        return {pair: self.results[pair] for pair in pairs if pair in self.results}
+
+    def _check_residue(self, residue):
+        if not 1 <= residue < len(self.residues):
+            raise ValueError(f"Invalid residue {residue}, valid indices are 1 - {len(self.residues) - 1}.")
+
+    def handle(self, request):
+        """Answers one request (a dict), returns the reply (a dict)."""
+        op = request.get('op')
+        if op == 'info':
+            return {'arc_file': self.arc_file, 'prm_file': self.prm_file, 'residues': len(self.residues) - 1,
+                    'frames': self.frames, 'topology': self.topology.summary(),
+                    'pairs_in_memory': len(self.results)}
+
+        self._check_trajectory()
+        if op == 'pair':
+            i, j = sorted((int(request['i']), int(request['j'])))
+            self._check_residue(i)
+            self._check_residue(j)
+            if i == j:
+                raise ValueError("A pair needs two different residues.")
+            results = self.evaluate([(i, j)])
+            return {'pairs': _pair_list(results)}
+        if op == 'reference':
+            references = [int(ref) for ref in request['residues']]
+            for ref in references:
+                self._check_residue(ref)
+            pairs = sorted(reference_pairs(references, len(self.residues)))
+            results = self.evaluate(pairs)
+            top = request.get('top')
+            profiles = {}
+            for ref in references:
+                rows = [(j if i == ref else i, energy_components) for (i, j), energy_components in results.items()
+                        if ref in (i, j)]
+                rows.sort(key=lambda row: row[1][REPORTED_COMPONENTS[0]].mean if REPORTED_COMPONENTS[0] in row[1] else 0.0)
+                profiles[str(ref)] = [[partner, _components(energy_components)] for partner, energy_components in rows[:top]]
+            return {'profiles': profiles}
+        raise ValueError(f"Unknown op '{op}', use info, pair, reference or shutdown.")
+
+def _components(energy_components):
+    return {component: {'mean': stats.mean, 'std': stats.std, 'count': stats.count}
+            for component, stats in energy_components.items()}
+
+def _pair_list(results):
+    return [[i, j, _components(energy_components)] for (i, j), energy_components in sorted(results.items())]
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get('op') == 'shutdown':
+                    self.server.stopped = True
+                    reply = {'ok': True}
+                else:
+                    start = time.perf_counter()
+                    reply = dict(self.server.eda.handle(request), ok=True)
+                    reply['seconds'] = time.perf_counter() - start
+            except Exception as e:
+                reply = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+def serve(socket_path, daemon, work_dir=".eda_daemon"):
+    """
+    Answers requests on socket_path until a shutdown request, one at a time.
+
+    The energy_analysis.txt of every evaluation goes to work_dir. Only the
+    user running the daemon can connect to the socket.
+    """
+    socket_path = os.path.abspath(socket_path)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # Left over by a daemon that did not shut down cleanly
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    umask = os.umask(0o177)  # No window in which the socket has the default permissions
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    finally:
+        os.umask(umask)
+    os.chmod(socket_path, 0o600)
+    with server:
+        server.eda = daemon
+        server.stopped = False
+        print(f"Listening on {socket_path}")
+        try:
+            while not server.stopped:
+                server.handle_request()
+        finally:
+            os.remove(socket_path)
+            daemon.close()
+
+def query(socket_path, request, timeout=None):
+    """Sends one request to a running daemon and returns its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            data = client.recv(1 << 16)
+            if not data:
+                break
+            reply += data
+    return json.loads(reply)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Resident EDA server over a Unix socket.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="Load the trajectory and answer queries.")
+    serve_parser.add_argument("socket")
+    serve_parser.add_argument("--arc", default=new_main.arc_file)
+    serve_parser.add_argument("--prm", default=new_main.prm_file)
+    serve_parser.add_argument("--cache-dir", default=new_main.cache_dir, help="Result cache shared with new_main.py.")
+    serve_parser.add_argument("--workers", type=int, default=1)
+    serve_parser.add_argument("--extractor", choices=('archive', 'native'), default='native')
+    serve_parser.add_argument("--work-dir", default=".eda_daemon")
+    query_parser = commands.add_parser('query', help="Send one request to a running server.")
+    query_parser.add_argument("socket")
+    query_parser.add_argument("op", choices=('info', 'pair', 'reference', 'shutdown'))
+    query_parser.add_argument("residues", type=int, nargs='*')
+    query_parser.add_argument("--top", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        daemon = EDADaemon(args.arc, args.prm, args.cache_dir, args.workers, args.extractor)
+        serve(args.socket, daemon, args.work_dir)
+    else:
+        request = {'op': args.op}
+        if args.op == 'pair':
+            if len(args.residues) != 2:
+                parser.error("pair needs two residues")
+            request.update(i=args.residues[0], j=args.residues[1])
+        elif args.op == 'reference':
+            request.update(residues=args.residues, top=args.top)
+        print(json.dumps(query(args.socket, request), indent=1))
@@ -0,0 +1,139 @@
+import glob
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+# Columns of the per-frame energy store, the full breakdown printed by TINKER analyze
+COMPONENTS = (
+    "Total Potential Energy", "Intermolecular Energy",
+    "Bond Stretching", "Angle Bending", "Stretch-Bend", "Urey-Bradley", "Out-of-Plane Bend",
+    "Torsional Angle", "Pi-Orbital Torsion", "Stretch-Torsion", "Angle-Torsion", "Torsion-Torsion",
+    "Van der Waals", "Repulsion", "Dispersion", "Charge-Charge", "Atomic Multipoles", "Polarization",
+    "Charge Transfer", "Implicit Solvation", "Geometric Restraints",
+)
+COLUMN = {name: k for k, name in enumerate(COMPONENTS)}
+# Components summarised in energy_analysis.txt, in the order of their columns there
+REPORTED_COMPONENTS = ("Intermolecular Energy", "Van der Waals", "Atomic Multipoles", "Polarization")
+
+_NUMBER = r"(-?\d+\.\d*(?:[DdEe][-+]?\d+)?)"
+FRAME_RE = re.compile(r"^\s*Analysis for Archive Structure\s*:\s*(\d+)")
+TOTAL_RE = re.compile(r"^\s*(Total Potential Energy|Intermolecular Energy)\s*:\s*" + _NUMBER)
+BREAKDOWN_RE = re.compile(r"^\s*(" + "|".join(re.escape(name) for name in COMPONENTS[2:]) + r")\s+" + _NUMBER + r"\s+\d+\s*$")
+
+def _value(text):
+    return float(text.replace('D', 'E').replace('d', 'e'))
+
+class AnalyzeParser:
+    """
+    Incremental parser of the output of TINKER analyze (option E).
+
+    Lines are fed one at a time as analyze prints them. feed() returns the
+    row of a frame (one value per COMPONENTS column, NaN when absent) once
+    the next frame starts, and finish() returns the last one.
+    """
+
+    def __init__(self):
+        self.row = None
+
+    def _new_row(self):
+        return [math.nan] * len(COMPONENTS)
+
+    def feed(self, line):
+        if FRAME_RE.match(line):
+            done, self.row = self.row, self._new_row()
+            return done
+        match = TOTAL_RE.match(line) or BREAKDOWN_RE.match(line)
+        if match:
+            if self.row is None:  # Single structure, no frame header
+                self.row = self._new_row()
+            self.row[COLUMN[match.group(1)]] = _value(match.group(2))
+        return None
+
+    def finish(self):
+        done, self.row = self.row, None
+        return done
+
+class EnergySeriesStore:
+    """
+    Per-frame energies of every pair, one float32 file of shape (frames, COMPONENTS) per pair.
+
+    Rows are appended to disk as they are parsed, so memory does not grow with
+    the length of the trajectory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        components_path = os.path.join(directory, "components.json")
+        if not os.path.exists(components_path):
+            with open(components_path, 'w') as file:
+                json.dump(list(COMPONENTS), file)
+
+    def path(self, i, j, part=None):
+        if part is None:
+            return os.path.join(self.directory, f"pair_{i}_{j}.f32")
+        return os.path.join(self.directory, f"pair_{i}_{j}.part{part}.f32")
+
+    def parts_path(self, i, j):
+        return os.path.join(self.directory, f"pair_{i}_{j}.parts.json")
+
+    def clear(self, i, j):
+        """Removes the series of a pair in both layouts."""
+        stale = [self.path(i, j), self.parts_path(i, j)]
+        stale += glob.glob(os.path.join(self.directory, f"pair_{i}_{j}.part*.f32"))
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def expect_parts(self, i, j, n_parts, n_frames):
+        """
+        Removes the series of an earlier run of a pair and records that it will
+        be written as n_parts parts holding n_frames frames in total.
+        """
+        self.clear(i, j)
+        with open(self.parts_path(i, j), 'w') as file:
+            json.dump({'parts': n_parts, 'frames': n_frames}, file)
+
+    def writer(self, i, j, part=None):
+        """
+        Returns an open binary file, write rows to it with write_row().
+
+        A pair evaluated in frame chunks writes one part per chunk, numbered in
+        frame order, after expect_parts(), and load() joins them. A whole pair
+        replaces any earlier series of the pair.
+        """
+        if part is None:
+            self.clear(i, j)
+        return open(self.path(i, j, part), 'wb')
+
+    @staticmethod
+    def write_row(file, row):
+        np.asarray(row, dtype=np.float32).tofile(file)
+
+    def load(self, i, j, component=None):
+        """
+        Returns the (frames, components) array of a pair, memory-mapped unless it
+        was written in parts, or one column of it when a component name is given.
+        """
+        if os.path.exists(self.path(i, j)):
+            series = np.memmap(self.path(i, j), dtype=np.float32, mode='r').reshape(-1, len(COMPONENTS))
+        elif os.path.exists(self.parts_path(i, j)):
+            with open(self.parts_path(i, j), 'r') as file:
+                expected = json.load(file)
+            paths = [self.path(i, j, part) for part in range(expected['parts'])]
+            missing = [path for path in paths if not os.path.exists(path)]
+            if missing:
+                raise ValueError(f"The energy series of pair {i} - {j} is incomplete, "
+                                 f"{len(missing)} of {expected['parts']} parts are missing.")
+            series = np.concatenate([np.fromfile(path, dtype=np.float32).reshape(-1, len(COMPONENTS)) for path in paths])
+            if len(series) != expected['frames']:
+                raise ValueError(f"The energy series of pair {i} - {j} has {len(series)} frames, "
+                                 f"{expected['frames']} were expected.")
+        else:
+            raise FileNotFoundError(f"No energy series for pair {i} - {j} in {self.directory}.")
+        if component is not None:
+            return series[:, COLUMN[component]]
+        return series
@@ -0,0 +1,273 @@
+"""
+Approximate residue pair energies computed with NumPy from the .prm force field, to rank the pairs before TINKER.
+
+For every frame the vdW energy (buffered 14-7 or Lennard-Jones, with the
+combining rules and hydrogen reduction of the force field) and the
+electrostatic energy of the fixed charges, or of the monopoles of the
+multipoles, are summed over the atoms of two residues. Atoms a few bonds
+apart across a peptide bond are scaled like in TINKER. Polarization and the
+higher multipoles are left out, so the values rank the pairs rather than
+reproduce the energies of analyze.
+
+    python energy_screen.py --arc EDA-test/test.arc --prm EDA-test/amoebabio18.prm --threshold 1.0 --top 20
+"""
+import argparse
+
+import numpy as np
+
+from arc_index import load_frame_index
+from atom_table import load_coordinates, read_atom_table
+from force_field import load_force_field
+from pair_screen import cell_list_pairs, residue_slices
+from topology import load_topology
+
+def combine_radii(ri, rj, rule):
+    """Minimum energy distance of two atoms from their radii (half distances)."""
+    if rule == 'ARITHMETIC':
+        return ri + rj
+    if rule == 'GEOMETRIC':
+        return 2.0 * np.sqrt(ri * rj)
+    if rule == 'CUBIC-MEAN':
+        squares = ri * ri + rj * rj
+        return np.where(squares > 0, 2.0 * (ri ** 3 + rj ** 3) / np.where(squares > 0, squares, 1.0), 0.0)
+    raise ValueError(f"The energy screen does not support radiusrule {rule}.")
+
+def combine_epsilons(ei, ej, rule):
+    """Well depth of two atoms, 0 when either one has no vdW parameters."""
+    both = (ei > 0) & (ej > 0)
+    ei, ej = np.where(both, ei, 1.0), np.where(both, ej, 1.0)
+    if rule == 'GEOMETRIC':
+        eps = np.sqrt(ei * ej)
+    elif rule == 'ARITHMETIC':
+        eps = 0.5 * (ei + ej)
+    elif rule == 'HARMONIC':
+        eps = 2.0 * ei * ej / (ei + ej)
+    elif rule == 'HHG':
+        eps = 4.0 * ei * ej / (np.sqrt(ei) + np.sqrt(ej)) ** 2
+    else:
+        raise ValueError(f"The energy screen does not support epsilonrule {rule}.")
+    return np.where(both, eps, 0.0)
+
+def vdw_energy(r, r0, eps, vdwtype):
+    """vdW energy at distances r of atoms with minimum energy distance r0 and well depth eps (r0 > 0)."""
+    if vdwtype == 'BUFFERED-14-7':
+        rho = r / r0
+        return eps * (1.07 / (rho + 0.07)) ** 7 * (1.12 / (rho ** 7 + 0.12) - 2.0)
+    if vdwtype == 'LENNARD-JONES':
+        p6 = (r0 / r) ** 6
+        return eps * (p6 * p6 - 2.0 * p6)
+    raise ValueError(f"The energy screen does not support vdwtype {vdwtype}.")
+
+def _distances(x, y):
+    """Distances between the atoms of x (3, frames, a) and y (3, frames, b), shape (frames, a, b)."""
+    r2 = np.square(x[0][:, :, None] - y[0][:, None, :])
+    r2 += np.square(x[1][:, :, None] - y[1][:, None, :])
+    r2 += np.square(x[2][:, :, None] - y[2][:, None, :])
+    return np.sqrt(r2, out=r2)
+
+def bonded_pairs(connect_ptr, connect_idx, atom_residue, max_bonds=4):
+    """
+    Returns (a, b, bonds): the atom pairs (a < b) of different residues at most max_bonds bonds apart.
+
+    Atoms with atom_residue -1 are left out. Walks along the bonds are
+    extended one bond at a time, the shortest walk between two atoms gives
+    their number of bonds.
+    """
+    degree = np.diff(connect_ptr)
+    neighbours = connect_idx.astype(np.int64) - 1
+    origin = np.repeat(np.arange(len(degree)), degree)
+    end = neighbours
+    found_a, found_b, found_bonds = [], [], []
+    for bonds in range(1, max_bonds + 1):
+        found_a.append(origin)
+        found_b.append(end)
+        found_bonds.append(np.full(len(origin), bonds))
+        if bonds == max_bonds:
+            break
+        steps = degree[end]
+        offset = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+        origin, end = np.repeat(origin, steps), neighbours[np.repeat(connect_ptr[end], steps) + offset]
+    a, b, bonds = np.concatenate(found_a), np.concatenate(found_b), np.concatenate(found_bonds)
+    keep = (a < b) & (atom_residue[a] >= 0) & (atom_residue[b] >= 0) & (atom_residue[a] != atom_residue[b])
+    a, b, bonds = a[keep], b[keep], bonds[keep]
+    order = np.lexsort((bonds, b, a))
+    a, b, bonds = a[order], b[order], bonds[order]
+    first = np.ones(len(a), dtype=bool)
+    first[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+    return a[first], b[first], bonds[first]
+
+def _near_residues(xyz, bounds, cutoff):
+    """
+    Returns the (n_res, n_res) matrix of the residue pairs whose atoms can
+    come within cutoff in any of the frames of xyz (frames, atoms, 3), and the
+    centroids (frames, n_res, 3) of the residues, which span bounds.
+
+    A residue cannot be closer than its centroid distance minus both radii,
+    and the centroids within reach are found with a cell list.
+    """
+    lengths = np.diff(bounds)
+    residue_of_atom = np.repeat(np.arange(len(lengths)), lengths)
+    near = np.zeros((len(lengths), len(lengths)), dtype=bool)
+    centroids = np.add.reduceat(xyz, bounds[:-1], axis=1) / lengths[None, :, None]
+    for f in range(len(xyz)):
+        radii = np.maximum.reduceat(np.linalg.norm(xyz[f] - centroids[f][residue_of_atom], axis=1), bounds[:-1])
+        a, b = cell_list_pairs(centroids[f], cutoff + 2 * radii.max())
+        d = np.linalg.norm(centroids[f][a] - centroids[f][b], axis=1)
+        keep = d - radii[a] - radii[b] <= cutoff
+        near[a[keep], b[keep]] = True
+    return near, centroids
+
+def approximate_energies(arc_file, residues, force_field, stride=1, vdw_cutoff=9.0, charge_cutoff=12.0, chunk=64,
+                         block=1 << 20):
+    """
+    Returns (i, j, vdw, electrostatic): the approximate energies (kcal/mol) of
+    every pair of residues i < j, averaged over every stride-th frame.
+
+    Only the residue pairs whose atoms can come within the larger of the two
+    cutoffs (Angstrom) in a chunk of frames are compared atom by atom: the
+    vdW energy is summed over their atoms that come within vdw_cutoff, the
+    electrostatic energy over all their atoms. The electrostatic energy of
+    the other pairs is that of the net charges of both residues at their
+    centroids. With either cutoff None every pair is compared atom by atom
+    (the vdW energy over all the atoms when vdw_cutoff is None).
+
+    Frames are read chunk at a time and every residue is compared with the
+    atoms of its near residues after it, in blocks of about block atom pairs,
+    in single precision.
+    """
+    keywords = force_field.keywords
+    vdwtype = keywords['vdwtype']
+    radius_rule, epsilon_rule = keywords['radiusrule'], keywords['epsilonrule']
+    vdw_energy(np.ones(1), np.ones(1), np.zeros(1), vdwtype)  # Unsupported settings fail before any work
+    combine_radii(np.ones(1), np.ones(1), radius_rule)
+    combine_epsilons(np.ones(1), np.ones(1), epsilon_rule)
+    indices, starts, stops = residue_slices(residues)
+    n_res = len(indices)
+    atoms, connect_ptr, connect_idx = read_atom_table(arc_file)
+    lengths = stops - starts
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    selected = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+    atom_residue = np.full(len(atoms), -1, dtype=np.int64)
+    atom_residue[selected] = np.repeat(np.arange(n_res), lengths)
+    selected_residue = atom_residue[selected]
+
+    charge, radius, epsilon, reduction = force_field.atom_parameters(atoms['atom_type'])
+    charge = (charge * np.sqrt(keywords['electric'] / keywords['dielectric']))[selected].astype(np.float32)
+    radius, epsilon = radius[selected], epsilon[selected]
+    # The vdW site of a reduced atom (hydrogen) sits between it and the atom it is bonded to
+    reduced = np.flatnonzero((reduction > 0) & (np.diff(connect_ptr) > 0))
+    parent = connect_idx[connect_ptr[reduced]].astype(np.int64) - 1
+
+    # Atoms a few bonds apart (across peptide and disulfide bonds) are scaled like in TINKER
+    a, b, bonds = bonded_pairs(connect_ptr, connect_idx, atom_residue)
+    charge_kind = 'mpole' if keywords['charges'] == 'multipole' else 'chg'
+    vdw_scale = np.array([keywords[f'vdw-1{k}-scale'] for k in range(2, 6)], dtype=np.float32)[bonds - 1]
+    charge_scale = np.array([keywords[f'{charge_kind}-1{k}-scale'] for k in range(2, 6)], dtype=np.float32)[bonds - 1]
+    position = np.full(len(atoms), -1, dtype=np.int64)
+    position[selected] = np.arange(len(selected))
+    a, b = position[a], position[b]
+    bonded_start = np.searchsorted(selected_residue[a], np.arange(n_res + 1))
+    net_charge = np.add.reduceat(charge.astype(np.float64), bounds[:-1])
+    charged = np.flatnonzero(np.abs(net_charge) > 1e-6)
+    upper = np.triu(np.ones((len(charged), len(charged)), dtype=bool), k=1)
+    screen_cutoff = max(vdw_cutoff, charge_cutoff) if vdw_cutoff is not None and charge_cutoff is not None else None
+
+    vdw = np.zeros((n_res, n_res))
+    electrostatic = np.zeros((n_res, n_res))
+    frames = range(0, len(load_frame_index(arc_file)), stride)
+    for first in range(0, len(frames), chunk):
+        xyz = np.asarray(load_coordinates(arc_file, frames=frames[first:first + chunk]), dtype=np.float64)
+        sites = xyz.copy()
+        sites[:, reduced] = xyz[:, parent] + reduction[reduced][:, None] * (xyz[:, reduced] - xyz[:, parent])
+        if screen_cutoff is not None:
+            near_residues, centroids = _near_residues(xyz[:, selected], bounds, screen_cutoff)
+            far_a, far_b = np.nonzero(upper & ~near_residues[np.ix_(charged, charged)])
+            far_a, far_b = charged[far_a], charged[far_b]
+            inverse = np.zeros(len(far_a))
+            for c in centroids:
+                inverse += 1.0 / np.linalg.norm(c[far_a] - c[far_b], axis=1)
+            electrostatic[far_a, far_b] += net_charge[far_a] * net_charge[far_b] * inverse
+        else:
+            near_residues = np.triu(np.ones((n_res, n_res), dtype=bool), k=1)
+        xyz = np.ascontiguousarray(xyz[:, selected].transpose(2, 0, 1), dtype=np.float32)
+        sites = np.ascontiguousarray(sites[:, selected].transpose(2, 0, 1), dtype=np.float32)
+
+        for r in range(n_res - 1):
+            partners = np.flatnonzero(near_residues[r, r + 1:]) + r + 1
+            if not len(partners):
+                continue
+            start, stop = bounds[r], bounds[r + 1]
+            # The atoms of the near residues, in atom order, and where every residue starts among them
+            sizes = lengths[partners]
+            offsets = np.cumsum(sizes) - sizes
+            columns = np.repeat(bounds[partners] - offsets, sizes) + np.arange(sizes.sum())
+            qq = charge[start:stop, None] * charge[None, columns]
+            mine = slice(bonded_start[r], bonded_start[r + 1])
+            bonded = np.minimum(np.searchsorted(columns, b[mine]), len(columns) - 1)
+            inside = columns[bonded] == b[mine]
+            rows, bonded = a[mine][inside] - start, bonded[inside]
+            qq[rows, bonded] *= charge_scale[mine][inside]
+            step = max(1, block // qq.size)
+            for f in range(0, xyz.shape[1], step):
+                frame_slice = slice(f, f + step)
+                distances = _distances(xyz[:, frame_slice, start:stop], xyz[:, frame_slice, columns])
+                near = np.flatnonzero(distances.min(axis=(0, 1)) <= vdw_cutoff) if vdw_cutoff is not None \
+                    else np.arange(distances.shape[2])
+                electrostatic[r, partners] += np.add.reduceat((qq / distances).sum(axis=(0, 1), dtype=np.float64),
+                                                              offsets)
+
+                if len(near):
+                    r0 = combine_radii(radius[start:stop, None], radius[None, columns[near]], radius_rule)
+                    eps = combine_epsilons(epsilon[start:stop, None], epsilon[None, columns[near]], epsilon_rule)
+                    scale = np.ones((stop - start, len(near)))
+                    column = np.searchsorted(near, bonded)
+                    found = (column < len(near)) & (near[np.minimum(column, len(near) - 1)] == bonded)
+                    scale[rows[found], column[found]] = vdw_scale[mine][inside][found]
+                    eps *= scale
+                    eps[r0 <= 0] = 0.0
+                    r0[r0 <= 0] = 1.0
+                    e_vdw = vdw_energy(_distances(sites[:, frame_slice, start:stop], sites[:, frame_slice, columns[near]]),
+                                       r0.astype(np.float32), eps.astype(np.float32), vdwtype)
+                    vdw[r] += np.bincount(selected_residue[columns[near]],
+                                          weights=e_vdw.sum(axis=(0, 1), dtype=np.float64), minlength=n_res)
+
+    i, j = np.triu_indices(n_res, k=1)
+    n_frames = max(len(frames), 1)
+    return indices[i], indices[j], vdw[i, j] / n_frames, electrostatic[i, j] / n_frames
+
+def energy_screen(arc_file, prm_file, residues, threshold, stride=1, output_file=None):
+    """
+    Returns {(i, j): approximate energy} of the pairs whose vdW plus
+    electrostatic energy is at least threshold (kcal/mol) in magnitude.
+
+    With an output_file these pairs are written there strongest first,
+    with their vdW and electrostatic parts.
+    """
+    force_field = load_force_field(prm_file)
+    i, j, vdw, electrostatic = approximate_energies(arc_file, residues, force_field, stride=stride)
+    total = vdw + electrostatic
+    keep = np.flatnonzero(np.abs(total) >= threshold)
+    keep = keep[np.argsort(-np.abs(total[keep]), kind='stable')]
+    if output_file is not None:
+        with open(output_file, "w") as outfile:
+            outfile.write("Approximate energies (kcal/mol): total, Van der Waals, electrostatic\n")
+            outfile.writelines(f"res {i[k]} - res {j[k]:<6d} {total[k]:>10.2f} {vdw[k]:>10.2f} {electrostatic[k]:>10.2f}\n"
+                               for k in keep)
+    return {(int(i[k]), int(j[k])): float(total[k]) for k in keep}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rank residue pairs by an approximate NumPy pair energy.")
+    parser.add_argument("--arc", default="./EDA-test/test.arc")
+    parser.add_argument("--prm", default="./EDA-test/amoebabio18.prm")
+    parser.add_argument("--threshold", type=float, default=0.0, help="Smallest |energy| kept (kcal/mol).")
+    parser.add_argument("--stride", type=int, default=1, help="Use every stride-th frame.")
+    parser.add_argument("--top", type=int, default=None, help="Print only the strongest pairs.")
+    parser.add_argument("--output", default=None, help="Also write the ranked pairs to this file.")
+    parser.add_argument("--ligands", action="store_true", help="Also pair the ligands (renumbers the residues).")
+    args = parser.parse_args()
+
+    residues = load_topology(args.arc).residue_list(('protein', 'ligand') if args.ligands else ('protein',))
+    shortlist = energy_screen(args.arc, args.prm, residues, args.threshold, args.stride, args.output)
+    for (i, j), energy in list(shortlist.items())[:args.top]:
+        print(f"res {i} - res {j:<6d} {energy:>10.2f}")
+    print(f"{len(shortlist)} pairs with |energy| >= {args.threshold} kcal/mol")
@@ -0,0 +1,175 @@
+"""
+The nonbonded parameters of a TINKER .prm force field, indexed by atom type and atom class.
+
+Only what the approximate pair energies of energy_screen need is read: the
+atom, vdw, charge and multipole records (the monopole of every multipole)
+and the keywords of the vdW functional form, combining rules, dielectric and
+bonded scale factors. The parameters are cached next to the .prm file in
+<prm>.params.npz, keyed by the SHA-256 of the file.
+
+    python force_field.py EDA-test/amoebabio18.prm
+"""
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+# TINKER defaults of the keywords used here, a .prm file overrides them
+DEFAULT_KEYWORDS = {
+    'vdwtype': 'LENNARD-JONES',
+    'radiusrule': 'ARITHMETIC',
+    'radiustype': 'R-MIN',
+    'radiussize': 'RADIUS',
+    'epsilonrule': 'GEOMETRIC',
+    'dielectric': 1.0,
+    'electric': 332.063713,
+    'vdw-12-scale': 0.0, 'vdw-13-scale': 0.0, 'vdw-14-scale': 1.0, 'vdw-15-scale': 1.0,
+    'chg-12-scale': 0.0, 'chg-13-scale': 0.0, 'chg-14-scale': 1.0, 'chg-15-scale': 1.0,
+    'mpole-12-scale': 0.0, 'mpole-13-scale': 0.0, 'mpole-14-scale': 1.0, 'mpole-15-scale': 1.0,
+}
+
+def params_path(prm_file):
+    """Returns the path of the parameter cache stored next to the .prm file."""
+    return f"{prm_file}.params.npz"
+
+def _table(entries, fill, dtype):
+    """Array indexed by type or class number, fill where a number has no entry."""
+    table = np.full(max(entries, default=0) + 1, fill, dtype=dtype)
+    for number, value in entries.items():
+        table[number] = value
+    return table
+
+class ForceField:
+    """
+    Nonbonded parameters of a force field as arrays.
+
+    type_class[t] is the atom class of atom type t (-1 when t is not
+    defined), type_charge[t] its charge or monopole, class_radius[c],
+    class_epsilon[c] and class_reduction[c] the vdW parameters of class c as
+    written in the file (NaN when c has none). keywords holds the settings
+    in DEFAULT_KEYWORDS, and 'charges' tells whether the charges come from
+    'multipole' or 'charge' records (None when the file has neither).
+    """
+
+    def __init__(self, type_class, type_charge, class_radius, class_epsilon, class_reduction, keywords):
+        self.type_class = type_class
+        self.type_charge = type_charge
+        self.class_radius = class_radius
+        self.class_epsilon = class_epsilon
+        self.class_reduction = class_reduction
+        self.keywords = keywords
+
+    @classmethod
+    def parse(cls, prm_file):
+        keywords = dict(DEFAULT_KEYWORDS)
+        classes, radius, epsilon, reduction, charges, monopoles = {}, {}, {}, {}, {}, {}
+        with open(prm_file, 'r', errors='replace') as infile:
+            for line in infile:
+                parts = line.split()
+                if not parts or parts[0].startswith('#'):
+                    continue
+                keyword = parts[0].lower()
+                try:
+                    if keyword == 'atom':
+                        # atom type class symbol "description" atomic_number mass valence
+                        atom_type = int(parts[1])
+                        try:
+                            classes[atom_type] = int(parts[2])
+                        except ValueError:  # Old files without the class column
+                            classes[atom_type] = atom_type
+                    elif keyword == 'vdw':
+                        atom_class = int(parts[1])
+                        radius[atom_class] = float(parts[2])
+                        epsilon[atom_class] = float(parts[3])
+                        reduction[atom_class] = float(parts[4]) if len(parts) > 4 else 0.0
+                    elif keyword == 'charge':
+                        charges[int(parts[1])] = float(parts[2])
+                    elif keyword == 'multipole':
+                        # multipole type frame_atoms... monopole, followed by the dipole and quadrupole lines.
+                        # A type can have several frames, they share the monopole.
+                        monopoles.setdefault(int(parts[1]), float(parts[-1]))
+                    elif keyword in keywords and len(parts) > 1:
+                        default = DEFAULT_KEYWORDS[keyword]
+                        keywords[keyword] = float(parts[1]) if isinstance(default, float) else parts[1].upper()
+                except (IndexError, ValueError):
+                    print(f"Warning: Skipping the unreadable line of {prm_file}: {line.strip()}")
+        keywords['charges'] = 'multipole' if monopoles else 'charge' if charges else None
+        return cls(_table(classes, -1, np.int32), _table(monopoles or charges, 0.0, np.float64),
+                   _table(radius, np.nan, np.float64), _table(epsilon, np.nan, np.float64),
+                   _table(reduction, 0.0, np.float64), keywords)
+
+    def save(self, path, key):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, key=np.array(key), type_class=self.type_class, type_charge=self.type_charge,
+                 class_radius=self.class_radius, class_epsilon=self.class_epsilon,
+                 class_reduction=self.class_reduction, keywords=np.array(json.dumps(self.keywords)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """Loads cached parameters, returns None when they are missing or were read from another file."""
+        try:
+            with np.load(path) as data:
+                if str(data['key']) != key:
+                    return None
+                return cls(data['type_class'], data['type_charge'], data['class_radius'], data['class_epsilon'],
+                           data['class_reduction'], json.loads(str(data['keywords'])))
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            return None
+
+    def atom_parameters(self, atom_types):
+        """
+        Returns the (charge, radius, epsilon, reduction) arrays of atoms with the given types.
+
+        radius is half the minimum energy distance of two such atoms, whatever
+        radiustype and radiussize the file uses. Atoms of a type without
+        parameters get zeros, with a warning.
+        """
+        atom_types = np.asarray(atom_types, dtype=np.int64)
+        known = (atom_types >= 0) & (atom_types < len(self.type_class))
+        atom_class = np.where(known, self.type_class[np.where(known, atom_types, 0)], -1)
+        has_vdw = (atom_class >= 0) & (atom_class < len(self.class_radius))
+        index = np.where(has_vdw, atom_class, 0)
+        has_vdw &= ~np.isnan(self.class_radius[index])
+        missing = np.unique(atom_types[~has_vdw])
+        if len(missing):
+            print(f"Warning: No vdW parameters for atom types {', '.join(str(t) for t in missing[:10])}"
+                  f"{' ...' if len(missing) > 10 else ''}, their atoms are left out of the vdW energy.")
+
+        charged = (atom_types >= 0) & (atom_types < len(self.type_charge))
+        charge = np.where(charged, self.type_charge[np.where(charged, atom_types, 0)], 0.0)
+        radius = np.where(has_vdw, self.class_radius[index], 0.0)
+        epsilon = np.where(has_vdw, self.class_epsilon[index], 0.0)
+        reduction = np.where(has_vdw, self.class_reduction[index], 0.0)
+        if self.keywords['radiustype'] == 'SIGMA':
+            radius = radius * 2.0 ** (1.0 / 6.0)
+        if self.keywords['radiussize'] == 'DIAMETER':
+            radius = radius * 0.5
+        return charge, radius, epsilon, reduction
+
+    def summary(self):
+        return (f"{np.count_nonzero(self.type_class >= 0)} atom types, "
+                f"{np.count_nonzero(~np.isnan(self.class_radius))} vdW classes, "
+                f"{self.keywords['charges'] or 'no'} charges, {self.keywords['vdwtype']} vdW")
+
+def load_force_field(prm_file):
+    """
+    Returns the parameters of a .prm file, parsing it only when it changed since the last call.
+    """
+    with open(prm_file, 'rb') as infile:
+        key = hashlib.sha256(infile.read()).hexdigest()
+    path = params_path(prm_file)
+    force_field = ForceField.load(path, key)
+    if force_field is None:
+        force_field = ForceField.parse(prm_file)
+        try:
+            force_field.save(path, key)
+        except OSError as e:
+            print(f"Warning: Could not store the parameters of {prm_file}. {e}")
+    return force_field
+
+if __name__ == '__main__':
+    for prm_file in sys.argv[1:]:
+        print(f"{prm_file}: {load_force_field(prm_file).summary()}")
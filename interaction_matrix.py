@@ -0,0 +1,287 @@
+"""
+Residue-residue interaction energies stored as one symmetric matrix per energy component.
+
+A store is a directory with meta.json and, for every component, either
+dense <name>.mean.npy / <name>.std.npy matrices (float32, NaN for pairs that
+were not evaluated) or, for sparse stores, <name>.npz with the i, j, mean and
+std arrays of the evaluated pairs. Rows and columns are residue numbers, so
+row 0 (the residue list placeholder) is empty.
+
+    python interaction_matrix.py eda_matrix top 112 --k 20
+    python interaction_matrix.py eda_matrix threshold 5.0
+    python interaction_matrix.py eda_matrix csv pairs.csv
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+from energy_parser import COMPONENTS, REPORTED_COMPONENTS
+from stats import RunningStats
+
+def _file_name(component):
+    return re.sub(r"[^A-Za-z0-9]+", "_", component).strip("_")
+
+class InteractionMatrix:
+    """
+    Mean and standard deviation of every component for every pair of residues.
+
+    dense[component] is a (mean, std) pair of (n, n) arrays, or sparse[component]
+    holds the (i, j, mean, std) arrays of the evaluated pairs, i < j.
+    """
+
+    def __init__(self, n_residues, components, dense=None, sparse=None):
+        self.n_residues = n_residues
+        self.components = list(components)
+        self.dense = dense
+        self.sparse = sparse
+
+    @classmethod
+    def from_results(cls, results, n_residues, sparse=False):
+        """Builds the matrices from a dict (i, j) -> energy_components, as returned by archive_sep_pair."""
+        components = [c for c in REPORTED_COMPONENTS if any(c in ec for ec in results.values())]
+        components += sorted({c for ec in results.values() for c in ec} - set(components))
+        pairs = sorted(results)
+        i = np.array([pair[0] for pair in pairs], dtype=np.int32)
+        j = np.array([pair[1] for pair in pairs], dtype=np.int32)
+        columns = {}
+        for component in components:
+            mean = np.array([results[pair][component].mean if component in results[pair] else np.nan for pair in pairs],
+                            dtype=np.float32)
+            std = np.array([results[pair][component].std if component in results[pair] else np.nan for pair in pairs],
+                           dtype=np.float32)
+            columns[component] = (i, j, mean, std)
+        if sparse:
+            return cls(n_residues, components, sparse=columns)
+        dense = {}
+        for component, (i, j, mean, std) in columns.items():
+            matrices = []
+            for values in (mean, std):
+                matrix = np.full((n_residues, n_residues), np.nan, dtype=np.float32)
+                matrix[i, j] = values
+                matrix[j, i] = values
+                matrices.append(matrix)
+            dense[component] = tuple(matrices)
+        return cls(n_residues, components, dense=dense)
+
+    @classmethod
+    def from_energy_analysis(cls, path, n_residues=None, sparse=False):
+        """Reads the pair lines of an energy_analysis.txt file (the last line of a pair wins)."""
+        names_re = re.compile("|".join(re.escape(name) for name in sorted(COMPONENTS, key=len, reverse=True)))
+        results = {}
+        names = list(REPORTED_COMPONENTS)
+        with open(path, 'r') as infile:
+            for line in infile:
+                match = re.match(r"res (\d+) - res (\d+) (.*)", line)
+                if match is None:
+                    if names_re.match(line.strip()):
+                        names = names_re.findall(line)
+                    continue
+                values = [float(value) for value in match.group(3).split()]
+                results[(int(match.group(1)), int(match.group(2)))] = {
+                    name: RunningStats(1, values[2 * k], values[2 * k + 1] ** 2) for k, name in enumerate(names)}
+        if n_residues is None:
+            n_residues = max((max(pair) for pair in results), default=0) + 1
+        return cls.from_results(results, n_residues, sparse)
+
+    def _check(self, component):
+        if component not in self.components:
+            raise KeyError(f"No component '{component}', the store has {', '.join(self.components)}.")
+
+    def pairs(self, component=REPORTED_COMPONENTS[0]):
+        """Returns the (i, j, mean, std) arrays of every evaluated pair, i < j."""
+        self._check(component)
+        if self.sparse is not None:
+            i, j, mean, std = self.sparse[component]
+            keep = ~np.isnan(mean)
+            return i[keep], j[keep], mean[keep], std[keep]
+        mean, std = self.dense[component]
+        i, j = np.triu_indices(self.n_residues, k=1)
+        keep = ~np.isnan(mean[i, j])
+        i, j = i[keep], j[keep]
+        return i, j, mean[i, j], std[i, j]
+
+    def partners(self, residue, component=REPORTED_COMPONENTS[0], k=20, by='mean'):
+        """
+        Returns the k strongest partners of a residue as (partner, mean, std) arrays.
+
+        by='mean' puts the most negative (most favourable) energies first,
+        by='abs' the largest magnitudes.
+        """
+        self._check(component)
+        if self.sparse is not None:
+            i, j, mean, std = self.sparse[component]
+            mine = ((i == residue) | (j == residue)) & ~np.isnan(mean)
+            partner = np.where(i[mine] == residue, j[mine], i[mine])
+            mean, std = mean[mine], std[mine]
+        else:
+            row_mean, row_std = self.dense[component][0][residue], self.dense[component][1][residue]
+            partner = np.flatnonzero(~np.isnan(row_mean))
+            mean, std = row_mean[partner], row_std[partner]
+        key = mean if by == 'mean' else -np.abs(mean)
+        order = np.argsort(key, kind='stable')[:k]
+        return partner[order], mean[order], std[order]
+
+    def threshold(self, value, component=REPORTED_COMPONENTS[0]):
+        """Returns the (i, j, mean, std) of the pairs with |mean| >= value, strongest first."""
+        i, j, mean, std = self.pairs(component)
+        keep = np.abs(mean) >= value
+        order = np.argsort(-np.abs(mean[keep]), kind='stable')
+        return i[keep][order], j[keep][order], mean[keep][order], std[keep][order]
+
+    def submatrix(self, residues, component=REPORTED_COMPONENTS[0], stat='mean'):
+        """Returns the len(residues) x len(residues) block of the mean (or std) matrix, NaN where not evaluated."""
+        self._check(component)
+        residues = np.asarray(residues, dtype=np.int64)
+        column = 0 if stat == 'mean' else 1
+        if self.sparse is None:
+            return np.asarray(self.dense[component][column][np.ix_(residues, residues)])
+        position = np.full(self.n_residues, -1, dtype=np.int64)
+        position[residues] = np.arange(len(residues))
+        i, j = self.sparse[component][:2]
+        values = self.sparse[component][2 + column]
+        inside = (position[i] >= 0) & (position[j] >= 0)
+        block = np.full((len(residues), len(residues)), np.nan, dtype=np.float32)
+        block[position[i[inside]], position[j[inside]]] = values[inside]
+        block[position[j[inside]], position[i[inside]]] = values[inside]
+        return block
+
+    def merged(self, results):
+        """
+        Returns a new store with the pairs of results (a dict (i, j) ->
+        energy_components) replacing the values stored for them.
+        """
+        update = InteractionMatrix.from_results(results, self.n_residues, sparse=True)
+        components = self.components + [c for c in update.components if c not in self.components]
+        n = self.n_residues
+        if self.sparse is None:
+            dense = {}
+            for component in components:
+                if component in self.dense:
+                    mean, std = (np.array(matrix) for matrix in self.dense[component])
+                else:
+                    mean, std = (np.full((n, n), np.nan, dtype=np.float32) for _ in range(2))
+                if component in update.sparse:
+                    i, j, new_mean, new_std = update.sparse[component]
+                    mean[i, j], mean[j, i], std[i, j], std[j, i] = new_mean, new_mean, new_std, new_std
+                dense[component] = (mean, std)
+            return InteractionMatrix(n, components, dense=dense)
+
+        def pair_keys(store):
+            if not store.components:
+                return np.zeros(0, dtype=np.int64)
+            i, j = store.sparse[store.components[0]][:2]
+            return i.astype(np.int64) * n + j
+
+        new_keys = pair_keys(update)
+        keys = np.union1d(pair_keys(self), new_keys)
+        i, j = (keys // n).astype(np.int32), (keys % n).astype(np.int32)
+        replaced = np.isin(keys, new_keys)
+        missing = (np.full(len(keys), np.nan), np.full(len(keys), np.nan))
+        sparse = {}
+        for component in components:
+            old = self._values(component, i, j) if component in self.components else missing
+            new = update._values(component, i, j) if component in update.components else missing
+            sparse[component] = (i, j, np.where(replaced, new[0], old[0]).astype(np.float32),
+                                 np.where(replaced, new[1], old[1]).astype(np.float32))
+        return InteractionMatrix(n, components, sparse=sparse)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for component in self.components:
+            name = os.path.join(directory, _file_name(component))
+            if self.sparse is not None:
+                i, j, mean, std = self.sparse[component]
+                np.savez(f"{name}.npz", i=i, j=j, mean=mean, std=std)
+            else:
+                np.save(f"{name}.mean.npy", self.dense[component][0])
+                np.save(f"{name}.std.npy", self.dense[component][1])
+        with open(os.path.join(directory, "meta.json"), 'w') as file:
+            json.dump({'n_residues': self.n_residues, 'components': self.components,
+                       'sparse': self.sparse is not None}, file)
+
+    @classmethod
+    def load(cls, directory):
+        """Opens a store, dense matrices are memory-mapped."""
+        with open(os.path.join(directory, "meta.json"), 'r') as file:
+            meta = json.load(file)
+        if meta['sparse']:
+            sparse = {}
+            for component in meta['components']:
+                with np.load(os.path.join(directory, f"{_file_name(component)}.npz")) as data:
+                    sparse[component] = (data['i'], data['j'], data['mean'], data['std'])
+            return cls(meta['n_residues'], meta['components'], sparse=sparse)
+        dense = {component: tuple(np.load(os.path.join(directory, f"{_file_name(component)}.{stat}.npy"), mmap_mode='r')
+                                  for stat in ('mean', 'std'))
+                 for component in meta['components']}
+        return cls(meta['n_residues'], meta['components'], dense=dense)
+
+    def _values(self, component, i, j):
+        """mean and std of the pairs (i, j), NaN for the pairs the component was not evaluated for."""
+        if self.sparse is None:
+            mean, std = self.dense[component]
+            return np.asarray(mean[i, j]), np.asarray(std[i, j])
+        si, sj, mean, std = self.sparse[component]
+        keys = si.astype(np.int64) * self.n_residues + sj
+        wanted = i.astype(np.int64) * self.n_residues + j
+        position = np.clip(np.searchsorted(keys, wanted), 0, max(len(keys) - 1, 0))
+        found = keys[position] == wanted if len(keys) else np.zeros(len(wanted), dtype=bool)
+        return np.where(found, mean[position], np.nan), np.where(found, std[position], np.nan)
+
+    def to_csv(self, path):
+        """Writes one line per evaluated pair with the mean and std of every component."""
+        if self.sparse is not None:
+            i, j = self.sparse[self.components[0]][:2]
+        else:
+            i, j = np.triu_indices(self.n_residues, k=1)
+            evaluated = np.zeros(len(i), dtype=bool)
+            for component in self.components:
+                evaluated |= ~np.isnan(self.dense[component][0][i, j])
+            i, j = i[evaluated], j[evaluated]
+        columns = [i, j]
+        header = ["res_i", "res_j"]
+        for component in self.components:
+            columns.extend(self._values(component, i, j))
+            header += [f"{_file_name(component)}_mean", f"{_file_name(component)}_std"]
+        np.savetxt(path, np.column_stack(columns), delimiter=",", header=",".join(header), comments="",
+                   fmt=["%d", "%d"] + ["%.4f"] * (len(columns) - 2))
+
+    def to_npy(self, directory):
+        """Writes dense <name>.mean.npy / <name>.std.npy matrices of every component, also for sparse stores."""
+        os.makedirs(directory, exist_ok=True)
+        everything = np.arange(self.n_residues)
+        for component in self.components:
+            name = os.path.join(directory, _file_name(component))
+            np.save(f"{name}.mean.npy", self.submatrix(everything, component, 'mean'))
+            np.save(f"{name}.std.npy", self.submatrix(everything, component, 'std'))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query an interaction matrix store.")
+    parser.add_argument("store")
+    parser.add_argument("--component", default=REPORTED_COMPONENTS[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    top = commands.add_parser('top', help="Strongest partners of a residue.")
+    top.add_argument("residue", type=int)
+    top.add_argument("--k", type=int, default=20)
+    top.add_argument("--abs", action='store_true', help="Rank by magnitude instead of most negative.")
+    above = commands.add_parser('threshold', help="Pairs with |mean| at least the value.")
+    above.add_argument("value", type=float)
+    csv = commands.add_parser('csv', help="Export all the pairs to CSV.")
+    csv.add_argument("path")
+    npy = commands.add_parser('npy', help="Export dense matrices to a directory.")
+    npy.add_argument("directory")
+    args = parser.parse_args()
+
+    matrix = InteractionMatrix.load(args.store)
+    if args.command == 'top':
+        for partner, mean, std in zip(*matrix.partners(args.residue, args.component, args.k, 'abs' if args.abs else 'mean')):
+            print(f"res {args.residue} - res {partner:<6d} {mean:>9.2f} {std:>7.2f}")
+    elif args.command == 'threshold':
+        for i, j, mean, std in zip(*matrix.threshold(args.value, args.component)):
+            print(f"res {i} - res {j:<6d} {mean:>9.2f} {std:>7.2f}")
+    elif args.command == 'csv':
+        matrix.to_csv(args.path)
+    else:
+        matrix.to_npy(args.directory)
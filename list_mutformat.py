@@ -1,5 +1,8 @@
 import csv
 
+# Columns of the mutation table: wild type residue, position and alternative residue
+MUTATION_COLUMNS = ('RrefAA', 'PP', 'AltAA')
+
 def process_file(input_filename, output_filename):
     # Open the input file for reading and output file for writing.
     with open(input_filename, 'r', newline='') as infile, open(output_filename, 'w', newline='') as outfile:
@@ -8,7 +11,7 @@ def process_file(input_filename, output_filename):
         for row in reader:
             # Create the new string in the desired format:
             # RrefAA + PP + AltAA
-            new_value = f"{row['RrefAA']}{row['PP']}{row['AltAA']}"
+            new_value = "".join(str(row[column]) for column in MUTATION_COLUMNS)
             outfile.write(new_value + '\n')
 
 if __name__ == '__main__':
@@ -0,0 +1,129 @@
+"""
+EDA of point mutants: only the pairs that involve a mutated residue are evaluated, the others come from the wild type.
+
+A mutation only changes the pairs of its own residue, so a mutant costs
+O(N) pairs instead of O(N^2). The wild type is an interaction matrix store
+(see interaction_matrix.py), for example the matrix_dir of a full new_main.py
+run; with --wild-arc it is computed and stored the first time it is needed.
+The original residues of the mutations are only checked when the wild type
+--sequence is given.
+
+    python mutant_eda.py mutant_A12V.arc A12V --wild-type eda_matrix --output eda_matrix_A12V
+    python mutant_eda.py mutant.arc --mutation-file output_file.txt --wild-type eda_matrix --wild-arc EDA-test/test.arc
+"""
+import argparse
+import os
+
+import numpy as np
+
+import new_main
+from apply_mutations import parse_mutations, read_mutation_list, validate_mutations
+from interaction_matrix import InteractionMatrix
+from read_sep_arc import reference_pairs
+from topology import load_topology
+
+def mutation_residues(topology, mutations, first_position=1, sequence=None):
+    """
+    Maps mutations like 'A12V' to residue numbers of the residue list of new_main.
+
+    Sequence position p is the (p - first_position + 1)-th protein residue of
+    the structure. Returns a dict mutation -> residue number, mutations
+    outside the structure are reported and left out. When the wild type
+    sequence is given the original residues are checked against it.
+    """
+    positions, original, new, names = parse_mutations(mutations)
+    if sequence is not None:
+        validate_mutations(np.frombuffer(sequence.encode(), dtype=np.uint8), positions, original, names)
+    protein = topology.protein_residue_numbers(new_main.residue_kinds)
+    mapped = {}
+    for name, k in zip(names, positions - (first_position - 1)):
+        if 0 <= k < len(protein):
+            mapped[name] = int(protein[k])
+        else:
+            print(f"Warning: {name} is outside the {len(protein)} protein residues of the structure.")
+    return mapped
+
+def read_sequence(value):
+    """Returns a sequence given as one-letter codes or as a (FASTA or plain) file holding it."""
+    if not os.path.isfile(value):
+        return value.strip().upper()
+    with open(value, 'r') as infile:
+        return "".join(line.strip() for line in infile if not line.startswith('>')).upper()
+
+def _use_trajectory(arc_file):
+    """Points new_main at arc_file and returns its residue list."""
+    _, frames, residues = new_main.open_trajectory(arc_file)
+    if frames is None:
+        raise ValueError(f"Could not read the frames of {arc_file}.")
+    return residues
+
+def load_wild_type(wild_type_dir, prm_file, wild_arc=None, workers=1, cache_dir=None, extractor='archive'):
+    """
+    Returns the wild type interaction matrix stored in wild_type_dir.
+
+    When there is none yet and wild_arc is given, every pair of the wild
+    type trajectory is evaluated and the matrix is stored there.
+    """
+    if os.path.exists(os.path.join(wild_type_dir, "meta.json")):
+        return InteractionMatrix.load(wild_type_dir)
+    if wild_arc is None:
+        raise FileNotFoundError(f"No interaction matrix in {wild_type_dir}, run the wild type first or give its arc file.")
+    print(f"Evaluating the wild type {wild_arc} for {wild_type_dir}")
+    residues = _use_trajectory(wild_arc)
+    results = new_main.archive_sep_pair(residues, prm_file, workers=workers, cache_dir=cache_dir, extractor=extractor)
+    matrix = InteractionMatrix.from_results(results or {}, len(residues))
+    matrix.save(wild_type_dir)
+    return matrix
+
+def run_mutant_eda(arc_file, prm_file, mutations, wild_type_dir, output_dir, wild_arc=None, workers=1, cache_dir=None,
+                   extractor='archive', first_position=1, sequence=None):
+    """
+    Evaluates the pairs of the mutated residues of a mutant trajectory and
+    stores them, with every other pair taken from the wild type, as an
+    interaction matrix in output_dir. Returns the merged matrix.
+    """
+    wild_type = load_wild_type(wild_type_dir, prm_file, wild_arc, workers, cache_dir, extractor)
+    residues = _use_trajectory(arc_file)
+    if len(residues) != wild_type.n_residues:
+        raise ValueError(f"{arc_file} has {len(residues) - 1} residues, the wild type in {wild_type_dir} "
+                         f"has {wild_type.n_residues - 1}.")
+    mapped = mutation_residues(load_topology(arc_file), mutations, first_position, sequence)
+    for name, residue in mapped.items():
+        print(f"{name} -> residue {residue}")
+    pairs = reference_pairs(set(mapped.values()), len(residues))
+    n_pairs = (len(residues) - 1) * (len(residues) - 2) // 2
+    print(f"{len(pairs)} of {n_pairs} pairs involve a mutated residue.")
+
+    results = new_main.archive_sep_pair(residues, prm_file, workers=workers, cache_dir=cache_dir, extractor=extractor,
+                                        pairs=pairs) if pairs else {}
+    matrix = wild_type.merged(results or {})
+    matrix.save(output_dir)
+    print(f"Interaction matrices of the mutant written to {output_dir}")
+    return matrix
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="EDA of a point mutant, reusing the wild type for unchanged pairs.")
+    parser.add_argument("arc", help="Trajectory of the mutant.")
+    parser.add_argument("mutations", nargs='*', help="Mutations like A12V.")
+    parser.add_argument("--mutation-file", default=None, help="One mutation per line, e.g. output_file.txt.")
+    parser.add_argument("--prm", default=new_main.prm_file)
+    parser.add_argument("--wild-type", required=True,
+                        help="Interaction matrix store of the wild type, e.g. the matrix_dir of a new_main.py run.")
+    parser.add_argument("--wild-arc", default=None, help="Wild type trajectory, evaluated when the store is missing.")
+    parser.add_argument("--output", default="eda_matrix_mutant")
+    parser.add_argument("--first-position", type=int, default=1, help="Sequence position of the first residue.")
+    parser.add_argument("--sequence", default=None,
+                        help="Wild type sequence, or a FASTA file with it, to check the mutations against.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache-dir", default=new_main.cache_dir, help="Result cache shared with new_main.py.")
+    parser.add_argument("--extractor", choices=('archive', 'native'), default='archive')
+    args = parser.parse_args()
+
+    mutations = list(args.mutations)
+    if args.mutation_file is not None:
+        mutations += read_mutation_list(args.mutation_file)
+    if not mutations:
+        parser.error("give the mutations or a --mutation-file")
+    run_mutant_eda(args.arc, args.prm, mutations, args.wild_type, args.output, args.wild_arc, args.workers,
+                   args.cache_dir, args.extractor, args.first_position,
+                   read_sequence(args.sequence) if args.sequence is not None else None)
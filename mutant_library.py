@@ -0,0 +1,184 @@
+"""
+Double, triple, ... mutant libraries built lazily from a list of single mutations.
+
+A variant is stored as its delta from the wild type: one uint32 per
+mutation, (0-indexed position << 8) | new residue code, sorted by position.
+A library file holds the SHA-256 of the wild type it applies to followed by
+one record per variant (a uint8 count and the deltas).
+
+    python mutant_library.py output_file.txt library.bin --order 2 3 --window 15
+"""
+import argparse
+import hashlib
+import os
+
+import numpy as np
+
+from apply_mutations import parse_mutations, protein_sequence, read_mutation_list, validate_mutations
+
+MAGIC = b"MUTLIB1\n"
+
+def encode_mutations(positions, new):
+    """One uint32 delta per mutation, (position << 8) | residue code."""
+    return (positions.astype(np.uint32) << 8) | new.astype(np.uint32)
+
+def prepare_mutations(sequence, mutations):
+    """
+    Parses and validates the single mutations and returns their deltas, sorted by position.
+
+    Mutations outside the sequence and mutations to the wild type residue are
+    dropped, and repeated mutations are kept once, so every combination of
+    the returned deltas is a distinct variant.
+    """
+    positions, original, new, names = parse_mutations(mutations)
+    wild_type = np.frombuffer(sequence.encode(), dtype=np.uint8)
+    in_range, mismatch = validate_mutations(wild_type, positions, original, names)
+    keep = in_range.copy()
+    keep[in_range] = wild_type[positions[in_range]] != new[in_range]
+    return np.unique(encode_mutations(positions[keep], new[keep]))
+
+def iter_combinations(codes, order, window=None):
+    """
+    Yields the combinations of order deltas (as tuples of ints) with all their positions different.
+
+    With a window only the combinations whose positions span at most window
+    residues are generated. Combinations are produced one at a time, so
+    nothing is held in memory but the deltas.
+    """
+    positions = codes >> 8
+    n = len(codes)
+    after = np.searchsorted(positions, positions, side='right')  # First delta at a later position
+    if window is None:
+        limit = np.full(n, n)
+    else:
+        limit = np.searchsorted(positions, positions + window, side='right')
+    codes = codes.tolist()
+
+    def extend(combination, start, stop):
+        if len(combination) == order:
+            yield combination
+            return
+        for k in range(start, stop):
+            yield from extend(combination + (codes[k],), after[k], stop)
+
+    for first in range(n):
+        yield from extend((codes[first],), after[first], limit[first])
+
+def iter_variants(sequence, mutations, orders=(2, 3), window=None):
+    """Yields the deltas of every variant of the given orders, see iter_combinations. Every variant is yielded once."""
+    codes = prepare_mutations(sequence, mutations)
+    for order in dict.fromkeys(orders):
+        yield from iter_combinations(codes, order, window)
+
+def variant_name(deltas, sequence):
+    """Returns the name of a variant, e.g. 'A12V:G45K'."""
+    return ":".join(f"{sequence[code >> 8]}{(code >> 8) + 1}{chr(code & 0xFF)}" for code in deltas)
+
+def apply_deltas(deltas, sequence):
+    """Returns the full sequence of a variant."""
+    buffer = bytearray(sequence.encode())
+    for code in deltas:
+        buffer[code >> 8] = code & 0xFF
+    return buffer.decode()
+
+class LibraryWriter:
+    """
+    Appends variants to a library file, skipping the ones it already holds.
+
+    With append=True the variants already in the file are found by an 8-byte
+    BLAKE2 digest of their records, kept as a sorted uint64 array, so a
+    library can be extended by later runs with different mutation lists or
+    orders without storing a variant twice. Variants added through the
+    writer are not remembered: iter_variants yields every variant once.
+    """
+
+    def __init__(self, path, sequence, append=False, buffer_size=1 << 20):
+        self.path = path
+        self.wild_type = hashlib.sha256(sequence.encode()).hexdigest().encode()
+        self.existing = np.zeros(0, dtype=np.uint64)
+        self.count = 0
+        if append and os.path.exists(path):
+            digests = (self._digest(self._record(deltas)) for deltas in read_library(path, sequence))
+            self.existing = np.sort(np.fromiter(digests, dtype=np.uint64))
+            self.file = open(path, 'ab', buffering=buffer_size)
+        else:
+            self.file = open(path, 'wb', buffering=buffer_size)
+            self.file.write(MAGIC + self.wild_type + b"\n")
+
+    @staticmethod
+    def _record(deltas):
+        return bytes((len(deltas),)) + np.asarray(deltas, dtype='<u4').tobytes()
+
+    @staticmethod
+    def _digest(record):
+        return np.uint64(int.from_bytes(hashlib.blake2b(record, digest_size=8).digest(), 'little'))
+
+    def add(self, deltas):
+        """Writes one variant, returns False when it was in the library before this writer opened it."""
+        record = self._record(deltas)
+        if len(self.existing):
+            digest = self._digest(record)
+            k = np.searchsorted(self.existing, digest)
+            if k < len(self.existing) and self.existing[k] == digest:
+                return False
+        self.file.write(record)
+        self.count += 1
+        return True
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def read_library(path, sequence=None, buffer_size=1 << 20):
+    """
+    Yields the deltas of every variant in a library file, as tuples of ints.
+
+    Records are read one at a time through a buffered file, so a library
+    larger than memory can be read. When the wild type sequence is given it
+    is checked against the one the library was built for.
+    """
+    with open(path, 'rb', buffering=buffer_size) as infile:
+        if infile.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a mutant library.")
+        wild_type = infile.readline().strip()
+        if sequence is not None and wild_type != hashlib.sha256(sequence.encode()).hexdigest().encode():
+            raise ValueError(f"{path} was built for another wild type sequence.")
+        while True:
+            count = infile.read(1)
+            if not count:
+                return
+            data = infile.read(4 * count[0])
+            if len(data) != 4 * count[0]:
+                raise ValueError(f"{path} ends with a truncated variant.")
+            yield tuple(np.frombuffer(data, dtype='<u4').tolist())
+
+def write_library(sequence, mutations, path, orders=(2, 3), window=None, append=False):
+    """Writes every variant of the given orders to a library file, returns the number of new variants."""
+    with LibraryWriter(path, sequence, append=append) as library:
+        for deltas in iter_variants(sequence, mutations, orders, window):
+            library.add(deltas)
+    return library.count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Combinatorial mutant library from a list of single mutations.")
+    parser.add_argument("mutations", nargs='?', default="output_file.txt", help="One mutation (A12V) per line.")
+    parser.add_argument("library", nargs='?', default="mutant_library.bin")
+    parser.add_argument("--order", type=int, nargs='+', default=[2, 3], help="Numbers of mutations per variant.")
+    parser.add_argument("--window", type=int, default=None, help="Largest distance between the mutated positions.")
+    parser.add_argument("--append", action='store_true', help="Add to an existing library, skipping known variants.")
+    parser.add_argument("--decode", action='store_true', help="Print the variants of the library instead.")
+    args = parser.parse_args()
+
+    if args.decode:
+        for deltas in read_library(args.library, protein_sequence):
+            print(variant_name(deltas, protein_sequence))
+    else:
+        count = write_library(protein_sequence, read_mutation_list(args.mutations), args.library,
+                              tuple(args.order), args.window, args.append)
+        print(f"{count} variants written to {args.library}")
@@ -3,17 +3,38 @@ import os
 import glob 
 import time
 import sys
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import Pool
+
+from arc_index import load_frame_index
+from atom_table import read_atom_table
+from energy_parser import COLUMN, REPORTED_COMPONENTS, AnalyzeParser, EnergySeriesStore
+from energy_screen import energy_screen
+from interaction_matrix import InteractionMatrix
+from pair_extract import extract_pairs
+from pair_screen import screen_pairs
+from result_cache import ResultCache
+from scheduler import CostModel, run_scheduled
+from sampling import BlockConvergence, block_offsets
+from stats import RunningStats
+from topology import load_topology
+from tracing import tracer
+from trajectory_cache import load_trajectory_cache, read_trajectory_cache
 
 def get_header_and_repetitions(arc_file):
-    """Reads the header line and counts its repetitions (frames)."""
+    """Reads the header line and counts its repetitions (frames) from the frame index."""
     global line_to_search
     global repetitions
-    
+    global frame_index
+
     line_to_search = None
     repetitions = None
     try:
-        with open(arc_file, 'r', encoding='utf-8') as file:
-            line_to_search = file.readline().strip()
+        with tracer.stage("header"):
+            frame_index = load_frame_index(arc_file)
     except FileNotFoundError:
         print(f"Error: The file {arc_file} was not found.")
         return None, None
@@ -21,259 +42,721 @@ def get_header_and_repetitions(arc_file):
         print(f"An error occurred while reading the file: {e}")
         return None, None
 
+    line_to_search = frame_index.header
     if line_to_search:
         print(f"Header line found: '{line_to_search}'")
-        #repetitions = count_frames_in_arc_file(arc_file, line_to_search)
-        count = 0
-        try:
-            with open(arc_file, 'r', encoding='utf-8') as file:
-                for line in file:
-                    if line.strip() == line_to_search:
-                        count += 1
-            repetitions = count
-        except FileNotFoundError:
-            print(f"Error: The file {arc_file} was not found.")
-            return None, None
-        if count is not None:
-             print(f"The header line repeats {count} times (frames).")
+        count = len(frame_index)
+        repetitions = count
+        print(f"The header line repeats {count} times (frames).")
         return line_to_search, count
     else:
         print("Could not determine the header line.")
         return None, None
 
+def open_trajectory(path, binary_cache=True):
+    """
+    Makes path the trajectory archive_sep_pair works on and returns its header line, frames and residues.
+
+    Reads the frame index (see get_header_and_repetitions), converts the
+    binary cache on first use when binary_cache is set and returns the
+    residue list of its topology. Returns (None, None, None) when the frames
+    cannot be read.
+    """
+    global arc_file
+
+    arc_file = path
+    header, frames = get_header_and_repetitions(path)
+    if frames is None:
+        return None, None, None
+    if binary_cache:
+        load_trajectory_cache(path)
+    return header, frames, load_topology(path).residue_list(residue_kinds)
+
 def read_tinker_xyz(arc_file):
     """
-    Reads a TINKER ARC file and returns a list of atoms.
+    Reads the first frame of a TINKER ARC file and returns its atom table.
+
+    The table is a NumPy structured array (see atom_table.ATOM_DTYPE) with the
+    fields atom_num, atom_sym, atom_type and xyz; use atom_table.read_atom_table
+    for the connectivity and atom_table.load_coordinates for all frames.
     """
     try:
-        with open (arc_file, 'r') as file:
-            try:
-                n_atoms = int(file.readline().strip())
-            except ValueError:
-                print("Error: The first line of the file must be an integer representing the number of atoms.")
-                return None
-            
-            n_atoms += 1
-            atoms_list = []
-            
-            for _ in range(n_atoms):
-                line = file.readline().strip()
-                #print(line)
-                if not line:  # Skip empty lines
-                    continue
-                parts = line.split()
-                if len(parts) < 7:  # Check if the line has enough data
-                    continue
-                atoms = {
-                    'atom_num': int(parts[0]),
-                    'atom_sym': parts[1],
-                    'x': float(parts[2]),
-                    'y': float(parts[3]),
-                    'z': float(parts[4]),
-                    'atom_type': int(parts[5]),
-                    'connect': [int(num) for num in parts[6:]]                
-                }
-                atoms['connect'] = [num for num in atoms['connect'] if num != 0]
-                atoms_list.append(atoms)
-            return atoms_list
+        atoms_list, connect_ptr, connect_idx = read_atom_table(arc_file)
+        return atoms_list
     except FileNotFoundError:
         print(f"Error: The file {arc_file} was not found.")
         return None
+    except ValueError as e:
+        print(f"Error: Could not read the atoms of {arc_file}. {e}")
+        return None
 
-def atoms_to_residues(atoms_list):
-    residues = []
-    current_residue = []
-    
-    for atom in atoms_list:
-        current_residue.append(atom)
-        # Assuming a new residue starts when the atom_sym is CA after N
-        if len(current_residue) >= 3 and \
-            current_residue[-3]['atom_sym'] == 'N' and \
-            current_residue[-2]['atom_sym'] == 'CA' and \
-            current_residue[-1]['atom_sym'] == 'C':
-            
-            residues.append(current_residue[:-3]) # Save the previous residue
-            current_residue = current_residue[-3:] # Start a new residue 
-
-    if current_residue:
-        residues.append(current_residue)  # Append the last residue
-    
-    return residues
-
-def archive_sep_pair(residues,prm_file):
+def pair_archive_input(arc_path, res1_range, res2_range, line_to_search, frames):
     """
-    Separates all of the possible pairs of the protein.
+    Builds the stdin sequence for TINKER archive that keeps only the atoms of two residues.
+
+    The atoms before, between and after the two residues are removed as
+    negative ranges, leaving out the empty ones (a residue that starts at
+    atom 1, adjacent residues, a residue that ends at the last atom).
+    frames is the (first, last, step) range of frames to keep, and the
+    atom count is the first field of the header line line_to_search.
     """
-    
-    if residues:
-        n = len(residues)
-        for i in range(1, n):
-            for j in range(i + 1, n):
-                res1 = residues[i]
-                res2 = residues[j]
-                
-                #Residue 1 atoms numbers
-                res1_an1 = res1[0]['atom_num']
-                res1_an2 = res1[-1]['atom_num']
-                
-                #Residue 2 atoms numbers
-                res2_an1 = res2[0]['atom_num']
-                res2_an2 = res2[-1]['atom_num']
-                
-                # Determines the order of the pairs of residues
-                if res1_an1 == 1 and res2_an1 == 17:
-                    command = "archive"
-                    input = f"{arc_file}\n3\n -{res2_an2 + 1} -{line_to_search} 0\n1 {repetitions} 1\n\r"
-                elif res1_an2 + 1 == res2_an1:
-                    command = "archive"
-                    input = f"{arc_file}\n3\n-1 -{res1_an1 - 1} -{res2_an2 + 1} -{line_to_search} 0\n1 {repetitions} 1\n\r"
-                elif res1_an1 < res2_an1:
-                    command = "archive"
-                    input = f"{arc_file}\n3\n-1 -{res1_an1 - 1} -{res1_an2 + 1} -{res2_an1 - 1} -{res2_an2 + 1} -{line_to_search} 1\n1 {repetitions} 1\n\r"
-                else:
-                    command = "archive"
-                    input = f"{arc_file}\n3\n-1 -{res2_an1 - 1} -{res2_an2 + 1} -{res1_an1 - 1} -{res1_an2 + 1} -{line_to_search} 1\n1 {repetitions} 1\n\r"
+    (first1, last1), (first2, last2) = sorted([res1_range, res2_range])
+    frame_line = " ".join(str(f) for f in frames)
 
-                # Executes archive.x to separate the residues
-                try:
-                    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    stdout, stderr = process.communicate(input=input.encode())
-                    print(f"--- TINKER Output ---\n",stdout)
-                    if stderr:
-                        print(f"TINKER Error:\n", stderr)
-                except FileNotFoundError:
-                    print(f"Error: archive did not run correctly.")
-                except Exception as e:
-                    print(f"An error occurred: {e}")
-                
-                #Renames the output file for easier identification
-                list_of_files = glob.glob('./EDA-test/*')
-                newest_files = max(list_of_files, key=os.path.getctime)
-                try:
-                    os.rename(newest_files, f"pair_{i}_{j}.arc")
-                    
-                except FileNotFoundError:
-                    print(f"Error: The file '{newest_files}' was not found for renaming.")
-                except OSError as e:
-                    print(f"Error: Could not rename the file. {e}")
-                
-                #Connectivity check and delete 0 in the connect list
-                # Read the file and process each atom's connect list
-                for file_name in glob.glob("pair_*.arc"):
-                    try:
-                        with open(file_name, 'r') as file:
-                            lines = file.readlines()
-                        
-                        # Process each line (atom) in the file
-                        for m in range(1, len(lines)):  # Skip header lines
-                            parts = lines[m].split()
-                            if len(parts) > 6:
-                                connect_list = [int(num) for num in parts[6:]]
-                                
-                                # Remove 0 from the connect list
-                                connect_list = [num for num in connect_list if num != 0]
-                                
-                                # Update the line with the modified connect list
-                                lines[m] = ' '.join(parts[:6] + [str(num) for num in connect_list]) + '\n'
-                        
-                        # Write the modified content back to the file
-                        with open(file_name, 'w') as file:
-                            file.writelines(lines)
-                            
-                    except FileNotFoundError:
-                        print(f"Error: The file '{file_name}' was not found.")
-                    except Exception as e:
-                        print(f"An error occurred while processing '{file_name}': {e}")
-                        
-                # Executes analyze.x process on the fly
-                
-                command = "analyze"
-                a_res = f"pair_{i}_{j}.arc"
-                input = f"{a_res}\n{prm_file}\nE\n\r"
+    removed = [(1, first1 - 1), (last1 + 1, first2 - 1), (last2 + 1, int(line_to_search.split()[0]))]
+    atom_line = " ".join(f"-{first} -{last}" for first, last in removed if first <= last)
+    return f"{arc_path}\n3\n{atom_line} 0\n{frame_line}\n\r"
+
+def default_scratch_root():
+    """Uses the in-memory /dev/shm for the pair files when it is available."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return "."
+
+def clean_connectivity(src, dst):
+    """
+    Copies an archive output file and deletes the 0 entries from the connect lists.
+
+    The file is streamed line by line, so it is read and written exactly once.
+    """
+    with open(src, 'r') as infile, open(dst, 'w') as outfile:
+        for line in infile:
+            parts = line.split()
+            if len(parts) > 6:
                 try:
-                    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                    stdout, stderr = process.communicate(input=input)
-                    
-                    if stderr:
-                        print(f"TINKER Error:\n", stderr)
+                    connect_list = [int(num) for num in parts[6:]]
+                except ValueError:  # Not an atom line (e.g. a long title)
+                    outfile.write(line)
+                    continue
+
+                # Remove 0 from the connect list
+                connect_list = [num for num in connect_list if num != 0]
+
+                line = ' '.join(parts[:6] + [str(num) for num in connect_list]) + '\n'
+            outfile.write(line)
+
+def init_pair_worker(scratch_root, arc_file, trace=False):
+    """
+    Gives the current process its own scratch directory with a link to the arc file.
+
+    TINKER archive writes its output next to the arc file it reads, so every
+    worker reads the trajectory through its own link and the newest file in
+    its scratch directory is always its own archive output. trace turns on
+    the tracer of the worker. The frame offsets are kept for the bytes of
+    the archive stage.
+    """
+    global worker_dir
+    global worker_arc
+    global worker_offsets
+
+    tracer.enabled = trace
+    index = load_frame_index(arc_file)
+    worker_offsets = index.offsets
+    index.close()
+
+    worker_dir = tempfile.mkdtemp(prefix=f"worker_{os.getpid()}_", dir=scratch_root)
+    worker_arc = os.path.join(worker_dir, os.path.basename(arc_file))
+    os.symlink(os.path.abspath(arc_file), worker_arc)
+
+def archive_pair(task):
+    """
+    Extracts the pair of a task with TINKER archive into the worker scratch directory.
+
+    Returns the path of the cleaned pair file, or None when archive failed.
+    """
+    i, j = task['i'], task['j']
+
+    # Executes archive.x to separate the residues
+    command = "archive"
+    input = pair_archive_input(worker_arc, task['res1'], task['res2'], task['header'], task['frames'])
+    try:
+        with tracer.stage("archive", pair=(i, j)) as span:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdout, stderr = process.communicate(input=input.encode())
+            # archive parses the arc file from the start up to the last frame of the range
+            last = min(task['frames'][1], len(worker_offsets) - 1)
+            span.add(read=worker_offsets[last],
+                     written=sum(os.path.getsize(f) for f in glob.glob(os.path.join(worker_dir, '*')) if f != worker_arc))
+        print(f"--- TINKER Output ---\n",stdout)
+        if stderr:
+            print(f"TINKER Error:\n", stderr)
+    except FileNotFoundError:
+        print(f"Error: archive did not run correctly.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+    # Cleans the connectivity of the archive output while copying it to the pair file
+    pair_file = os.path.join(worker_dir, f"pair_{i}_{j}.arc")
+    list_of_files = [f for f in glob.glob(os.path.join(worker_dir, '*')) if f != worker_arc]
+    if not list_of_files:
+        print(f"Error: archive did not write an output file for pair {i} - {j}.")
+        return None
+    newest_files = max(list_of_files, key=os.path.getctime)
+    try:
+        with tracer.stage("clean", pair=(i, j)) as span:
+            clean_connectivity(newest_files, pair_file)
+            span.add(read=os.path.getsize(newest_files), written=os.path.getsize(pair_file))
+    except Exception as e:
+        print(f"An error occurred while processing '{newest_files}': {e}")
+        return None
+    finally:
+        os.remove(newest_files)
+    return pair_file
+
+def analyze_pair(pair_file, prm_file, pair=None, series_dir=None, part=None):
+    """
+    Evaluates a pair file with TINKER analyze.
+
+    The output is parsed line by line while analyze writes it. Returns a dict
+    that maps every reported energy component to the RunningStats of its
+    values over the frames of the pair, or None when analyze failed. With a
+    series_dir the full breakdown of every frame is also written to an
+    EnergySeriesStore there. pair (i, j) names the series and labels the
+    trace events, part numbers the series of one frame chunk of the pair.
+    """
+    # Executes analyze.x process on the fly
+    command = "analyze"
+    input = f"{pair_file}\n{prm_file}\nE\n\r"
+    energy_components = None
+    series = None
+    try:
+        # stderr goes to a file, so analyze never blocks on a full pipe we are not reading
+        with tempfile.TemporaryFile(mode='w+') as errors, tracer.stage("analyze", pair=pair) as span:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errors, text=True)
+            try:
+                process.stdin.write(input)
+                process.stdin.close()
+                span.add(read=os.path.getsize(pair_file))
+
+                if series_dir is not None and pair is not None:
+                    store = EnergySeriesStore(series_dir)
+                    series = store.writer(*pair, part=part)
+
+                # Every analyzed frame adds one value per component
+                energy_components = {}
+                parser = AnalyzeParser()
+
+                def add_frame(row):
+                    if row is None:
+                        return
+                    for component in REPORTED_COMPONENTS:
+                        value = row[COLUMN[component]]
+                        if value == value:  # NaN when the frame has no such component
+                            energy_components.setdefault(component, RunningStats()).push(value)
+                    if series is not None:
+                        store.write_row(series, row)
+
+                for line in process.stdout:
+                    add_frame(parser.feed(line))
+                add_frame(parser.finish())
+                process.wait()
+            except BaseException:
+                process.kill()  # A parse error must not leave analyze running or unreaped in a long-lived worker
+                process.wait()
+                raise
+            errors.seek(0)
+            stderr = errors.read()
+
+        if stderr:
+            print(f"TINKER Error:\n", stderr)
+            energy_components = None
+
+    except FileNotFoundError:
+        print(f"Error: analyze did not run correctly.")
+        energy_components = None
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        energy_components = None
+    finally:
+        if series is not None:
+            series.close()
+            if energy_components is None:
+                os.remove(series.name)
+    return energy_components
+
+def run_pair(task):
+    """
+    Evaluates the pair of residues of a task.
+
+    The pair is extracted with archive unless the task already holds a
+    'pair_file' written by the native extractor. Returns (i, j,
+    energy_components), energy_components is None when the pair failed.
+    """
+    i, j = task['i'], task['j']
+    pair_file = task.get('pair_file')
+    if pair_file is None:
+        pair_file = archive_pair(task)
+        if pair_file is None:
+            return i, j, None
+
+    chunk = task.get('chunk')
+    energy_components = analyze_pair(pair_file, task['prm_file'], pair=(i, j), series_dir=task.get('series_dir'),
+                                     part=chunk[0] if chunk is not None else None)
+
+    # Delete the pair_{i}_{j}.arc file
+    try:
+        os.remove(pair_file)
+        print(f"File pair_{i}_{j}.arc deleted successfully.")
+    except FileNotFoundError:
+        print(f"Error: File pair_{i}_{j}.arc not found.")
+    except Exception as e:
+        print(f"Error deleting file pair_{i}_{j}.arc: {e}")
+
+    return i, j, energy_components
+
+def run_pair_adaptive(task):
+    """
+    Evaluates the pair of a task in strided blocks of frames until its energy is known well enough.
+
+    Block k holds every stride-th frame from offset k (see sampling.block_offsets).
+    After every block the standard error of the monitored component is taken
+    from the block means, and the pair stops once it is below se_threshold or
+    once the pair is confidently weaker than strength_cutoff. Returns (i, j,
+    energy_components) over the evaluated frames, like run_pair.
+    """
+    i, j = task['i'], task['j']
+    sampling = task['sampling']
+    first, last, _ = task['frames']
+    stride = sampling['stride']
+    monitor = BlockConvergence(sampling['se_threshold'], sampling['strength_cutoff'], sampling['min_blocks'])
+    energy_components = {}
+    reason = 'all frames'
+    for offset in block_offsets(stride):
+        if first + offset > last:
+            continue
+        block = dict(task, frames=(first + offset, last, stride), series_dir=None)
+        if task.get('extractor') == 'native':
+            with tracer.stage("extract", pair=(i, j)):
+                paths = extract_pairs(os.path.realpath(worker_arc), [(i, j, task['res1'], task['res2'])], worker_dir,
+                                      frames=block['frames'])
+            block['pair_file'] = paths[(i, j)]
+        _, _, block_components = run_pair(block)
+        if block_components is None:
+            return i, j, None
+        for component, stats in block_components.items():
+            energy_components.setdefault(component, RunningStats()).merge(stats)
+        monitor.add_block(block_components.get(sampling['component']))
+        if monitor.stop_reason() is not None:
+            reason = monitor.stop_reason()
+            break
+
+    n_frames = max((stats.count for stats in energy_components.values()), default=0)
+    print(f"Pair {i} - {j}: {n_frames} frames evaluated ({reason}, standard error {monitor.standard_error:.3f}).")
+    return i, j, energy_components
+
+def run_pair_traced(task):
+    """
+    Runs the pair of a task and returns its result, the (k, n_chunks) frame
+    chunk of the task (None for a whole pair) and the trace events recorded
+    by this process.
+    """
+    if task.get('sampling') is not None:
+        return run_pair_adaptive(task), None, tracer.drain()
+    return run_pair(task), task.get('chunk'), tracer.drain()
+
+def run_pair_timed(task):
+    """run_pair_traced of a task and its wall time in seconds, measured for the cost model of the scheduler."""
+    start = time.perf_counter()
+    output = run_pair_traced(task)
+    return output, time.perf_counter() - start
+
+def split_frames(tasks, frame_chunk):
+    """
+    Splits the frame range of every task into chunks of frame_chunk frames.
+
+    The chunks of a pair are separate tasks with the same i and j, and a
+    'chunk' entry (k, n_chunks). Tasks with a single chunk are left whole.
+    """
+    chunked = []
+    for task in tasks:
+        first, last, step = task['frames']
+        starts = range(first, last + 1, frame_chunk * step)
+        if len(starts) < 2:
+            chunked.append(task)
+            continue
+        for k, start in enumerate(starts):
+            frames = (start, min(start + (frame_chunk - 1) * step, last), step)
+            chunked.append(dict(task, frames=frames, chunk=(k, len(starts))))
+    return chunked
+
+def extract_batch(tasks, arc_file, out_dir, trajectory_cache=None):
+    """
+    Writes the pair files of a batch of tasks with the native extractor.
+
+    The arc file is read once for every distinct frame range in the batch,
+    and every task gets the path of its file under 'pair_file'. The files of
+    frame chunks go to one subdirectory per frame range, as every chunk of a
+    pair writes a pair_{i}_{j}.arc of its own. trajectory_cache is an open
+    binary cache of arc_file, see pair_extract.extract_pairs.
+    """
+    by_frames = {}
+    for task in tasks:
+        by_frames.setdefault(task['frames'], []).append(task)
+    for frames, group in by_frames.items():
+        group_dir = out_dir
+        if 'chunk' in group[0]:
+            group_dir = os.path.join(out_dir, "frames_{}_{}_{}".format(*frames))
+            os.makedirs(group_dir, exist_ok=True)
+        with tracer.stage("extract") as span:
+            paths = extract_pairs(arc_file, [(t['i'], t['j'], t['res1'], t['res2']) for t in group], group_dir, frames=frames,
+                                  cache=trajectory_cache)
+            span.add(read=os.path.getsize(arc_file), written=sum(os.path.getsize(path) for path in paths.values()))
+        for task in group:
+            task['pair_file'] = paths[(task['i'], task['j'])]
+    return tasks
+
+class PairPool:
+    """
+    The worker processes of archive_sep_pair and their scratch directories
+    under scratch_root, which can be kept open over several calls.
+
+    With workers == 1 the pairs run in this process and pool is None.
+    """
+
+    def __init__(self, arc_file, workers=1, scratch_root=None, trace=False):
+        if scratch_root is None:
+            scratch_root = default_scratch_root()
+        self.workers = workers
+        self.scratch_root = tempfile.mkdtemp(prefix="eda_scratch_", dir=os.path.abspath(scratch_root))
+        self.pool = None
+        try:
+            if workers > 1:
+                self.pool = Pool(workers, initializer=init_pair_worker, initargs=(self.scratch_root, arc_file, trace))
+            else:
+                init_pair_worker(self.scratch_root, arc_file, trace)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        shutil.rmtree(self.scratch_root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def record_pair_result(i, j, energy_components, output_file="energy_analysis.txt"):
+    """
+    Appends the average and standard deviation of one pair to output_file.
+
+    The statistics of the pair are also merged into Main.all_energy_components,
+    which holds the totals over all pairs of the run.
+    """
+    # Store the energy components for later analysis
+    for component, stats in energy_components.items():
+        Main.all_energy_components.setdefault(component, RunningStats()).merge(stats)
+        print(f"{component}: {stats.mean}")
+
+    # Prepare data for writing to the file
+    output_lines = []
+
+    # Header
+    header_components = list(energy_components.keys())
+    header_line = " ".join([f"{c:<15}" for c in header_components])  # Adjust spacing as needed
+    output_lines.append(f"{header_line}\n")
+
+    # Sub-header
+    subheader_line = " ".join(["AVG STD".center(15) for _ in header_components])
+    output_lines.append(f"{subheader_line}\n")
+
+    # Data line
+    data_line = f"res {i} - res {j} "
+    for component in header_components:
+        stats = energy_components[component]
+        data_line += f"{stats.mean:<7.2f} {stats.std:<7.2f} "
+    output_lines.append(data_line + "\n")
+
+    # Write to file
+    with open(output_file, "a") as outfile:  # "a" for append mode
+        outfile.writelines(output_lines)
+
+def archive_sep_pair(residues, prm_file, workers=1, scratch_root=None, cutoff=None, cutoff_mode='any', cache_dir=None,
+                     extractor='archive', batch_size=64, trace_file=None, series_dir=None, sampling_stride=None,
+                     se_threshold=0.1, strength_cutoff=None, pairs=None, frame_chunk=None, energy_threshold=None,
+                     energy_stride=1, pair_pool=None, result_cache=None, trajectory_cache=None):
+    """
+    Separates all of the possible pairs of the protein, or only the (i, j)
+    pairs (i < j) in pairs when it is given.
+
+    Returns a dict (i, j) -> energy_components of every pair that was
+    evaluated or found in the cache.
+
+    With workers > 1 the pairs are evaluated by a pool of processes, each one
+    in its own scratch directory under scratch_root (by default /dev/shm when
+    available), and the results are collected by this process in the order
+    they finish.
+
+    With a cutoff (Angstrom) only the pairs that come within that distance
+    are sent to TINKER, see pair_screen.screen_pairs for the cutoff_mode.
+
+    With a cache_dir every evaluated pair is stored in a ResultCache and the
+    pairs already in it are not evaluated again. energy_analysis.txt is then
+    rewritten with the cached pairs first, so a resumed run still gives one
+    complete file; without a cache_dir the pairs are appended to it.
+
+    With extractor='native' the pairs are not extracted by TINKER archive but
+    by pair_extract.extract_pairs, batch_size pairs per pass over the arc
+    file. The next batch is extracted while the current one is analyzed.
+
+    With a trace_file the wall time, CPU time and bytes of every stage of
+    every pair are recorded, written there as a Chrome trace and summarised
+    in a table at the end of the run.
+
+    Tasks are dispatched longest predicted first by scheduler.run_scheduled,
+    at most two per worker at a time, with a run time model of their atoms
+    and frames that is refitted from the times measured during the run.
+
+    With a series_dir the energy breakdown of every frame of every evaluated
+    pair is kept in an EnergySeriesStore there (pairs taken from the cache
+    keep the series of the run that evaluated them).
+
+    With a sampling_stride every pair is evaluated adaptively, see
+    run_pair_adaptive: frames are taken in blocks of every sampling_stride-th
+    frame, and a pair stops once the standard error of its intermolecular
+    energy is below se_threshold (kcal/mol) or once its magnitude is below
+    strength_cutoff by two standard errors. Adaptive pairs do not keep a
+    per-frame series, as they only see a sample of the frames.
+
+    With a frame_chunk the frames of every pair are split into chunks of
+    frame_chunk frames that are evaluated as separate tasks, so the pool
+    stays busy with a long trajectory or few pairs. The statistics of the
+    chunks are merged exactly (RunningStats.merge) before the pair is
+    recorded. Frame chunks are not used with adaptive sampling.
+
+    With an energy_threshold (kcal/mol) only the pairs whose approximate
+    energy from energy_screen (vdW and fixed charge electrostatics computed
+    with NumPy from prm_file, over every energy_stride-th frame) is at
+    least that large in magnitude are sent to TINKER. The ranked pairs are
+    written to energy_screen.txt.
+
+    A caller that evaluates pairs of the same trajectory many times (see
+    eda_daemon.py) can keep the state between calls: an open PairPool
+    (workers and scratch_root are then taken from it), a ResultCache in place
+    of cache_dir and the open binary cache of the trajectory.
+    """
+
+    if residues:
+        tracing = tracer.enabled
+        if trace_file is not None:
+            tracer.enabled = True
+        try:
+            n = len(residues)
+            sampling = None
+            if sampling_stride is not None:
+                sampling = {'stride': sampling_stride, 'se_threshold': se_threshold, 'strength_cutoff': strength_cutoff,
+                            'min_blocks': 3, 'component': "Intermolecular Energy"}
+            close_pairs = None
+            if cutoff is not None:
+                with tracer.stage("screen"):
+                    close_pairs = screen_pairs(arc_file, residues, cutoff, mode=cutoff_mode)
+                print(f"{len(close_pairs)} pairs are within {cutoff} A ({cutoff_mode}).")
+            strong_pairs = None
+            if energy_threshold is not None:
+                with tracer.stage("energy screen"):
+                    strong_pairs = energy_screen(arc_file, prm_file, residues, energy_threshold, stride=energy_stride,
+                                                 output_file="energy_screen.txt")
+                print(f"{len(strong_pairs)} pairs have an approximate energy of at least {energy_threshold} kcal/mol.")
+            tasks = []
+            for i in range(1, n):
+                for j in range(i + 1, n):
+                    if close_pairs is not None and (i, j) not in close_pairs:
+                        continue
+                    if strong_pairs is not None and (i, j) not in strong_pairs:
+                        continue
+                    if pairs is not None and (i, j) not in pairs:
+                        continue
+                    res1 = residues[i]
+                    res2 = residues[j]
+
+                    #Residue 1 atoms numbers
+                    res1_range = (int(res1[0]['atom_num']), int(res1[-1]['atom_num']))
+
+                    #Residue 2 atoms numbers
+                    res2_range = (int(res2[0]['atom_num']), int(res2[-1]['atom_num']))
+
+                    tasks.append({'i': i, 'j': j, 'res1': res1_range, 'res2': res2_range, 'prm_file': prm_file,
+                                  'header': line_to_search, 'frames': (1, repetitions, 1), 'series_dir': series_dir,
+                                  'sampling': sampling, 'extractor': extractor})
+
+            results = {}
+            cache_keys = {}
+            cache = result_cache
+            if cache is None and cache_dir is not None:
+                cache = ResultCache(cache_dir, arc_file, prm_file)
+            if trajectory_cache is None and extractor == 'native':
+                trajectory_cache = read_trajectory_cache(arc_file)
+            if cache is not None:
+                source = extractor
+                if extractor == 'native' and trajectory_cache is not None:
+                    source = 'native-float32'  # Coordinates written from the binary cache, rounded to float32
+                open("energy_analysis.txt", "w").close()
+                pending = []
+                for task in tasks:
+                    i, j = task['i'], task['j']
+                    cache_keys[(i, j)] = cache.key(task['res1'], task['res2'], task['frames'], sampling=sampling,
+                                                      extractor=source)
+                    energy_components = cache.get(cache_keys[(i, j)])
+                    if energy_components is None:
+                        pending.append(task)
                     else:
-                        # Parse the output
-                        lines = stdout.splitlines()
-                        energy_components = {}
-                        for line in lines:
-                            if "Intermolecular Energy :" in line:
-                                energy_components["Intermolecular Energy"] = float(line.split()[3])
-                            elif "Van der Waals" in line:
-                                energy_components["Van der Waals"] = float(line.split()[3])
-                            elif "Atomic Multipoles" in line:
-                                energy_components["Atomic Multipoles"] = float(line.split()[2])
-                            elif "Polarization " in line:
-                                energy_components["Polarization"] = float(line.split()[1])
-                        
-                        # Store the energy components for later analysis
-                        for component, value in energy_components.items():
-                            if not hasattr(Main, 'all_energy_components'):
-                                Main.all_energy_components = {}
-                            if component not in Main.all_energy_components:
-                                Main.all_energy_components[component] = []
-                            Main.all_energy_components[component].append(value)
-                            print(f"{component}: {value}")
-                            
-                        # Calculate and print the average and standard deviation for each energy component
-                        if hasattr(Main, 'all_energy_components'):
-                            # Prepare data for writing to the file
-                            output_lines = []
-                            
-                            # Header
-                            header_components = list(Main.all_energy_components.keys())
-                            header_line = " ".join([f"{c:<15}" for c in header_components])  # Adjust spacing as needed
-                            output_lines.append(f"{header_line}\n")
-                            
-                            # Sub-header
-                            subheader_line = " ".join(["AVG STD".center(15) for _ in header_components])
-                            output_lines.append(f"{subheader_line}\n")
-                            
-                            # Data line
-                            data_line = f"res {i} - res {j} "
-                            for component in header_components:
-                                values = Main.all_energy_components[component]
-                                avg = sum(values) / len(values)
-                                std_dev = (sum([(x - avg) ** 2 for x in values]) / len(values)) ** 0.5
-                                data_line += f"{avg:<7.2f} {std_dev:<7.2f} "
-                            output_lines.append(data_line + "\n")
-                            
-                            # Write to file
-                            with open("energy_analysis.txt", "a") as outfile:  # "a" for append mode
-                                outfile.writelines(output_lines)
-                            # Delete the pair_{i}_{j}.arc file
-                
-                except FileNotFoundError:
-                    print(f"Error: analyze did not run correctly.")
-                except Exception as e:
-                    print(f"An error occurred: {e}")
-                
-                try:
-                    os.remove(f"pair_{i}_{j}.arc")
-                    print(f"File pair_{i}_{j}.arc deleted successfully.")
-                except FileNotFoundError:
-                    print(f"Error: File pair_{i}_{j}.arc not found.")
-                except Exception as e:
-                    print(f"Error deleting file pair_{i}_{j}.arc: {e}")
-
-        
+                        results[(i, j)] = energy_components
+                        record_pair_result(i, j, energy_components)
+                print(f"{len(tasks) - len(pending)} pairs were found in the cache, {len(pending)} left to evaluate.")
+                tasks = pending
+
+            def collect(i, j, energy_components):
+                if energy_components is not None:
+                    results[(i, j)] = energy_components
+                    with tracer.stage("record", pair=(i, j)):
+                        if cache_keys:
+                            cache.put(cache_keys[(i, j)], i, j, energy_components)
+                        record_pair_result(i, j, energy_components)
+
+            # (i, j) -> [chunks received, merged energy components or None once a chunk failed]
+            chunks = {}
+
+            def gather(result, chunk, events):
+                tracer.merge(events)
+                i, j, energy_components = result
+                if chunk is None:
+                    collect(i, j, energy_components)
+                    return
+                received = chunks.setdefault((i, j), [0, {}])
+                received[0] += 1
+                if energy_components is None:
+                    received[1] = None
+                elif received[1] is not None:
+                    for component, stats in energy_components.items():
+                        received[1].setdefault(component, RunningStats()).merge(stats)
+                if received[0] == chunk[1]:
+                    del chunks[(i, j)]
+                    if received[1] is None and series_dir is not None:
+                        EnergySeriesStore(series_dir).clear(i, j)  # The parts of the other chunks are of no use
+                    collect(i, j, received[1])
+
+            if frame_chunk is not None and sampling is None:
+                tasks = split_frames(tasks, frame_chunk)
+
+            if series_dir is not None:
+                store = EnergySeriesStore(series_dir)
+                # Parts of an earlier run with other chunks must not be joined with the new ones
+                chunk_frames = {}
+                for task in tasks:
+                    if task.get('chunk') is not None:
+                        first, last, step = task['frames']
+                        chunk_frames[(task['i'], task['j'])] = chunk_frames.get((task['i'], task['j']), 0) + \
+                            len(range(first, last + 1, step))
+                for task in tasks:
+                    if task.get('chunk') is not None and task['chunk'][0] == 0:
+                        store.expect_parts(task['i'], task['j'], task['chunk'][1], chunk_frames[(task['i'], task['j'])])
+            if pair_pool is None:
+                pair_pool = PairPool(arc_file, workers, scratch_root, tracer.enabled)
+                owned = pair_pool
+            else:
+                owned = nullcontext()
+            with owned:
+                pool, scratch_root, workers = pair_pool.pool, pair_pool.scratch_root, pair_pool.workers
+                model = CostModel(tasks)
+
+                def handle(output):
+                    gather(*output)
+
+                if extractor == 'native' and sampling is None:
+                    tasks.sort(key=model.predict, reverse=True)  # The longest pairs go in the first batches
+                    batches = [tasks[k:k + batch_size] for k in range(0, len(tasks), batch_size)]
+                    with ThreadPoolExecutor(max_workers=1) as extraction:
+                        pending = extraction.submit(extract_batch, batches[0], arc_file, scratch_root,
+                                                    trajectory_cache) if batches else None
+                        for k in range(len(batches)):
+                            batch = pending.result()
+                            if k + 1 < len(batches):
+                                pending = extraction.submit(extract_batch, batches[k + 1], arc_file, scratch_root,
+                                                            trajectory_cache)
+                            run_scheduled(pool, batch, run_pair_timed, model, handle, 2 * workers)
+                else:
+                    run_scheduled(pool, tasks, run_pair_timed, model, handle, 2 * workers)
+                if tasks:
+                    print(model.summary())
+
+            if trace_file is not None:
+                tracer.export_chrome(trace_file)
+                print(tracer.summary())
+                print(f"Trace written to {trace_file}")
+                tracer.events.clear()
+            return results
+        finally:
+            tracer.enabled = tracing
+
     else:
         print("No residues found to process.")
         return None
 
 class Main:
+    # Energy component -> RunningStats over all the pairs evaluated so far
     all_energy_components = {}
- 
+
 arc_file = "./EDA-test/test.arc"
 prm_file = "./EDA-test/amoebabio18.prm"
+# Residue kinds (see topology.Topology) in the pair loop. Adding 'ligand' also pairs the ligands, which changes the
+# residue numbers compared with energy_analysis.txt files and matrices of protein residues only
+residue_kinds = ('protein',)
+# Number of pairs evaluated at the same time, each one runs its own archive and analyze
+workers = 1
+# Only evaluate the pairs closer than cutoff (Angstrom), None evaluates all of them.
+# cutoff_mode 'any': minimum atom distance in any frame, 'mean': average centroid distance
+cutoff = None
+cutoff_mode = 'any'
+# Directory of the per-pair result cache, e.g. "./eda_cache": a rerun only evaluates the pairs missing from it and
+# energy_analysis.txt is rewritten instead of appended to. None (the default) keeps no cache and appends
+cache_dir = None
+# 'archive' extracts every pair with TINKER archive, 'native' extracts batch_size pairs per read of the arc file
+extractor = 'archive'
+batch_size = 64
+# Chrome trace (JSON) of the time and bytes spent in every stage of every pair, None disables tracing
+trace_file = None
+# Directory of the per-frame energy breakdown of every pair (float32, one file per pair), e.g. "./eda_series".
+# None (the default) writes no series files
+series_dir = None
+# Adaptive sampling: evaluate every sampling_stride-th frame in blocks until the standard error of the
+# intermolecular energy is below se_threshold (kcal/mol), or the pair is clearly weaker than strength_cutoff
+# (kcal/mol, None disables it). sampling_stride None evaluates all the frames of every pair.
+sampling_stride = None
+se_threshold = 0.1
+strength_cutoff = None
+# Convert the arc file once to a binary cache (<arc>.bin, float32 coordinates), read by the parsers,
+# the pair screen and the native extractor in later runs
+binary_cache = True
+# Directory of the residue interaction matrices (mean and std of every component), e.g. "./eda_matrix".
+# The store is sparse when a cutoff leaves pairs out. None (the default) writes no store
+matrix_dir = None
+# Split the frames of every pair into chunks of frame_chunk frames evaluated in parallel, None keeps pairs whole
+frame_chunk = None
+# Only send the pairs whose approximate NumPy energy (vdW and charges from prm_file) is at least energy_threshold
+# (kcal/mol) to TINKER, over every energy_stride-th frame. None disables the screen
+energy_threshold = None
+energy_stride = 1
 
-get_header_and_repetitions(arc_file)
-atoms_list = read_tinker_xyz(arc_file)
-residues = atoms_to_residues(atoms_list)
-archive_sep_pair(residues, prm_file)
-
-
+if __name__ == '__main__':
+    tracer.enabled = trace_file is not None
+    get_header_and_repetitions(arc_file)
+    if binary_cache:
+        load_trajectory_cache(arc_file)
+    topology = load_topology(arc_file)
+    print(f"Topology: {topology.summary()}")
+    residues = topology.residue_list(residue_kinds)
+    results = archive_sep_pair(residues, prm_file, workers=workers, cutoff=cutoff, cutoff_mode=cutoff_mode,
+                               cache_dir=cache_dir, extractor=extractor, batch_size=batch_size, trace_file=trace_file,
+                               series_dir=series_dir, sampling_stride=sampling_stride, se_threshold=se_threshold,
+                               strength_cutoff=strength_cutoff, frame_chunk=frame_chunk,
+                               energy_threshold=energy_threshold, energy_stride=energy_stride)
+    if matrix_dir is not None and results:
+        sparse = cutoff is not None or energy_threshold is not None
+        InteractionMatrix.from_results(results, len(residues), sparse=sparse).save(matrix_dir)
+        print(f"Interaction matrices written to {matrix_dir}")
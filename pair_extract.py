@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from arc_index import load_frame_index
+from atom_table import is_box_line, parse_frame
+from trajectory_cache import read_trajectory_cache
+
+class PairLayout:
+    """
+    What stays constant for one pair over all the frames: the selected atoms,
+    and the text before and after the coordinates of every atom line, with the
+    atoms renumbered and the bonds to unselected atoms removed.
+    """
+
+    def __init__(self, atoms, connect_ptr, connect_idx, res1_range, res2_range, title):
+        ranges = sorted([res1_range, res2_range])
+        selected = np.concatenate([np.arange(first - 1, last) for first, last in ranges])
+        new_number = np.zeros(len(atoms) + 1, dtype=np.int64)  # Atom number -> new number, 0 if dropped
+        new_number[atoms['atom_num'][selected]] = np.arange(1, len(selected) + 1)
+
+        self.selected = selected
+        self.header = f"{len(selected):6d}{title}\n".encode()
+        self.heads = []
+        self.tails = []
+        for new, k in enumerate(selected, start=1):
+            bonded = new_number[connect_idx[connect_ptr[k]:connect_ptr[k + 1]]]
+            bonded = bonded[bonded != 0]
+            self.heads.append(f"{new:6d}  {atoms['atom_sym'][k]:<3s}".encode())
+            self.tails.append((f"{int(atoms['atom_type'][k]):6d}" + "".join(f"{num:6d}" for num in bonded) + "\n").encode())
+
+def frame_range(index, frames):
+    """0-indexed frame numbers of a 1-indexed, inclusive (first, last, step) range as used by archive."""
+    if frames is None:
+        return range(len(index))
+    first, last, step = frames
+    return range(first - 1, min(last, len(index)), step)
+
+def extract_pairs(arc_file, pairs, out_dir, frames=None, cache=None):
+    """
+    Writes the sub-trajectory of every pair in one pass over the arc file.
+
+    pairs is a list of (i, j, res1_range, res2_range) with the 1-indexed
+    (first, last) atom numbers of both residues. Each sub-trajectory keeps
+    the atoms of the two residues in file order, renumbered from 1, with the
+    connect lists reduced to the bonds inside the pair, like archive output
+    after cleaning. frames is a 1-indexed (first, last, step) range.
+
+    When the binary cache of the trajectory is up to date the coordinates
+    are read from it (float32) and written with 6 decimals, so they can
+    differ from the text of the arc file in the last decimal; otherwise they
+    are copied as text from the arc file. cache is an open TrajectoryCache of
+    arc_file, opened here when it is not given.
+
+    Returns a dict (i, j) -> path of the pair_{i}_{j}.arc file in out_dir.
+    """
+    if cache is None:
+        cache = read_trajectory_cache(arc_file)
+    index = load_frame_index(arc_file) if cache is None else None
+    try:
+        if cache is not None:
+            atoms, connect_ptr, connect_idx = cache.atom_table()
+            title = cache.title
+            box = cache.boxes is not None
+        else:
+            first_frame = index.frame_bytes(0)
+            atoms, connect_ptr, connect_idx = parse_frame(first_frame)
+            lines = first_frame.split(b"\n")
+            title = lines[0].decode().split(None, 1)
+            title = f"  {title[1]}" if len(title) > 1 else ""
+
+            # Atom k is on line 1 + box + k of every frame, after the header and the optional box line
+            box = 1 if len(lines) > 1 and lines[1].split() and is_box_line(lines[1].split()) else 0
+        if not np.array_equal(atoms['atom_num'], np.arange(1, len(atoms) + 1)):
+            raise ValueError(f"The atoms of {arc_file} are not numbered 1 to {len(atoms)}.")
+
+        layouts = {}
+        paths = {}
+        outputs = {}
+        for i, j, res1_range, res2_range in pairs:
+            layouts[(i, j)] = PairLayout(atoms, connect_ptr, connect_idx, res1_range, res2_range, title)
+            paths[(i, j)] = os.path.join(out_dir, f"pair_{i}_{j}.arc")
+            outputs[(i, j)] = open(paths[(i, j)], 'wb')
+
+        try:
+            if cache is not None:
+                for k in frame_range(cache, frames):
+                    xyz = cache.coords[k]
+                    box_line = b"%12.6f%12.6f%12.6f%12.6f%12.6f%12.6f\n" % tuple(cache.boxes[k]) if box else None
+                    for pair, layout in layouts.items():
+                        chunk = [layout.header]
+                        if box:
+                            chunk.append(box_line)
+                        for head, tail, (x, y, z) in zip(layout.heads, layout.tails, xyz[layout.selected].tolist()):
+                            chunk.append(b"%s%12.6f%12.6f%12.6f%s" % (head, x, y, z, tail))
+                        outputs[pair].write(b"".join(chunk))
+            else:
+                for k in frame_range(index, frames):
+                    lines = index.frame_bytes(k).split(b"\n")
+                    for pair, layout in layouts.items():
+                        chunk = [layout.header]
+                        if box:
+                            chunk.append(lines[1] + b"\n")
+                        for head, tail, atom in zip(layout.heads, layout.tails, layout.selected):
+                            x, y, z = lines[1 + box + atom].split()[2:5]
+                            chunk.append(b"%s%12s%12s%12s%s" % (head, x, y, z, tail))
+                        outputs[pair].write(b"".join(chunk))
+        finally:
+            for output in outputs.values():
+                output.close()
+        return paths
+    finally:
+        if index is not None:
+            index.close()
@@ -0,0 +1,150 @@
+import numpy as np
+
+from arc_index import load_frame_index
+from atom_table import load_coordinates
+
+# Half of the 27 neighbouring cells (plus the cell itself), so every pair of cells is visited once
+_HALF_SHELL = np.array([(dx, dy, dz)
+                        for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                        if (dx, dy, dz) >= (0, 0, 0)], dtype=np.int64)
+
+def cell_list_pairs(points, cutoff):
+    """
+    Finds all pairs of points closer than cutoff with a cell list.
+
+    Returns two index arrays (a, b) with a < b. The points are binned in cubic
+    cells of side cutoff, so only points in the same or in neighbouring cells
+    are compared.
+    """
+    n = len(points)
+    if n < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    cells = np.floor((points - points.min(axis=0)) / cutoff).astype(np.int64)
+    dims = cells.max(axis=0) + 3  # One empty layer on every side for the neighbour offsets
+    cells += 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind='stable')
+    cell_keys, cell_start, cell_count = np.unique(keys[order], return_index=True, return_counts=True)
+    cell_xyz = cells[order[cell_start]]
+
+    pairs_a = []
+    pairs_b = []
+    for offset in _HALF_SHELL:
+        neighbour = cell_xyz + offset
+        neighbour_keys = (neighbour[:, 0] * dims[1] + neighbour[:, 1]) * dims[2] + neighbour[:, 2]
+        slot = np.searchsorted(cell_keys, neighbour_keys)
+        slot = np.minimum(slot, len(cell_keys) - 1)
+        found = cell_keys[slot] == neighbour_keys
+        first, second = np.flatnonzero(found), slot[found]
+
+        # Expand every pair of cells into all pairs of their points
+        count_a, count_b = cell_count[first], cell_count[second]
+        sizes = count_a * count_b
+        total = int(sizes.sum())
+        if total == 0:
+            continue
+        owner = np.repeat(np.arange(len(first)), sizes)
+        local = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        a = order[cell_start[first][owner] + local // count_b[owner]]
+        b = order[cell_start[second][owner] + local % count_b[owner]]
+        if not offset.any():
+            keep = a < b
+            a, b = a[keep], b[keep]
+        close = np.einsum('ij,ij->i', points[a] - points[b], points[a] - points[b]) <= cutoff * cutoff
+        pairs_a.append(np.minimum(a, b)[close])
+        pairs_b.append(np.maximum(a, b)[close])
+    if not pairs_a:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+def residue_slices(residues):
+    """
+    Returns the residue indices that hold atoms and their (start, stop) atom index ranges.
+    """
+    indices = [k for k, residue in enumerate(residues) if len(residue)]
+    starts = np.array([int(residues[k][0]['atom_num']) - 1 for k in indices], dtype=np.int64)
+    stops = np.array([int(residues[k][-1]['atom_num']) for k in indices], dtype=np.int64)
+    return np.array(indices, dtype=np.int64), starts, stops
+
+def _padded_residues(xyz, starts, stops, width):
+    """Coordinates of every residue padded with NaN to the size of the largest residue."""
+    lengths = stops - starts
+    columns = np.arange(width)
+    atom = starts[:, None] + columns[None, :]
+    valid = columns[None, :] < lengths[:, None]
+    padded = xyz[np.where(valid, atom, 0)]
+    padded[~valid] = np.nan
+    return padded
+
+def _min_distances(padded, a, b, budget=64 << 20):
+    """
+    Minimum atom-atom distance of the residue pairs (a, b), evaluated in blocks
+    whose width x width x 3 float64 differences fit in budget bytes.
+    """
+    width = padded.shape[1]
+    block = max(1, budget // (width * width * 3 * 8))
+    result = np.empty(len(a))
+    for first in range(0, len(a), block):
+        pa, pb = padded[a[first:first + block]], padded[b[first:first + block]]
+        diff = pa[:, :, None, :] - pb[:, None, :, :]
+        distances = np.sqrt(np.einsum('pijk,pijk->pij', diff, diff)).reshape(len(pa), -1)
+        result[first:first + block] = np.nanmin(distances, axis=1)
+    return result
+
+def screen_pairs(arc_file, residues, cutoff, mode='any', stride=1, chunk=256):
+    """
+    Returns the set of residue pairs (i, j), i < j, that come within cutoff (Angstrom).
+
+    mode 'any' keeps a pair when the minimum distance between its atoms is
+    below the cutoff in at least one frame. mode 'mean' keeps it when the
+    distance between the residue centroids, averaged over the frames, is
+    below the cutoff. Every stride-th frame is used, read chunk frames at a time.
+    """
+    if mode not in ('any', 'mean'):
+        raise ValueError(f"Unknown screening mode '{mode}', use 'any' or 'mean'.")
+
+    indices, starts, stops = residue_slices(residues)
+    n_res = len(indices)
+    if n_res < 2:
+        return set()
+    lengths = stops - starts
+    width = int(lengths.max())
+    n_frames = len(load_frame_index(arc_file))
+    frames = range(0, n_frames, stride)
+
+    accepted = np.zeros(0, dtype=np.int64)  # Pairs encoded as a * n_res + b
+    all_centroids = []
+    for first in range(0, len(frames), chunk):
+        coords = np.asarray(load_coordinates(arc_file, frames=frames[first:first + chunk]), dtype=np.float64)
+        for xyz in coords:
+            summed = np.concatenate([np.zeros((1, 3)), np.cumsum(xyz, axis=0)])
+            centroids = (summed[stops] - summed[starts]) / lengths[:, None]
+            if mode == 'mean':
+                all_centroids.append(centroids.astype(np.float32))
+                continue
+
+            # A residue cannot be closer than its centroid distance minus both radii
+            padded = _padded_residues(xyz, starts, stops, width)
+            radii = np.nanmax(np.linalg.norm(padded - centroids[:, None, :], axis=2), axis=1)
+            a, b = cell_list_pairs(centroids, cutoff + 2 * radii.max())
+            d = np.linalg.norm(centroids[a] - centroids[b], axis=1)
+            candidate = d - radii[a] - radii[b] <= cutoff
+            a, b = a[candidate], b[candidate]
+            keys = a * n_res + b
+            new = ~np.isin(keys, accepted)
+            a, b, keys = a[new], b[new], keys[new]
+            if len(keys):
+                accepted = np.union1d(accepted, keys[_min_distances(padded, a, b) <= cutoff])
+
+    if mode == 'mean':
+        # A pair whose mean distance is below the cutoff is below it in at least one frame
+        candidates = np.zeros(0, dtype=np.int64)
+        for centroids in all_centroids:
+            a, b = cell_list_pairs(centroids.astype(np.float64), cutoff)
+            candidates = np.union1d(candidates, a * n_res + b)
+        a, b = candidates // n_res, candidates % n_res
+        total = np.zeros(len(candidates))
+        for centroids in all_centroids:
+            total += np.linalg.norm(centroids[a].astype(np.float64) - centroids[b], axis=1)
+        accepted = candidates[total / max(len(all_centroids), 1) <= cutoff]
+    return {(int(indices[key // n_res]), int(indices[key % n_res])) for key in accepted}
@@ -1,72 +1,39 @@
+import argparse
+import os
 import subprocess
 
+import new_main
+
+from arc_index import load_frame_index
+from atom_table import read_atom_table
+from energy_parser import REPORTED_COMPONENTS
+from topology import load_topology
+
 def read_tinker_xyz(arc_file):
     """
-    Reads a TINKER XYZ file and returns a list of atoms.
+    Reads the first frame of a TINKER XYZ file and returns its atom table.
+
+    The table is a NumPy structured array (see atom_table.ATOM_DTYPE) with the
+    fields atom_num, atom_sym, atom_type and xyz; use atom_table.read_atom_table
+    for the connectivity and atom_table.load_coordinates for all frames.
     """
     try:
-        with open (arc_file, 'r') as file:
-            try:
-                n_atoms = int(file.readline().strip())
-            except ValueError:
-                print("Error: The first line of the file must be an integer representing the number of atoms.")
-                return None
-            n_atoms += 1
-            #title = file.readline().strip()
-            # print(title)
-            atoms_list = []
-            
-            for _ in range(n_atoms):
-                line = file.readline().strip()
-                #print(line)
-                if not line:  # Skip empty lines
-                    continue
-                parts = line.split()
-                if len(parts) < 7:  # Check if the line has enough data
-                    #print(f"Warning: Skipping line with insufficient data: {line}")
-                    continue
-                atoms = {
-                    'atom_num': int(parts[0]),
-                    'atom_sym': parts[1],
-                    'x': float(parts[2]),
-                    'y': float(parts[3]),
-                    'z': float(parts[4]),
-                    'atom_type': int(parts[5]),
-                    'connect': [int(num) for num in parts[6:]]                
-                }
-                atoms_list.append(atoms)
-            #print(atoms_list)
-            return atoms_list
+        atoms_list, connect_ptr, connect_idx = read_atom_table(arc_file)
+        return atoms_list
     except FileNotFoundError:
         print(f"Error: The file {arc_file} was not found.")
         return None
-
-def atoms_to_residues(atoms_list):
-    residues = []
-    current_residue = []
-    
-    for atom in atoms_list:
-        current_residue.append(atom)
-        # Assuming a new residue starts when the atom_sym is CA after N
-        if len(current_residue) >= 3 and \
-           current_residue[-3]['atom_sym'] == 'N' and \
-           current_residue[-2]['atom_sym'] == 'CA' and \
-           current_residue[-1]['atom_sym'] == 'C':
-            residues.append(current_residue[:-3])  # Save the previous residue
-            current_residue = current_residue[-3:]  # Start a new residue with the last 3 atoms (N, CA, C)
-
-    if current_residue:
-        residues.append(current_residue)  # Append the last residue
-
-    #print(residues)
-    
-   
-    return residues
+    except ValueError as e:
+        print(f"Error: Could not read the atoms of {arc_file}. {e}")
+        return None
 
 def count_frames_in_arc_file(arc_file, line_to_search):
     """
     Counts how many times a specific line is repeated in a file.
 
+    The count comes from the frame index of the file, so the trajectory is
+    only scanned the first time.
+
     Args:
         arc_file: The path to the file.
         line_to_search (str): The line to search for and count.
@@ -74,16 +41,14 @@ def count_frames_in_arc_file(arc_file, line_to_search):
     Returns:
         int: The number of times the line appears in the file.
     """ 
-    count = 0
     try:
-        with open(arc_file, 'r', encoding='utf-8') as file:
-            for line in file:
-                if line.strip() == line_to_search:  # Compare stripped lines to avoid whitespace issues
-                    count += 1
-        return count
+        index = load_frame_index(arc_file)
     except FileNotFoundError:
         print(f"Error: The file {arc_file} was not found.")
         return None
+    if index.header != line_to_search:
+        print(f"Warning: '{line_to_search}' is not the header line of {arc_file}, counting the frames of '{index.header}'.")
+    return len(index)
 
 
 
@@ -129,35 +94,123 @@ def call_archive_ref(residues):
     except Exception as e:
         print(f"An error occurred: {e}")
 
-#filepath = './test.arc'
-param_file = input("Enter the path to the TINKER parameter file: ")
-arc_file = input("Enter the path to the TINKER arc file: ")
-
-atoms_list = read_tinker_xyz(arc_file)
-
-try:
-    with open(arc_file, 'r', encoding='utf-8') as file:
-        line_to_search = file.readline().strip()  # Read the first line and strip whitespace
-except FileNotFoundError:
-    print(f"Error: The file {arc_file} was not found.")
-    line_to_search = None  # Handle the case where the file is not found
-except Exception as e:
-    print(f"An error occurred while reading the file: {e}")
-    line_to_search = None
-
-if line_to_search:
-    print(f"Searching for repetitions of the line: '{line_to_search}'")
-else:
-    print("Could not determine the line to search for.")
-    exit()
-repetitions = count_frames_in_arc_file(arc_file, line_to_search)
-
-if repetitions is not None:
-    print(f"The line '{line_to_search}' repeats {repetitions} times in the file.")
-
-residues = atoms_to_residues(atoms_list)
-if atoms_list is None:
-    print("Error reading the TINKER XYZ file.")
-    exit()      
-
-call_archive_ref(residues)
+def reference_pairs(references, n_residues):
+    """All the (i, j) pairs, i < j, between the reference residues and every other residue."""
+    pairs = set()
+    for ref in references:
+        for k in range(1, n_residues):
+            if k != ref:
+                pairs.add((min(ref, k), max(ref, k)))
+    return pairs
+
+def write_reference_profile(ref, results, output_dir):
+    """
+    Writes the interaction profile of a reference residue to profile_res{ref}.txt.
+
+    One line per partner residue with the average and standard deviation of
+    every reported component, strongest intermolecular energy first.
+    """
+    rows = []
+    for (i, j), energy_components in results.items():
+        if ref in (i, j):
+            rows.append((j if i == ref else i, energy_components))
+    strength = lambda row: row[1]["Intermolecular Energy"].mean if "Intermolecular Energy" in row[1] else 0.0
+    rows.sort(key=strength)
+
+    path = os.path.join(output_dir, f"profile_res{ref}.txt")
+    with open(path, "w") as outfile:
+        outfile.write(" ".join(f"{c:<15}" for c in ("Partner",) + REPORTED_COMPONENTS) + "\n")
+        outfile.write(" ".join([" " * 15] + ["AVG STD".center(15) for _ in REPORTED_COMPONENTS]) + "\n")
+        for partner, energy_components in rows:
+            line = f"res {partner:<11d} "
+            for component in REPORTED_COMPONENTS:
+                stats = energy_components.get(component)
+                line += f"{stats.mean:<7.2f} {stats.std:<7.2f} " if stats is not None else f"{'-':<7} {'-':<7} "
+            outfile.write(line + "\n")
+    return path
+
+def run_reference_batch(arc_file, prm_file, references, workers=1, cache_dir=None, output_dir=".", max_batch=512):
+    """
+    Computes the interaction energies of one or more reference residues against all the other residues.
+
+    The pairs of all the references are extracted together by the native
+    extractor from the binary cache of the trajectory, in one pass unless that would hold more
+    than max_batch pair files open, and evaluated by a pool of workers.
+    Returns the paths of the profile files.
+    """
+    _, frames, residues = new_main.open_trajectory(arc_file)
+    if frames is None:
+        return []
+    invalid = [ref for ref in references if not 1 <= ref < len(residues)]
+    if invalid:
+        print(f"Error: Invalid reference residues {invalid}, valid indices are 1 - {len(residues) - 1}.")
+        return []
+
+    pairs = reference_pairs(references, len(residues))
+    print(f"{len(pairs)} pairs for the reference residues {', '.join(str(ref) for ref in references)}.")
+    results = new_main.archive_sep_pair(residues, prm_file, workers=workers, cache_dir=cache_dir, extractor='native',
+                                        batch_size=max(1, min(len(pairs), max_batch)), pairs=pairs)
+    if results is None:
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [write_reference_profile(ref, results, output_dir) for ref in references]
+    for path in paths:
+        print(f"Profile written to {path}")
+    return paths
+
+def interactive():
+    """The original prompt driven run: one reference residue and one archive call."""
+    global arc_file
+    global line_to_search
+    global repetitions
+
+    #filepath = './test.arc'
+    param_file = input("Enter the path to the TINKER parameter file: ")
+    arc_file = input("Enter the path to the TINKER arc file: ")
+
+    atoms_list = read_tinker_xyz(arc_file)
+
+    try:
+        line_to_search = load_frame_index(arc_file).header  # Header line of the first frame
+    except FileNotFoundError:
+        print(f"Error: The file {arc_file} was not found.")
+        line_to_search = None  # Handle the case where the file is not found
+    except Exception as e:
+        print(f"An error occurred while reading the file: {e}")
+        line_to_search = None
+
+    if line_to_search:
+        print(f"Searching for repetitions of the line: '{line_to_search}'")
+    else:
+        print("Could not determine the line to search for.")
+        exit()
+    repetitions = count_frames_in_arc_file(arc_file, line_to_search)
+
+    if repetitions is not None:
+        print(f"The line '{line_to_search}' repeats {repetitions} times in the file.")
+
+    if atoms_list is None:
+        print("Error reading the TINKER XYZ file.")
+        exit()
+    residues = load_topology(arc_file).residue_list()
+
+    call_archive_ref(residues)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="EDA of reference residues against all the other residues. "
+                                                 "Without arguments the files and the residue are asked for interactively.")
+    parser.add_argument("--arc", help="TINKER arc file.")
+    parser.add_argument("--prm", help="TINKER parameter file.")
+    parser.add_argument("--ref", type=int, nargs='+', help="Indices of the reference residues (from 1).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache-dir", default=None, help="Result cache shared with new_main.py.")
+    parser.add_argument("--output-dir", default=".", help="Directory of the profile_res<ref>.txt files.")
+    args = parser.parse_args()
+
+    if args.ref is None:
+        interactive()
+    elif args.arc is None or args.prm is None:
+        parser.error("--ref needs --arc and --prm")
+    else:
+        run_reference_batch(args.arc, args.prm, args.ref, workers=args.workers, cache_dir=args.cache_dir,
+                            output_dir=args.output_dir)
@@ -1,62 +1,24 @@
+from arc_index import load_frame_index
+from atom_table import read_atom_table
+from topology import load_topology
+
 def read_tinker_xyz(filepath):
+    """
+    Reads the first frame of a TINKER XYZ file and returns its atom table.
+
+    The table is a NumPy structured array (see atom_table.ATOM_DTYPE) with the
+    fields atom_num, atom_sym, atom_type and xyz; use atom_table.read_atom_table
+    for the connectivity and atom_table.load_coordinates for all frames.
+    """
     try:
-        with open (filepath, 'r') as file:
-            try:
-                n_atoms = int(file.readline().strip())
-            except ValueError:
-                print("Error: The first line of the file must be an integer representing the number of atoms.")
-                return None
-            n_atoms += 1
-            #title = file.readline().strip()
-            # print(title)
-            atoms_list = []
-            
-            for _ in range(n_atoms):
-                line = file.readline().strip()
-                #print(line)
-                if not line:  # Skip empty lines
-                    continue
-                parts = line.split()
-                if len(parts) < 7:  # Check if the line has enough data
-                    #print(f"Warning: Skipping line with insufficient data: {line}")
-                    continue
-                atoms = {
-                    'atom_num': int(parts[0]),
-                    'atom_sym': parts[1],
-                    'x': float(parts[2]),
-                    'y': float(parts[3]),
-                    'z': float(parts[4]),
-                    'atom_type': int(parts[5]),
-                    'connect': [int(num) for num in parts[6:]]                
-                }
-                atoms_list.append(atoms)
-            #print(atoms_list)
-            return atoms_list
+        atoms_list, connect_ptr, connect_idx = read_atom_table(filepath)
+        return atoms_list
     except FileNotFoundError:
         print(f"Error: The file {filepath} was not found.")
         return None
-
-def atoms_to_residues(atoms_list):
-    residues = []
-    current_residue = []
-    
-    for atom in atoms_list:
-        current_residue.append(atom)
-        # Assuming a new residue starts when the atom_sym is CA after N
-        if len(current_residue) >= 3 and \
-           current_residue[-3]['atom_sym'] == 'N' and \
-           current_residue[-2]['atom_sym'] == 'CA' and \
-           current_residue[-1]['atom_sym'] == 'C':
-            residues.append(current_residue[:-3])  # Save the previous residue
-            current_residue = current_residue[-3:]  # Start a new residue with the last 3 atoms (N, CA, C)
-
-    if current_residue:
-        residues.append(current_residue)  # Append the last residue
-
-    #print(residues)
-    
-   
-    return residues
+    except ValueError as e:
+        print(f"Error: Could not read the atoms of {filepath}. {e}")
+        return None
 
 def call_tinker_archive(residues):
     """
@@ -82,23 +44,15 @@ def call_tinker_archive(residues):
             #print(f"Residue {residue_index} atom_num range: {first_atom_num} - {last_atom_num}")
     
     try:
-        with open (arc_file, 'r') as file:
-            try:
-                n_atoms = int(file.readline().strip())
-                print(f"Number of atoms in the arc file: {n_atoms}")
-                count = 0
-                for line in file:
-                    try:
-                        frames = int(line.strip())
-                        if frames == n_atoms:
-                            count += 1
-                    except ValueError:
-                        break
-                print(f"The first line repeats {count} times in the file.")
-                file.seek(0)
-            except ValueError:
-                print("Error: The first line of the arc file must be an integer representing the number of atoms.")
-                return None
+        index = load_frame_index(arc_file)
+        try:
+            n_atoms = int(index.header.split()[0])
+            print(f"Number of atoms in the arc file: {n_atoms}")
+            count = len(index)
+            print(f"The first line repeats {count} times in the file.")
+        except (ValueError, IndexError):
+            print("Error: The first line of the arc file must be an integer representing the number of atoms.")
+            return None
     except FileNotFoundError:
         print(f"Error: The file {arc_file} was not found.")
         return None  
@@ -114,7 +68,6 @@ def call_tinker_archive(residues):
     #command = f"archive {arc_file} 3 {first_atom_num} {last_atom_num}"
 
 filepath = '/media/mauricio/Expansion/A3G/run/prod3/20/test.arc'
-atoms_list = read_tinker_xyz(filepath)      
-residues = atoms_to_residues(atoms_list)
+residues = load_topology(filepath).residue_list()
 
 call_tinker_archive(residues)
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import shutil
+
+from arc_index import frame_digests
+from stats import RunningStats
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a whole file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def frames_fingerprint(digests, frames):
+    """
+    SHA-256 over the digests of the frames in a 1-indexed (first, last, step)
+    range, so a change to any of those frames changes it.
+    """
+    first, last, step = frames
+    digest = hashlib.sha256()
+    for k in range(first - 1, min(last, len(digests)), step):
+        digest.update(digests[k])
+    return digest.hexdigest()
+
+def tinker_fingerprint(commands=("archive", "analyze")):
+    """Identifies the TINKER build on the PATH by the location, size and mtime of its executables."""
+    parts = []
+    for command in commands:
+        path = shutil.which(command)
+        if path is None:
+            parts.append(f"{command}:missing")
+            continue
+        stat = os.stat(path)
+        parts.append(f"{command}:{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256(";".join(parts).encode()).hexdigest()
+
+class ResultCache:
+    """
+    On-disk cache of pair energies, one JSON file per pair.
+
+    The key of a pair is a hash of the bytes of the frames it covers (see
+    arc_index.frame_digests), the frame range, the atom ranges of both
+    residues, the extractor, the .prm file and the TINKER executables, so a
+    rerun or a parameter sweep only evaluates the pairs it has not seen.
+    """
+
+    def __init__(self, directory, arc_file, prm_file):
+        self.directory = directory
+        self.digests = frame_digests(arc_file)
+        self.fingerprints = {}  # Frame range -> frames_fingerprint, most tasks share one
+        self.context = {
+            'prm': file_digest(prm_file),
+            'tinker': tinker_fingerprint(),
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, res1_range, res2_range, frames, sampling=None, extractor='archive'):
+        """
+        frames is the (first, last, step) range passed to archive, sampling the
+        settings of an adaptive run and extractor what wrote the pair files
+        ('archive', 'native' or 'native-float32' when the native extractor read
+        the float32 binary cache), as the pair files differ between them.
+        """
+        frames = tuple(frames)
+        if frames not in self.fingerprints:
+            self.fingerprints[frames] = frames_fingerprint(self.digests, frames)
+        data = dict(self.context, trajectory=self.fingerprints[frames], res1=list(res1_range), res2=list(res2_range),
+                    frames=list(frames), extractor=extractor)
+        if sampling is not None:
+            data['sampling'] = sampling
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached energy components (component -> RunningStats) or None."""
+        try:
+            with open(self._path(key), 'r') as file:
+                entry = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        return {component: RunningStats.from_dict(stats) for component, stats in entry['energy_components'].items()}
+
+    def put(self, key, i, j, energy_components):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            'pair': [i, j],
+            'energy_components': {component: stats.to_dict() for component, stats in energy_components.items()},
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, path)
@@ -0,0 +1,57 @@
+from stats import RunningStats
+
+def block_offsets(stride):
+    """
+    Frame offsets 0 .. stride - 1 in bit-reversed order (0, stride/2, stride/4, 3 stride/4, ...).
+
+    Block k holds the frames offset_k + 1, offset_k + 1 + stride, ... so every
+    block spans the whole trajectory, and taking the offsets in this order
+    keeps the evaluated frames evenly spread however many blocks are used.
+    """
+    bits = max(stride - 1, 0).bit_length()
+    offsets = []
+    for k in range(1 << bits):
+        offset = int(format(k, f'0{bits}b')[::-1], 2) if bits else 0
+        if offset < stride:
+            offsets.append(offset)
+    return offsets
+
+class BlockConvergence:
+    """
+    Standard error of a pair energy from the means of its frame blocks.
+
+    Frames inside a block are stride frames apart, and every block mean is one
+    estimate of the energy over the whole trajectory, so the spread of the
+    block means gives the standard error without assuming the frames of a
+    trajectory are independent.
+    """
+
+    def __init__(self, se_threshold=None, strength_cutoff=None, min_blocks=3, z=2.0):
+        self.se_threshold = se_threshold
+        self.strength_cutoff = strength_cutoff
+        self.min_blocks = min_blocks
+        self.z = z
+        self.block_means = RunningStats()
+
+    def add_block(self, stats):
+        """Adds the RunningStats of the monitored component over one block."""
+        if stats is not None and stats.count:
+            self.block_means.push(stats.mean)
+
+    @property
+    def standard_error(self):
+        n = self.block_means.count
+        if n < 2:
+            return float('inf')
+        return (self.block_means.m2 / (n - 1) / n) ** 0.5
+
+    def stop_reason(self):
+        """Returns why the pair can stop ('converged' or 'weak'), or None to evaluate another block."""
+        if self.block_means.count < self.min_blocks:
+            return None
+        se = self.standard_error
+        if self.se_threshold is not None and se < self.se_threshold:
+            return 'converged'
+        if self.strength_cutoff is not None and abs(self.block_means.mean) + self.z * se < self.strength_cutoff:
+            return 'weak'
+        return None
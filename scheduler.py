@@ -0,0 +1,108 @@
+"""
+Longest-predicted-first dispatch of pair tasks, with a run time model refined from the measured times.
+
+The time of a task is modelled as a linear function of its number of frames,
+frames x atoms, frames x atoms^2 and, with the archive extractor, frames for
+pairs that are not adjacent (archive then needs two more negative atom
+ranges). Until the first times are measured the model ranks the tasks by
+frames x atoms^2, the cost of analyze.
+"""
+import queue
+
+import numpy as np
+
+def task_features(task):
+    """Features of a pair task: 1, frames, frames * atoms, frames * atoms^2, frames if archive needs extra ranges."""
+    first, last, step = task['frames']
+    frames = len(range(first, last + 1, step))
+    atoms = task['res1'][1] - task['res1'][0] + task['res2'][1] - task['res2'][0] + 2
+    separated = task['extractor'] == 'archive' and task['res1'][1] + 1 != task['res2'][0]
+    return np.array([1.0, frames, frames * atoms, frames * atoms ** 2, frames * separated], dtype=np.float64)
+
+class CostModel:
+    """
+    Least squares fit of the task times on task_features, regularized towards
+    the frames * atoms^2 prior so it can predict before (and with few)
+    measurements. The prior is rescaled to the measured times, so
+    predictions are in seconds once a time has been measured.
+
+    Features are divided by their mean over the tasks the model is built for,
+    so the weights are of order one.
+    """
+
+    def __init__(self, tasks, prior_weight=0.1):
+        features = np.array([task_features(task) for task in tasks]) if tasks else np.ones((1, 5))
+        self.scale = np.abs(features).mean(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.prior = np.array([0.0, 0.0, 0.0, 1.0, 0.0])
+        self.prior_weight = prior_weight
+        self.normal = np.zeros((5, 5))
+        self.target = np.zeros(5)
+        self.prior_total = 0.0
+        self.seconds_total = 0.0
+        self.weights = self.prior
+        self.measured = 0
+        self.relative_error = 0.0
+
+    def predict(self, task):
+        return float(task_features(task) / self.scale @ self.weights)
+
+    def update(self, task, seconds):
+        """Adds a measured time. Returns True when the weights were refitted, after 1, 2, 4, 8, ... measurements."""
+        x = task_features(task) / self.scale
+        if self.measured:
+            self.relative_error += abs(float(x @ self.weights) - seconds) / max(seconds, 1e-9)
+        self.normal += np.outer(x, x)
+        self.target += x * seconds
+        self.prior_total += float(x @ self.prior)
+        self.seconds_total += seconds
+        self.measured += 1
+        if self.measured & (self.measured - 1):
+            return False
+        prior = self.prior * self.seconds_total / max(self.prior_total, 1e-12)
+        self.weights = np.linalg.solve(self.normal + self.prior_weight * np.eye(5),
+                                       self.target + self.prior_weight * prior)
+        return True
+
+    def summary(self):
+        if self.measured < 2:
+            return f"Cost model: {self.measured} task times measured"
+        return (f"Cost model: {self.measured} task times measured, mean prediction error "
+                f"{self.relative_error / (self.measured - 1):.0%}")
+
+def run_scheduled(pool, tasks, function, model, handle, in_flight):
+    """
+    Evaluates function(task) for all the tasks, the longest predicted first,
+    and calls handle(output) for every output in the order they finish.
+
+    function must return (output, seconds), seconds being the measured time
+    of the task, which refines the model. At most in_flight tasks are given
+    to the pool at a time, so the order of the remaining tasks follows the
+    refitted model. With pool None the tasks run in this process.
+    """
+    pending = sorted(tasks, key=model.predict)
+
+    def finish(task, output, seconds):
+        if model.update(task, seconds):
+            pending.sort(key=model.predict)
+        handle(output)
+
+    if pool is None:
+        while pending:
+            task = pending.pop()
+            finish(task, *function(task))
+        return
+
+    finished = queue.Queue()
+    running = 0
+    while pending or running:
+        while pending and running < in_flight:
+            task = pending.pop()
+            pool.apply_async(function, (task,), callback=lambda result, task=task: finished.put((task, result, None)),
+                             error_callback=lambda error, task=task: finished.put((task, None, error)))
+            running += 1
+        task, result, error = finished.get()
+        running -= 1
+        if error is not None:
+            raise error
+        finish(task, *result)
@@ -0,0 +1,273 @@
+"""
+All-pairs EDA split into shards that any number of processes or hosts pull from a shared directory.
+
+    python shards.py init  QUEUE --arc EDA-test/test.arc --prm EDA-test/amoebabio18.prm --shards 64
+    python shards.py work  QUEUE --workers 8      # on every node / SLURM array task
+    python shards.py merge QUEUE --output energy_analysis.txt
+    python shards.py status QUEUE
+
+QUEUE holds job.json (the run settings), one manifest per shard in
+manifests/, the queue state in state.json, the results of every shard in
+results/ and a result cache shared by all the workers. state.json is only
+read and written under a POSIX lock on queue.lock (fcntl.lockf, which also
+works on NFS).
+
+A shard whose worker died is handed out again once its lease (6 hours by
+default, set it above the time of the longest shard) has expired. A shard
+with pairs that failed is queued again, up to max_attempts times, and then
+marked failed with the failed pairs listed in state.json.
+"""
+import argparse
+import fcntl
+import heapq
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+import new_main
+from interaction_matrix import InteractionMatrix
+from pair_screen import screen_pairs
+from stats import RunningStats
+from topology import load_topology
+from trajectory_cache import load_trajectory_cache
+
+# Seconds after which a running shard is considered abandoned
+DEFAULT_LEASE = 6 * 3600
+
+def pair_cost(residues, i, j):
+    """Rough relative cost of a pair, analyze grows with the square of the atoms in the pair."""
+    return (len(residues[i]) + len(residues[j])) ** 2
+
+def balance_pairs(residues, pairs, n_shards):
+    """
+    Splits the pairs into n_shards lists of about the same total cost.
+
+    The most expensive pairs are placed first, each one on the shard with
+    the lowest cost so far (longest processing time first).
+    """
+    shards = [[] for _ in range(n_shards)]
+    heap = [(0, k) for k in range(n_shards)]
+    for i, j in sorted(pairs, key=lambda pair: -pair_cost(residues, *pair)):
+        cost, k = heapq.heappop(heap)
+        shards[k].append((i, j))
+        heapq.heappush(heap, (cost + pair_cost(residues, i, j), k))
+    return [sorted(shard) for shard in shards if shard]
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+@contextmanager
+def locked_state(queue_dir):
+    """Holds the queue lock and yields the state, which is written back when the block ends."""
+    with open(os.path.join(queue_dir, "queue.lock"), 'a') as lock:
+        fcntl.lockf(lock, fcntl.LOCK_EX)
+        try:
+            state_path = os.path.join(queue_dir, "state.json")
+            state = _read_json(state_path)
+            yield state
+            _write_json(state_path, state)
+        finally:
+            fcntl.lockf(lock, fcntl.LOCK_UN)
+
+def init_queue(queue_dir, arc_file, prm_file, n_shards, extractor='native', batch_size=64, cutoff=None,
+               cutoff_mode='any'):
+    """
+    Writes the job, the shard manifests and the queue state of an all-pairs run.
+
+    With a cutoff only the pairs that pass pair_screen.screen_pairs are
+    sharded. Returns the number of shards.
+    """
+    load_trajectory_cache(arc_file)  # Built once here rather than by every worker at the same time
+    residues = load_topology(arc_file).residue_list(new_main.residue_kinds)
+    n = len(residues)
+    if cutoff is not None:
+        pairs = sorted(screen_pairs(arc_file, residues, cutoff, mode=cutoff_mode))
+    else:
+        pairs = [(i, j) for i in range(1, n) for j in range(i + 1, n)]
+    shards = balance_pairs(residues, pairs, n_shards)
+
+    for name in ("manifests", "results", "cache", "work"):
+        os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+    _write_json(os.path.join(queue_dir, "job.json"), {
+        'arc_file': os.path.abspath(arc_file), 'prm_file': os.path.abspath(prm_file), 'n_residues': n,
+        'extractor': extractor, 'batch_size': batch_size, 'n_pairs': len(pairs), 'n_shards': len(shards),
+    })
+    for k, shard in enumerate(shards):
+        _write_json(os.path.join(queue_dir, "manifests", f"shard_{k:05d}.json"), {'shard': k, 'pairs': shard})
+    _write_json(os.path.join(queue_dir, "state.json"),
+                {'shards': [{'status': 'pending', 'owner': None, 'claimed': None} for _ in shards]})
+    print(f"{len(pairs)} pairs in {len(shards)} shards written to {queue_dir}")
+    return len(shards)
+
+def claim_shard(queue_dir, owner, lease=DEFAULT_LEASE):
+    """
+    Takes the next pending shard, returns its number or None when there is nothing left.
+
+    A shard that has been running longer than lease (seconds) is considered
+    abandoned and handed out again. lease None never takes a shard over.
+    """
+    now = time.time()
+    with locked_state(queue_dir) as state:
+        for k, shard in enumerate(state['shards']):
+            expired = shard['status'] == 'running' and lease is not None and now - shard['claimed'] > lease
+            if shard['status'] == 'pending' or expired:
+                shard.update(status='running', owner=owner, claimed=now)
+                return k
+    return None
+
+def complete_shard(queue_dir, k, pairs, results, max_attempts=3):
+    """
+    Stores the results {(i, j): energy_components} of shard k and marks it as done.
+
+    When some of its pairs have no result the shard goes back to pending,
+    or is marked failed after max_attempts attempts; the missing pairs are
+    listed under 'failed' in its state. Returns the new status.
+    """
+    failed = sorted(set(pairs) - set(results))
+    _write_json(os.path.join(queue_dir, "results", f"shard_{k:05d}.json"), {
+        'shard': k,
+        'pairs': [[i, j, {component: stats.to_dict() for component, stats in energy_components.items()}]
+                  for (i, j), energy_components in sorted(results.items())],
+    })
+    with locked_state(queue_dir) as state:
+        shard = state['shards'][k]
+        shard['attempts'] = shard.get('attempts', 0) + 1
+        shard['failed'] = [list(pair) for pair in failed]
+        if not failed:
+            shard['status'] = 'done'
+        elif shard['attempts'] < max_attempts:
+            shard.update(status='pending', owner=None, claimed=None)
+        else:
+            shard['status'] = 'failed'
+        return shard['status']
+
+def run_worker(queue_dir, workers=1, lease=DEFAULT_LEASE, max_attempts=3):
+    """
+    Evaluates shards from the queue until none is left, returns the number of shards done.
+
+    The pairs of a shard go through new_main.archive_sep_pair in a working
+    directory of this process, with the result cache of the queue, so a
+    shard that is tried again only evaluates the pairs that failed.
+    """
+    job = _read_json(os.path.join(queue_dir, "job.json"))
+    arc_file = job['arc_file']
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    _, frames, residues = new_main.open_trajectory(arc_file)
+    if frames is None:
+        return 0
+    if len(residues) != job['n_residues']:
+        print(f"Error: {arc_file} has {len(residues) - 1} residues, the queue was made for {job['n_residues'] - 1}.")
+        return 0
+
+    work_dir = os.path.abspath(os.path.join(queue_dir, "work", owner.replace(':', '_')))
+    cache_dir = os.path.abspath(os.path.join(queue_dir, "cache"))
+    queue_dir = os.path.abspath(queue_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    cwd = os.getcwd()
+    done = 0
+    try:
+        os.chdir(work_dir)  # energy_analysis.txt of every process stays apart
+        while True:
+            k = claim_shard(queue_dir, owner, lease)
+            if k is None:
+                break
+            manifest = _read_json(os.path.join(queue_dir, "manifests", f"shard_{k:05d}.json"))
+            pairs = {tuple(pair) for pair in manifest['pairs']}
+            print(f"{owner}: shard {k} with {len(pairs)} pairs")
+            results = new_main.archive_sep_pair(residues, job['prm_file'], workers=workers, cache_dir=cache_dir,
+                                                extractor=job['extractor'], batch_size=job['batch_size'], pairs=pairs)
+            status = complete_shard(queue_dir, k, pairs, results or {}, max_attempts)
+            if status == 'done':
+                done += 1
+            else:
+                print(f"{owner}: {len(pairs) - len(results or {})} pairs of shard {k} failed, the shard is {status}.")
+    finally:
+        os.chdir(cwd)
+    return done
+
+def queue_status(queue_dir):
+    """Returns the number of shards in every status."""
+    with locked_state(queue_dir) as state:
+        counts = {}
+        for shard in state['shards']:
+            counts[shard['status']] = counts.get(shard['status'], 0) + 1
+    return counts
+
+def merge_results(queue_dir, output_file="energy_analysis.txt", matrix_dir=None):
+    """
+    Writes the results of all the shards to one output file, in pair order, like a single run of new_main.py.
+
+    With a matrix_dir the results are also stored as an InteractionMatrix there.
+
+    Returns the totals of every component over all the pairs.
+    """
+    job = _read_json(os.path.join(queue_dir, "job.json"))
+    with locked_state(queue_dir) as state:
+        for k, shard in enumerate(state['shards']):
+            if shard['status'] == 'failed':
+                print(f"Warning: Shard {k} failed, its pairs {shard['failed']} have no result.")
+    results = {}
+    for k in range(job['n_shards']):
+        path = os.path.join(queue_dir, "results", f"shard_{k:05d}.json")
+        if not os.path.exists(path):
+            print(f"Warning: Shard {k} has no results yet.")
+            continue
+        for i, j, energy_components in _read_json(path)['pairs']:
+            results[(i, j)] = {component: RunningStats.from_dict(stats) for component, stats in energy_components.items()}
+
+    open(output_file, "w").close()
+    new_main.Main.all_energy_components = {}
+    for (i, j), energy_components in sorted(results.items()):
+        new_main.record_pair_result(i, j, energy_components, output_file)
+    if len(results) < job['n_pairs']:
+        print(f"Warning: {job['n_pairs'] - len(results)} of {job['n_pairs']} pairs are missing.")
+    print(f"{len(results)} pairs written to {output_file}")
+    if matrix_dir is not None:
+        InteractionMatrix.from_results(results, job['n_residues'], sparse=len(results) < job['n_pairs']).save(matrix_dir)
+        print(f"Interaction matrices written to {matrix_dir}")
+    return new_main.Main.all_energy_components
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sharded all-pairs EDA over a shared directory.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    init = commands.add_parser('init', help="Write the shard manifests and the queue.")
+    init.add_argument("queue")
+    init.add_argument("--arc", default=new_main.arc_file)
+    init.add_argument("--prm", default=new_main.prm_file)
+    init.add_argument("--shards", type=int, required=True)
+    init.add_argument("--extractor", choices=('archive', 'native'), default='native')
+    init.add_argument("--batch-size", type=int, default=new_main.batch_size)
+    init.add_argument("--cutoff", type=float, default=None)
+    init.add_argument("--cutoff-mode", choices=('any', 'mean'), default='any')
+    work = commands.add_parser('work', help="Evaluate shards until the queue is empty.")
+    work.add_argument("queue")
+    work.add_argument("--workers", type=int, default=1)
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                      help="Seconds after which a running shard is taken over, above the time of the longest shard.")
+    work.add_argument("--attempts", type=int, default=3, help="Times a shard with failed pairs is tried.")
+    merge = commands.add_parser('merge', help="Combine the shard results into one file.")
+    merge.add_argument("queue")
+    merge.add_argument("--output", default="energy_analysis.txt")
+    merge.add_argument("--matrix", default=None, help="Also store the results as interaction matrices there.")
+    status = commands.add_parser('status', help="Count the shards by status.")
+    status.add_argument("queue")
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        init_queue(args.queue, args.arc, args.prm, args.shards, args.extractor, args.batch_size, args.cutoff,
+                   args.cutoff_mode)
+    elif args.command == 'work':
+        print(f"{run_worker(args.queue, args.workers, args.lease, args.attempts)} shards done")
+    elif args.command == 'merge':
+        merge_results(args.queue, args.output, args.matrix)
+    else:
+        print(", ".join(f"{count} {status}" for status, count in sorted(queue_status(args.queue).items())))
@@ -0,0 +1,54 @@
+class RunningStats:
+    """
+    Streaming mean and standard deviation (Welford's algorithm).
+
+    Values are added one at a time with push() and partial results, e.g. from
+    different workers or frame chunks, are combined exactly with merge(), so
+    no list of raw values has to be kept.
+    """
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def push(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Adds the values summarised by other to these statistics."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        """Population variance, as used for the AVG STD columns of energy_analysis.txt."""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['count'], data['mean'], data['m2'])
+
+    def __repr__(self):
+        return f"RunningStats(count={self.count}, mean={self.mean}, std={self.std})"
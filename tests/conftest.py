@@ -0,0 +1,52 @@
+"""
+Shared fixtures: a small synthetic trajectory (bench/synthetic.py) and the
+stand-in TINKER executables of bench/bin, so no TINKER install is needed.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "bench")
+sys.path[:0] = [ROOT, BENCH_DIR]
+
+from synthetic import write_arc  # noqa: E402
+
+N_RESIDUES = 6
+ATOMS_PER_RESIDUE = 7
+N_FRAMES = 6
+N_WATERS = 3
+
+@pytest.fixture
+def synthetic_arc(tmp_path):
+    """Path of a synthetic trajectory of N_RESIDUES residues and N_WATERS waters over N_FRAMES frames."""
+    path = str(tmp_path / "synthetic.arc")
+    write_arc(path, N_RESIDUES, ATOMS_PER_RESIDUE, N_FRAMES, N_WATERS)
+    return path
+
+@pytest.fixture
+def stub_tinker(tmp_path, monkeypatch):
+    """Puts the stub archive and analyze first on the PATH and runs the test in tmp_path. Returns a .prm path."""
+    monkeypatch.setenv("PATH", os.path.join(BENCH_DIR, "bin") + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("TINKER_STUB_LATENCY", "0")
+    monkeypatch.chdir(tmp_path)
+    prm_file = tmp_path / "synthetic.prm"
+    prm_file.write_text("")
+    return str(prm_file)
+
+def as_dicts(results):
+    """(i, j) -> component -> RunningStats results as plain dicts, for comparisons."""
+    return {pair: {component: stats.to_dict() for component, stats in components.items()}
+            for pair, components in results.items()}
+
+def frame_texts(path):
+    """The frames of a trajectory as lists of whitespace-split lines."""
+    with open(path) as file:
+        lines = [line.split() for line in file if line.strip()]
+    frames = []
+    while lines:
+        n_atoms = int(lines[0][0])
+        frames.append(lines[:n_atoms + 1])
+        lines = lines[n_atoms + 1:]
+    return frames
@@ -0,0 +1,38 @@
+import numpy as np
+
+from apply_mutations import apply_mutations, parse_mutations, read_mutation_list, validate_mutations, write_variants
+
+SEQUENCE = "MSLVPATNYIYTPLNQ"
+MUTATIONS = ["M1A", "S2G", "X99W", "V4I", "bad", "L3P", "Q16R", "A7T"]
+
+def read_fasta(path):
+    with open(path) as file:
+        lines = file.read().splitlines()
+    return dict(zip([line[1:] for line in lines[0::2]], lines[1::2]))
+
+def test_parse_mutations():
+    positions, original, new, names = parse_mutations(MUTATIONS, report=False)
+    assert names == ["M1A", "S2G", "X99W", "V4I", "L3P", "Q16R", "A7T"]
+    assert list(positions) == [0, 1, 98, 3, 2, 15, 6]
+    assert original.tobytes() == b"MSXVLQA" and new.tobytes() == b"AGWIPRT"
+
+def test_validate_mutations(capsys):
+    positions, original, new, names = parse_mutations(MUTATIONS, report=False)
+    in_range, mismatch = validate_mutations(np.frombuffer(SEQUENCE.encode(), dtype=np.uint8), positions, original,
+                                            names)
+    assert list(in_range) == [True, True, False, True, True, True, True]
+    assert list(mismatch) == [False, False, False, False, False, False, True]
+    assert "1 mutations out of range, 1 do not match the wild type." in capsys.readouterr().out
+
+def test_variants_match_apply_mutations(tmp_path):
+    path = str(tmp_path / "variants.fasta")
+    assert write_variants(SEQUENCE, MUTATIONS + ["N8K"], path, buffer_size=16) == 7
+    variants = read_fasta(path)
+    assert list(variants) == ["M1A", "S2G", "V4I", "L3P", "Q16R", "A7T", "N8K"]
+    for name, variant in variants.items():
+        assert variant == apply_mutations(SEQUENCE, [name])
+
+def test_deltas_and_mutation_list(tmp_path):
+    path = tmp_path / "deltas.txt"
+    write_variants(SEQUENCE, MUTATIONS, str(path), deltas=True)
+    assert read_mutation_list(str(path)) == ["M1A", "S2G", "V4I", "L3P", "Q16R", "A7T"]
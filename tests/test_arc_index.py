@@ -0,0 +1,45 @@
+import os
+
+from arc_index import build_frame_index, frame_digests, index_path, load_frame_index, read_frame_index
+from conftest import N_FRAMES, frame_texts
+
+def test_frames_match_the_text(synthetic_arc):
+    index = load_frame_index(synthetic_arc)
+    try:
+        assert len(index) == N_FRAMES
+        assert index.offsets[-1] == os.path.getsize(synthetic_arc)
+        frames = frame_texts(synthetic_arc)
+        for k in range(N_FRAMES):
+            assert [line.split() for line in index.frame_lines(k)] == frames[k]
+        assert index.frame_bytes(-1) == index.frame_bytes(N_FRAMES - 1)
+    finally:
+        index.close()
+
+def test_stored_index_is_reused_until_the_file_changes(synthetic_arc):
+    load_frame_index(synthetic_arc).close()
+    assert os.path.exists(index_path(synthetic_arc))
+    assert list(read_frame_index(synthetic_arc).offsets) == list(build_frame_index(synthetic_arc).offsets)
+
+    with open(synthetic_arc, 'a') as file:
+        file.write("\n")
+    assert read_frame_index(synthetic_arc) is None
+
+def test_frame_digests_follow_the_frames(synthetic_arc):
+    before = frame_digests(synthetic_arc)
+    assert len(before) == N_FRAMES
+
+    index = load_frame_index(synthetic_arc)
+    try:
+        start, stop = index.offsets[2], index.offsets[3]
+    finally:
+        index.close()
+    with open(synthetic_arc, 'r+b') as file:
+        data = bytearray(file.read())
+        position = data.index(b".", start)  # Same size, one coordinate digit changed
+        data[position + 1] = ord('9') if data[position + 1] != ord('9') else ord('8')
+        file.seek(0)
+        file.write(data)
+    assert position < stop
+
+    after = frame_digests(synthetic_arc)
+    assert [k for k in range(N_FRAMES) if before[k] != after[k]] == [2]
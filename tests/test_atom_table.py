@@ -0,0 +1,38 @@
+import numpy as np
+
+from atom_table import load_coordinates, parse_frame, read_atom_table
+from conftest import N_FRAMES, frame_texts
+
+def test_atom_table_matches_the_text(synthetic_arc):
+    lines = frame_texts(synthetic_arc)[2][1:]
+    atoms, connect_ptr, connect_idx = read_atom_table(synthetic_arc, frame=2)
+
+    assert list(atoms['atom_num']) == [int(parts[0]) for parts in lines]
+    assert list(atoms['atom_sym']) == [parts[1] for parts in lines]
+    assert list(atoms['atom_type']) == [int(parts[5]) for parts in lines]
+    assert np.array_equal(atoms['xyz'], [[float(v) for v in parts[2:5]] for parts in lines])
+    for k, parts in enumerate(lines):
+        assert list(connect_idx[connect_ptr[k]:connect_ptr[k + 1]]) == [int(num) for num in parts[6:]]
+
+def test_coordinates_of_all_and_some_frames(synthetic_arc, tmp_path):
+    frames = frame_texts(synthetic_arc)
+    expected = np.array([[[float(v) for v in parts[2:5]] for parts in frame[1:]] for frame in frames])
+
+    coords = load_coordinates(synthetic_arc, use_cache=False)
+    assert coords.shape == (N_FRAMES, len(frames[0]) - 1, 3)
+    assert np.array_equal(coords, expected)
+    assert np.array_equal(load_coordinates(synthetic_arc, frames=[4, 1], use_cache=False), expected[[4, 1]])
+
+    mapped = load_coordinates(synthetic_arc, mmap_path=str(tmp_path / "coords.npy"))
+    assert np.array_equal(np.load(tmp_path / "coords.npy", mmap_mode='r'), expected)
+    assert np.array_equal(mapped, expected)
+
+def test_box_line_is_skipped():
+    frame = (b"     2  water\n"
+             b"   20.000000   20.000000   20.000000   90.000000   90.000000   90.000000\n"
+             b"     1  O      0.000000    0.000000    0.000000   247     2\n"
+             b"     2  H      0.960000    0.000000    0.000000   248     1\n")
+    atoms, connect_ptr, connect_idx = parse_frame(frame)
+    assert list(atoms['atom_sym']) == ['O', 'H']
+    assert list(connect_ptr) == [0, 1, 2]
+    assert list(connect_idx) == [2, 1]
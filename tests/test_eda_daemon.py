@@ -0,0 +1,69 @@
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import eda_daemon
+from conftest import N_FRAMES, N_RESIDUES
+
+@pytest.fixture
+def daemon(synthetic_arc, stub_tinker, tmp_path):
+    daemon = eda_daemon.EDADaemon(synthetic_arc, stub_tinker, cache_dir=str(tmp_path / "cache"), workers=2)
+    yield daemon
+    daemon.close()
+
+def test_queries_keep_the_workers(daemon):
+    info = daemon.handle({'op': 'info'})
+    assert (info['residues'], info['frames'], info['pairs_in_memory']) == (N_RESIDUES, N_FRAMES, 0)
+
+    pool = daemon.pair_pool.pool
+    workers = sorted(process.pid for process in pool._pool)
+    (pair,) = daemon.handle({'op': 'pair', 'i': 4, 'j': 2})['pairs']
+    assert pair[:2] == [2, 4] and pair[2]["Intermolecular Energy"]['count'] == N_FRAMES
+
+    profiles = daemon.handle({'op': 'reference', 'residues': [2], 'top': 3})['profiles']
+    assert len(profiles['2']) == 3
+    means = [components["Intermolecular Energy"]['mean'] for _, components in profiles['2']]
+    assert means == sorted(means)
+    assert daemon.pair_pool.pool is pool and sorted(process.pid for process in pool._pool) == workers
+    assert daemon.handle({'op': 'info'})['pairs_in_memory'] == N_RESIDUES - 1
+
+def test_invalid_requests(daemon):
+    with pytest.raises(ValueError):
+        daemon.handle({'op': 'pair', 'i': 0, 'j': 2})
+    with pytest.raises(ValueError):
+        daemon.handle({'op': 'pair', 'i': 3, 'j': 3})
+    with pytest.raises(ValueError):
+        daemon.handle({'op': 'unknown'})
+
+def test_changed_trajectory_is_reloaded(daemon, synthetic_arc):
+    daemon.handle({'op': 'pair', 'i': 1, 'j': 2})
+    scratch_root = daemon.pair_pool.scratch_root
+    with open(synthetic_arc, 'a') as file:
+        file.write("\n")
+    assert daemon.handle({'op': 'pair', 'i': 1, 'j': 3})['pairs']
+    assert daemon.handle({'op': 'info'})['pairs_in_memory'] == 1
+    assert not os.path.exists(scratch_root)
+
+def test_serve_over_a_private_socket(daemon, tmp_path):
+    socket_path = str(tmp_path / "eda.sock")
+    server = threading.Thread(target=eda_daemon.serve, args=(socket_path, daemon, str(tmp_path / "work")))
+    server.start()
+    try:
+        for _ in range(200):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.01)
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        reply = eda_daemon.query(socket_path, {'op': 'pair', 'i': 1, 'j': 2}, timeout=30)
+        assert reply['ok'] and reply['pairs'][0][:2] == [1, 2]
+        reply = eda_daemon.query(socket_path, {'op': 'pair', 'i': 1, 'j': 99}, timeout=30)
+        assert not reply['ok'] and "Invalid residue 99" in reply['error']
+        assert eda_daemon.query(socket_path, {'op': 'shutdown'}, timeout=30) == {'ok': True}
+    finally:
+        server.join(timeout=30)
+    assert not server.is_alive()
+    assert not os.path.exists(socket_path)
+    assert daemon.pair_pool is None
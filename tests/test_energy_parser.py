@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+import pytest
+
+import new_main
+from conftest import N_FRAMES
+from energy_parser import COLUMN, COMPONENTS, AnalyzeParser, EnergySeriesStore
+
+OUTPUT = """
+ Analysis for Archive Structure :               1
+
+ Total Potential Energy :               -161.8985 Kcal/mole
+
+ Intermolecular Energy :                 -80.9492 Kcal/mole
+
+ Energy Component Breakdown :           Kcal/mole        Interactions
+
+ Bond Stretching                          25.5000               51
+ Van der Waals                           -24.2848              650
+ Atomic Multipoles                  -0.485695D+02              650
+
+ Analysis for Archive Structure :               2
+
+ Intermolecular Energy :                 -80.6676 Kcal/mole
+
+ Van der Waals                           -24.2003              650
+"""
+
+def parse(text):
+    parser = AnalyzeParser()
+    rows = [row for row in map(parser.feed, text.splitlines(keepends=True)) if row is not None]
+    return rows + [parser.finish()]
+
+def test_rows_of_every_frame():
+    first, second = parse(OUTPUT)
+    assert first[COLUMN["Total Potential Energy"]] == -161.8985
+    assert first[COLUMN["Atomic Multipoles"]] == -48.5695
+    assert first[COLUMN["Bond Stretching"]] == 25.5
+    assert math.isnan(first[COLUMN["Polarization"]])
+    assert second[COLUMN["Intermolecular Energy"]] == -80.6676
+    assert math.isnan(second[COLUMN["Total Potential Energy"]])
+
+def test_single_structure_without_frame_header():
+    (row,) = parse(" Intermolecular Energy :     -1.5000 Kcal/mole\n Van der Waals     -2.2500     3\n")
+    assert (row[COLUMN["Intermolecular Energy"]], row[COLUMN["Van der Waals"]]) == (-1.5, -2.25)
+
+def test_series_parts_are_joined(tmp_path):
+    store = EnergySeriesStore(str(tmp_path / "series"))
+    rows = np.arange(5 * len(COMPONENTS), dtype=np.float32).reshape(5, len(COMPONENTS))
+    store.expect_parts(1, 2, 2, 5)
+    for part, chunk in enumerate([rows[:3], rows[3:]]):
+        with store.writer(1, 2, part=part) as file:
+            for row in chunk:
+                store.write_row(file, row)
+    assert np.array_equal(store.load(1, 2), rows)
+    assert np.array_equal(store.load(1, 2, "Van der Waals"), rows[:, COLUMN["Van der Waals"]])
+
+    store.expect_parts(1, 2, 3, 5)
+    with pytest.raises(ValueError):
+        store.load(1, 2)
+    store.clear(1, 2)
+    with pytest.raises(FileNotFoundError):
+        store.load(1, 2)
+
+def test_series_matches_the_statistics(synthetic_arc, stub_tinker, tmp_path):
+    series_dir = str(tmp_path / "series")
+    results = new_main.analyze_pair(synthetic_arc, stub_tinker, pair=(1, 2), series_dir=series_dir)
+    series = EnergySeriesStore(series_dir).load(1, 2, "Intermolecular Energy").astype(np.float64)
+    stats = results["Intermolecular Energy"]
+    assert len(series) == stats.count == N_FRAMES
+    assert stats.mean == pytest.approx(series.mean(), rel=1e-6)
+    assert stats.std == pytest.approx(series.std(), rel=1e-4)
+
+def test_parse_error_kills_analyze(synthetic_arc, stub_tinker, tmp_path, monkeypatch):
+    processes = []
+    popen = new_main.subprocess.Popen
+
+    def recording_popen(*args, **kwargs):
+        processes.append(popen(*args, **kwargs))
+        return processes[-1]
+
+    def broken_feed(self, line):
+        raise RuntimeError("unexpected output")
+
+    monkeypatch.setattr(new_main.subprocess, "Popen", recording_popen)
+    monkeypatch.setattr(AnalyzeParser, "feed", broken_feed)
+    series_dir = str(tmp_path / "series")
+    assert new_main.analyze_pair(synthetic_arc, stub_tinker, pair=(1, 2), series_dir=series_dir) is None
+    assert processes[0].returncode is not None
+    with pytest.raises(FileNotFoundError):
+        EnergySeriesStore(series_dir).load(1, 2)
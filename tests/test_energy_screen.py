@@ -0,0 +1,146 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from atom_table import load_coordinates, read_atom_table
+from conftest import N_RESIDUES
+from energy_screen import _near_residues, approximate_energies, energy_screen
+from force_field import load_force_field, params_path
+from pair_screen import residue_slices
+from topology import load_topology
+
+# Lennard-Jones with arithmetic radii and fixed charges; the H (type 12) is reduced toward its N
+PRM = """
+radiussize              DIAMETER
+chg-13-scale            0.5
+chg-14-scale            0.8
+vdw-14-scale            0.5
+
+atom          7    7    N     "N"     7    14.003    3
+atom          8    8    CA    "CA"    6    12.000    4
+atom          9    9    C     "C"     6    12.000    3
+atom         10   10    O     "O"     8    15.995    1
+atom         11   11    CB    "CB"    6    12.000    4
+atom         12   12    HN    "HN"    1     1.008    1
+
+vdw           7               3.7100     0.1100
+vdw           8               3.8200     0.1010
+vdw           9               3.8200     0.1060
+vdw          10               3.3000     0.1120
+vdw          11               3.8200     0.1010
+vdw          12               2.5900     0.0220      0.900
+
+charge        7              -0.4157
+charge        8               0.1337
+charge        9               0.5973
+charge       10              -0.5679
+charge       11              -0.0500
+charge       12               0.2000
+"""
+ELECTRIC = 332.063713
+SCALES = {'vdw': [0.0, 0.0, 0.5, 1.0], 'chg': [0.0, 0.5, 0.8, 1.0]}
+
+@pytest.fixture
+def prm_file(tmp_path):
+    path = tmp_path / "screen.prm"
+    path.write_text(PRM)
+    return str(path)
+
+def test_force_field_parameters(prm_file):
+    force_field = load_force_field(prm_file)
+    assert force_field.keywords['charges'] == 'charge' and force_field.keywords['chg-14-scale'] == 0.8
+    charge, radius, epsilon, reduction = force_field.atom_parameters([7, 12, 247])
+    assert np.allclose(charge, [-0.4157, 0.2, 0.0])
+    assert np.allclose(radius, [1.855, 1.295, 0.0]) and np.allclose(epsilon, [0.11, 0.022, 0.0])
+    assert np.allclose(reduction, [0.0, 0.9, 0.0])
+    # The second load comes from the cache
+    with open(params_path(prm_file), 'rb') as cache:
+        stored = cache.read()
+    assert np.array_equal(load_force_field(prm_file).type_charge, force_field.type_charge)
+    with open(params_path(prm_file), 'rb') as cache:
+        assert cache.read() == stored
+
+def brute_force(arc_file, residues, force_field):
+    """(i, j) -> (vdw, electrostatic) averaged over the frames, one atom pair at a time."""
+    atoms, connect_ptr, connect_idx = read_atom_table(arc_file)
+    bonded = [list(connect_idx[connect_ptr[k]:connect_ptr[k + 1]] - 1) for k in range(len(atoms))]
+    charge, radius, epsilon, reduction = force_field.atom_parameters(atoms['atom_type'])
+    xyz = load_coordinates(arc_file).astype(np.float64)
+
+    def bonds_from(a):
+        found, queue = {a: 0}, deque([a])
+        while queue:
+            x = queue.popleft()
+            for y in bonded[x]:
+                if y not in found:
+                    found[y] = found[x] + 1
+                    queue.append(y)
+        return found
+
+    def site(f, a):
+        if reduction[a] > 0:
+            parent = bonded[a][0]
+            return xyz[f, parent] + reduction[a] * (xyz[f, a] - xyz[f, parent])
+        return xyz[f, a]
+
+    energies = {}
+    for ri in range(1, len(residues)):
+        for rj in range(ri + 1, len(residues)):
+            vdw = electrostatic = 0.0
+            for a in residues[ri]['atom_num'] - 1:
+                bonds = bonds_from(a)
+                for b in residues[rj]['atom_num'] - 1:
+                    n = bonds.get(b, 5)
+                    vdw_scale = SCALES['vdw'][n - 1] if n <= 4 else 1.0
+                    chg_scale = SCALES['chg'][n - 1] if n <= 4 else 1.0
+                    r0, eps = radius[a] + radius[b], np.sqrt(epsilon[a] * epsilon[b])
+                    for f in range(len(xyz)):
+                        electrostatic += chg_scale * ELECTRIC * charge[a] * charge[b] / np.linalg.norm(xyz[f, a] - xyz[f, b])
+                        p6 = (r0 / np.linalg.norm(site(f, a) - site(f, b))) ** 6
+                        vdw += vdw_scale * eps * (p6 * p6 - 2.0 * p6)
+            energies[(ri, rj)] = (vdw / len(xyz), electrostatic / len(xyz))
+    return energies
+
+def test_energies_match_brute_force(synthetic_arc, prm_file):
+    residues = load_topology(synthetic_arc).residue_list()
+    force_field = load_force_field(prm_file)
+    expected = brute_force(synthetic_arc, residues, force_field)
+    i, j, vdw, electrostatic = approximate_energies(synthetic_arc, residues, force_field, vdw_cutoff=None,
+                                                    charge_cutoff=None, chunk=4, block=100)
+    assert list(zip(i, j)) == list(expected)
+    assert np.allclose(vdw, [e[0] for e in expected.values()], rtol=1e-4, atol=1e-5)
+    assert np.allclose(electrostatic, [e[1] for e in expected.values()], rtol=1e-4, atol=1e-5)
+
+    # Cutoffs beyond the system change nothing
+    _, _, far_vdw, far_electrostatic = approximate_energies(synthetic_arc, residues, force_field, vdw_cutoff=1e3,
+                                                            charge_cutoff=1e3)
+    assert np.allclose(far_vdw, vdw, rtol=1e-5, atol=1e-6)
+    assert np.allclose(far_electrostatic, electrostatic, rtol=1e-5, atol=1e-6)
+
+@pytest.mark.parametrize("cutoff", [2.0, 4.0, 6.0])
+def test_near_residues_cover_the_close_pairs(synthetic_arc, cutoff):
+    residues = load_topology(synthetic_arc).residue_list()
+    _, starts, stops = residue_slices(residues)
+    xyz = load_coordinates(synthetic_arc).astype(np.float64)
+    selected = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+    bounds = np.concatenate([[0], np.cumsum(stops - starts)])
+    near, centroids = _near_residues(xyz[:, selected], bounds, cutoff)
+    assert centroids.shape == (len(xyz), N_RESIDUES, 3)
+    for a in range(N_RESIDUES):
+        for b in range(a + 1, N_RESIDUES):
+            x, y = xyz[:, starts[a]:stops[a]], xyz[:, starts[b]:stops[b]]
+            if np.linalg.norm(x[:, :, None] - y[:, None, :], axis=-1).min() <= cutoff:
+                assert near[a, b]
+
+def test_energy_screen_ranks_the_pairs(synthetic_arc, prm_file, tmp_path):
+    residues = load_topology(synthetic_arc).residue_list()
+    output = str(tmp_path / "screen.txt")
+    shortlist = energy_screen(synthetic_arc, prm_file, residues, 1.0, output_file=output)
+    energies = list(shortlist.values())
+    assert energies and all(abs(e) >= 1.0 for e in energies)
+    assert energies == sorted(energies, key=abs, reverse=True)
+    assert set(shortlist) < set(energy_screen(synthetic_arc, prm_file, residues, 0.0))
+    with open(output) as file:
+        lines = file.read().splitlines()[1:]
+    assert [tuple(int(word) for word in line.split()[1:5:3]) for line in lines] == list(shortlist)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import new_main
+from interaction_matrix import InteractionMatrix
+from stats import RunningStats
+
+N = 8
+
+def results(pairs, seed=0):
+    rng = np.random.default_rng(seed)
+    out = {}
+    for i, j in pairs:
+        out[(i, j)] = {"Intermolecular Energy": RunningStats(10, float(rng.normal(-2.0, 3.0)), float(rng.random())),
+                       "Van der Waals": RunningStats(10, float(rng.normal(-1.0, 1.0)), float(rng.random()))}
+    return out
+
+PAIRS = [(1, 2), (1, 5), (2, 3), (2, 7), (3, 4), (4, 7), (5, 6), (6, 7)]
+
+def expected_partners(data, residue, component="Intermolecular Energy"):
+    found = [(j if i == residue else i, stats[component].mean) for (i, j), stats in data.items() if residue in (i, j)]
+    return sorted(found, key=lambda item: item[1])
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_queries_match_the_results(sparse, tmp_path):
+    data = results(PAIRS)
+    InteractionMatrix.from_results(data, N, sparse=sparse).save(str(tmp_path / "store"))
+    matrix = InteractionMatrix.load(str(tmp_path / "store"))
+    assert matrix.components == ["Intermolecular Energy", "Van der Waals"]
+
+    i, j, mean, std = matrix.pairs()
+    assert list(zip(i.tolist(), j.tolist())) == PAIRS
+    assert np.allclose(mean, [data[pair]["Intermolecular Energy"].mean for pair in PAIRS])
+    assert np.allclose(std, [data[pair]["Intermolecular Energy"].std for pair in PAIRS])
+
+    for residue in (2, 7):
+        partner, mean, _ = matrix.partners(residue, k=2)
+        expected = expected_partners(data, residue)[:2]
+        assert partner.tolist() == [p for p, _ in expected]
+        assert np.allclose(mean, [m for _, m in expected])
+
+    i, j, mean, _ = matrix.threshold(2.0, "Van der Waals")
+    assert np.all(np.abs(mean) >= 2.0) and np.all(np.diff(np.abs(mean)) <= 0)
+    assert len(mean) == sum(abs(stats["Van der Waals"].mean) >= 2.0 for stats in data.values())
+
+    block = matrix.submatrix([2, 3, 4])
+    assert np.isnan(block[0, 2]) and block[0, 1] == block[1, 0] == np.float32(data[(2, 3)]["Intermolecular Energy"].mean)
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_merged_replaces_and_adds_pairs(sparse):
+    old = results(PAIRS)
+    new = results([(1, 2), (3, 8)], seed=1)
+    merged = InteractionMatrix.from_results(old, N + 1, sparse=sparse).merged(new)
+    expected = InteractionMatrix.from_results({**old, **new}, N + 1, sparse=True)
+    for component in expected.components:
+        for a, b in zip(merged.pairs(component), expected.pairs(component)):
+            assert np.array_equal(a, b)
+
+def test_energy_analysis_round_trip(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = results(PAIRS)
+    for (i, j), energy_components in data.items():
+        new_main.record_pair_result(i, j, energy_components)
+    matrix = InteractionMatrix.from_energy_analysis("energy_analysis.txt", N)
+    i, j, mean, std = matrix.pairs("Van der Waals")
+    assert np.allclose(mean, [data[pair]["Van der Waals"].mean for pair in PAIRS], atol=0.005)
+    assert np.allclose(std, [data[pair]["Van der Waals"].std for pair in PAIRS], atol=0.005)
+
+    matrix.to_csv(str(tmp_path / "pairs.csv"))
+    table = np.loadtxt(tmp_path / "pairs.csv", delimiter=",", skiprows=1)
+    assert table.shape == (len(PAIRS), 2 + 2 * len(matrix.components))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import new_main
+from conftest import ATOMS_PER_RESIDUE, N_FRAMES, N_RESIDUES, N_WATERS
+from interaction_matrix import InteractionMatrix
+from mutant_eda import mutation_residues, read_sequence, run_mutant_eda
+from synthetic import write_arc
+from topology import load_topology
+
+def test_mutation_residues(synthetic_arc, capsys):
+    topology = load_topology(synthetic_arc)
+    assert mutation_residues(topology, ["A2V", "G6W", "A7T", "bad"]) == {"A2V": 2, "G6W": 6}
+    assert "outside the 6 protein residues" in capsys.readouterr().out
+    assert mutation_residues(topology, ["A11V"], first_position=10) == {"A11V": 2}
+    capsys.readouterr()
+
+    # The original residues are only checked against a given sequence
+    mutation_residues(topology, ["A2V"])
+    assert "Warning" not in capsys.readouterr().out
+    assert mutation_residues(topology, ["A2V"], sequence="MSLVPA") == {"A2V": 2}
+    assert "expected 'A' but found 'S'" in capsys.readouterr().out
+
+def test_read_sequence(tmp_path):
+    assert read_sequence(" mslv\n") == "MSLV"
+    fasta = tmp_path / "wild.fasta"
+    fasta.write_text(">wild type\nmslv\npatn\n")
+    assert read_sequence(str(fasta)) == "MSLVPATN"
+
+def test_only_the_mutated_pairs_are_evaluated(synthetic_arc, stub_tinker, tmp_path, monkeypatch):
+    mutant_arc = str(tmp_path / "mutant.arc")
+    write_arc(mutant_arc, N_RESIDUES, ATOMS_PER_RESIDUE, N_FRAMES, N_WATERS, seed=1)
+    evaluated = []
+    archive_sep_pair = new_main.archive_sep_pair
+
+    def spy(residues, prm_file, **options):
+        evaluated.append(options.get('pairs'))
+        return archive_sep_pair(residues, prm_file, **options)
+
+    monkeypatch.setattr(new_main, "archive_sep_pair", spy)
+    wild_dir, mutant_dir = str(tmp_path / "wild"), str(tmp_path / "mutant")
+    matrix = run_mutant_eda(mutant_arc, stub_tinker, ["A3V"], wild_dir, mutant_dir, wild_arc=synthetic_arc,
+                            extractor='native')
+    assert evaluated[0] is None and sorted(evaluated[1]) == [(1, 3), (2, 3), (3, 4), (3, 5), (3, 6)]
+
+    _, _, residues = new_main.open_trajectory(mutant_arc)
+    full = InteractionMatrix.from_results(archive_sep_pair(residues, stub_tinker, extractor='native'), len(residues))
+    wild_type = InteractionMatrix.load(wild_dir)
+    i, j, mean, _ = InteractionMatrix.load(mutant_dir).pairs()
+    mutated = (i == 3) | (j == 3)
+    assert np.array_equal(mean, matrix.pairs()[2])
+    assert np.array_equal(mean[mutated], full.pairs()[2][mutated])
+    assert np.array_equal(mean[~mutated], wild_type.pairs()[2][~mutated])
+    assert not np.array_equal(mean, wild_type.pairs()[2])
+
+    # The wild type is read from its store from now on
+    evaluated.clear()
+    run_mutant_eda(mutant_arc, stub_tinker, ["A3V"], wild_dir, mutant_dir, extractor='native')
+    assert len(evaluated) == 1
+
+def test_mutant_must_match_the_wild_type(synthetic_arc, stub_tinker, tmp_path):
+    mutant_arc = str(tmp_path / "longer.arc")
+    write_arc(mutant_arc, N_RESIDUES + 1, ATOMS_PER_RESIDUE, N_FRAMES, N_WATERS)
+    with pytest.raises(ValueError):
+        run_mutant_eda(mutant_arc, stub_tinker, ["A3V"], str(tmp_path / "wild"), str(tmp_path / "mutant"),
+                       wild_arc=synthetic_arc, extractor='native')
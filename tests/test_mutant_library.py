@@ -0,0 +1,51 @@
+import itertools
+
+import pytest
+
+from apply_mutations import apply_mutations
+from mutant_library import (LibraryWriter, apply_deltas, iter_variants, prepare_mutations, read_library, variant_name,
+                            write_library)
+
+SEQUENCE = "MSLVPATNYIYTPLNQLKGG"
+MUTATIONS = ["M1A", "M1G", "S2T", "L3L", "P5R", "T7K", "T7K", "N8D", "Q16E", "G20W", "G25A"]
+
+def brute_force(orders, window=None):
+    """Variant names from itertools: distinct positions, no wild type or out of range mutation, within the window."""
+    singles = sorted({m for m in MUTATIONS if int(m[1:-1]) <= len(SEQUENCE) and m[0] != m[-1]},
+                     key=lambda m: (int(m[1:-1]), m[-1]))
+    names = set()
+    for order in orders:
+        for combination in itertools.combinations(singles, order):
+            positions = [int(m[1:-1]) for m in combination]
+            if len(set(positions)) == order and (window is None or max(positions) - min(positions) <= window):
+                names.add(":".join(combination))
+    return names
+
+@pytest.mark.parametrize("orders, window", [((2,), None), ((2, 3), None), ((2, 3, 4), 6), ((3,), 2)])
+def test_variants_match_itertools(orders, window):
+    variants = list(iter_variants(SEQUENCE, MUTATIONS, orders, window))
+    names = [variant_name(deltas, SEQUENCE) for deltas in variants]
+    assert len(names) == len(set(names))
+    assert set(names) == brute_force(orders, window)
+
+def test_deltas_apply_like_apply_mutations():
+    codes = prepare_mutations(SEQUENCE, MUTATIONS)
+    assert len(codes) == 8  # Out of range, wild type and repeated mutations dropped
+    for deltas in iter_variants(SEQUENCE, MUTATIONS, (3,)):
+        assert apply_deltas(deltas, SEQUENCE) == apply_mutations(SEQUENCE, variant_name(deltas, SEQUENCE).split(":"))
+
+def test_library_round_trip_and_append(tmp_path):
+    path = str(tmp_path / "library.bin")
+    assert write_library(SEQUENCE, MUTATIONS, path, orders=(2,)) == len(brute_force((2,)))
+    assert write_library(SEQUENCE, MUTATIONS, path, orders=(2, 3), append=True) == len(brute_force((3,)))
+    names = [variant_name(deltas, SEQUENCE) for deltas in read_library(path, SEQUENCE)]
+    assert sorted(names) == sorted(brute_force((2, 3)))
+
+    with pytest.raises(ValueError):
+        list(read_library(path, SEQUENCE[:-1]))
+    with LibraryWriter(path, SEQUENCE, append=True) as library:
+        assert not library.add(next(iter_variants(SEQUENCE, MUTATIONS, (2,))))
+    with open(path, 'ab') as file:
+        file.write(bytes((2,)) + b"\x00\x01")
+    with pytest.raises(ValueError):
+        list(read_library(path))
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+import new_main
+from conftest import N_FRAMES, N_RESIDUES, as_dicts
+from energy_parser import EnergySeriesStore
+
+@pytest.fixture
+def residues(synthetic_arc, stub_tinker):
+    _, _, residues = new_main.open_trajectory(synthetic_arc, binary_cache=False)
+    return residues
+
+def test_all_pairs_are_evaluated(residues, stub_tinker):
+    results = new_main.archive_sep_pair(residues, stub_tinker)
+    assert sorted(results) == [(i, j) for i in range(1, N_RESIDUES + 1) for j in range(i + 1, N_RESIDUES + 1)]
+    for components in results.values():
+        assert components["Intermolecular Energy"].count == N_FRAMES
+    with open("energy_analysis.txt") as file:
+        assert sum(line.startswith("res ") for line in file) == len(results)
+
+def test_worker_pool_gives_the_same_results(residues, stub_tinker, tmp_path):
+    scratch_root = tmp_path / "scratch"
+    scratch_root.mkdir()
+    serial = new_main.archive_sep_pair(residues, stub_tinker, scratch_root=str(scratch_root))
+    parallel = new_main.archive_sep_pair(residues, stub_tinker, workers=3, scratch_root=str(scratch_root))
+    assert as_dicts(parallel) == as_dicts(serial)
+    assert os.listdir(scratch_root) == []
+
+def test_pairs_restricts_the_evaluated_pairs(residues, stub_tinker):
+    results = new_main.archive_sep_pair(residues, stub_tinker, pairs={(1, 2), (3, 6)})
+    assert sorted(results) == [(1, 2), (3, 6)]
+
+def test_clean_connectivity_drops_removed_bonds(tmp_path):
+    src, dst = tmp_path / "pair.arc_2", tmp_path / "pair.arc"
+    src.write_text("     3  Pair title\n"
+                   "     1  N      0.000000    0.000000    0.000000     7     0     2\n"
+                   "     2  CA     1.000000    0.000000    0.000000     8     1     0     3\n"
+                   "     3  C      2.000000    0.000000    0.000000     9     2\n")
+    new_main.clean_connectivity(str(src), str(dst))
+    assert dst.read_text().splitlines() == ["     3  Pair title",
+                                            "1 N 0.000000 0.000000 0.000000 7 2",
+                                            "2 CA 1.000000 0.000000 0.000000 8 1 3",
+                                            "3 C 2.000000 0.000000 0.000000 9 2"]
+
+def test_split_frames_covers_every_frame_once():
+    task = {'i': 1, 'j': 2, 'frames': (3, 20, 2)}
+    chunks = new_main.split_frames([task, dict(task, i=4, frames=(1, 3, 1))], 4)
+    assert [c['frames'] for c in chunks] == [(3, 9, 2), (11, 17, 2), (19, 20, 2), (1, 3, 1)]
+    assert [c.get('chunk') for c in chunks] == [(0, 3), (1, 3), (2, 3), None]
+    covered = [f for c in chunks[:3] for f in range(c['frames'][0], c['frames'][1] + 1, 2)]
+    assert covered == list(range(3, 21, 2))
+
+@pytest.mark.parametrize("extractor", ['archive', 'native'])
+def test_frame_chunks_are_gathered_exactly(residues, stub_tinker, tmp_path, extractor):
+    whole = new_main.archive_sep_pair(residues, stub_tinker, extractor=extractor,
+                                      series_dir=str(tmp_path / "whole"))
+    chunked = new_main.archive_sep_pair(residues, stub_tinker, workers=2, extractor=extractor, frame_chunk=4,
+                                        series_dir=str(tmp_path / "chunked"))
+    assert sorted(chunked) == sorted(whole)
+    for pair, components in whole.items():
+        for component, stats in components.items():
+            merged = chunked[pair][component]
+            assert merged.count == stats.count == N_FRAMES
+            assert merged.mean == pytest.approx(stats.mean, rel=1e-9)
+            assert merged.m2 == pytest.approx(stats.m2, rel=1e-6, abs=1e-9)
+        assert np.array_equal(EnergySeriesStore(str(tmp_path / "chunked")).load(*pair),
+                              EnergySeriesStore(str(tmp_path / "whole")).load(*pair), equal_nan=True)
@@ -0,0 +1,55 @@
+import os
+import subprocess
+
+import numpy as np
+import pytest
+
+import new_main
+from conftest import N_RESIDUES, as_dicts, frame_texts
+from pair_extract import extract_pairs
+from topology import load_topology
+from trajectory_cache import convert_trajectory
+
+def residue_ranges(arc_file):
+    return [None] + [(int(r[0]['atom_num']), int(r[-1]['atom_num'])) for r in load_topology(arc_file).residue_list()[1:]]
+
+def archived(arc_file, res1_range, res2_range, frames, out_file):
+    """The pair file the archive extractor of new_main leaves, from the stub archive."""
+    header = frame_texts(arc_file)[0][0]
+    subprocess.run(["archive"], input=new_main.pair_archive_input(arc_file, res1_range, res2_range, " ".join(header),
+                                                                  frames),
+                   text=True, check=True, capture_output=True)
+    new_main.clean_connectivity(f"{arc_file}_2", out_file)
+    os.remove(f"{arc_file}_2")
+
+@pytest.mark.parametrize("frames", [(1, 6, 1), (2, 5, 2)])
+def test_native_matches_archive(synthetic_arc, stub_tinker, tmp_path, frames):
+    ranges = residue_ranges(synthetic_arc)
+    pairs = [(i, j, ranges[i], ranges[j]) for i in range(1, N_RESIDUES + 1) for j in range(i + 1, N_RESIDUES + 1)]
+    paths = extract_pairs(synthetic_arc, pairs, str(tmp_path), frames=frames)
+    assert sorted(paths) == [(i, j) for i, j, _, _ in pairs]
+
+    for i, j, res1_range, res2_range in pairs:
+        archived(synthetic_arc, res1_range, res2_range, frames, str(tmp_path / "archived.arc"))
+        assert frame_texts(paths[(i, j)]) == frame_texts(str(tmp_path / "archived.arc")), (i, j)
+
+def test_binary_cache_rounds_to_float32(synthetic_arc, tmp_path):
+    ranges = residue_ranges(synthetic_arc)
+    pairs = [(1, 4, ranges[1], ranges[4])]
+    text = frame_texts(extract_pairs(synthetic_arc, pairs, str(tmp_path))[(1, 4)])
+    convert_trajectory(synthetic_arc)
+    (tmp_path / "cached").mkdir()
+    cached = frame_texts(extract_pairs(synthetic_arc, pairs, str(tmp_path / "cached"))[(1, 4)])
+
+    assert len(cached) == len(text)
+    for a, b in zip(text, cached):
+        assert [line[:2] + line[5:] for line in a] == [line[:2] + line[5:] for line in b]
+        xyz_a = np.array([line[2:5] for line in a[1:]], dtype=np.float64)
+        xyz_b = np.array([line[2:5] for line in b[1:]], dtype=np.float64)
+        assert np.allclose(xyz_a, xyz_b, atol=1e-5)
+
+def test_extractors_give_the_same_energies(synthetic_arc, stub_tinker):
+    _, _, residues = new_main.open_trajectory(synthetic_arc, binary_cache=False)
+    archive = new_main.archive_sep_pair(residues, stub_tinker, extractor='archive')
+    native = new_main.archive_sep_pair(residues, stub_tinker, extractor='native', batch_size=4)
+    assert as_dicts(native) == as_dicts(archive)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from atom_table import load_coordinates
+from pair_screen import cell_list_pairs, screen_pairs
+from topology import load_topology
+
+def brute_force_pairs(points, cutoff):
+    d = np.linalg.norm(points[:, None] - points[None, :], axis=2)
+    a, b = np.nonzero(np.triu(d <= cutoff, k=1))
+    return set(zip(a.tolist(), b.tolist()))
+
+@pytest.mark.parametrize("cutoff", [0.5, 2.0, 7.5, 100.0])
+def test_cell_list_matches_brute_force(cutoff):
+    points = np.random.default_rng(3).uniform(-10.0, 10.0, (300, 3))
+    a, b = cell_list_pairs(points, cutoff)
+    assert np.all(a < b)
+    assert len(set(zip(a.tolist(), b.tolist()))) == len(a)
+    assert set(zip(a.tolist(), b.tolist())) == brute_force_pairs(points, cutoff)
+
+def test_cell_list_of_too_few_points():
+    assert all(len(half) == 0 for half in cell_list_pairs(np.zeros((1, 3)), 1.0))
+
+@pytest.mark.parametrize("mode", ['any', 'mean'])
+@pytest.mark.parametrize("cutoff", [6.0, 7.0, 9.0])
+def test_screen_matches_brute_force(synthetic_arc, mode, cutoff):
+    residues = load_topology(synthetic_arc).residue_list()
+    coords = load_coordinates(synthetic_arc, use_cache=False)
+    ranges = [np.arange(r[0]['atom_num'] - 1, r[-1]['atom_num']) for r in residues[1:]]
+
+    expected = set()
+    for i in range(len(ranges)):
+        for j in range(i + 1, len(ranges)):
+            xi, xj = coords[:, ranges[i]], coords[:, ranges[j]]
+            if mode == 'any':
+                close = np.linalg.norm(xi[:, :, None] - xj[:, None, :], axis=3).min() <= cutoff
+            else:
+                close = np.linalg.norm(xi.mean(axis=1) - xj.mean(axis=1), axis=1).mean() <= cutoff
+            if close:
+                expected.add((i + 1, j + 1))
+
+    assert screen_pairs(synthetic_arc, residues, cutoff, mode=mode, chunk=4) == expected
+
+def test_unknown_mode(synthetic_arc):
+    with pytest.raises(ValueError):
+        screen_pairs(synthetic_arc, load_topology(synthetic_arc).residue_list(), 5.0, mode='median')
@@ -0,0 +1,33 @@
+import pytest
+
+import new_main
+from conftest import N_RESIDUES
+from read_sep_arc import reference_pairs, run_reference_batch
+
+def test_reference_pairs():
+    assert reference_pairs([2], 5) == {(1, 2), (2, 3), (2, 4)}
+    assert reference_pairs([1, 3], 4) == {(1, 2), (1, 3), (2, 3)}
+
+def read_profile(path):
+    with open(path) as file:
+        lines = file.read().splitlines()[2:]
+    return {int(line.split()[1]): float(line.split()[2]) for line in lines}
+
+def test_profiles_match_the_all_pairs_run(synthetic_arc, stub_tinker, tmp_path):
+    paths = run_reference_batch(synthetic_arc, stub_tinker, [2, 5], workers=2, output_dir=str(tmp_path / "profiles"),
+                                max_batch=3)
+    assert [p.rsplit("/", 1)[1] for p in paths] == ["profile_res2.txt", "profile_res5.txt"]
+
+    _, _, residues = new_main.open_trajectory(synthetic_arc)
+    everything = new_main.archive_sep_pair(residues, stub_tinker, extractor='native')
+    for ref, path in zip([2, 5], paths):
+        profile = read_profile(path)
+        assert sorted(profile) == [k for k in range(1, N_RESIDUES + 1) if k != ref]
+        assert list(profile.values()) == sorted(profile.values())  # Strongest (most negative) first
+        for partner, mean in profile.items():
+            stats = everything[(min(ref, partner), max(ref, partner))]["Intermolecular Energy"]
+            assert mean == pytest.approx(stats.mean, abs=0.006)
+
+def test_invalid_reference(synthetic_arc, stub_tinker, tmp_path, capsys):
+    assert run_reference_batch(synthetic_arc, stub_tinker, [0, N_RESIDUES + 1], output_dir=str(tmp_path)) == []
+    assert "Invalid reference residues" in capsys.readouterr().out
@@ -0,0 +1,66 @@
+import new_main
+from arc_index import load_frame_index
+from result_cache import ResultCache
+from stats import RunningStats
+
+def rewrite_frame(arc_file, k):
+    """Changes one coordinate digit of frame k (0-indexed) without changing the file size."""
+    index = load_frame_index(arc_file)
+    try:
+        start = index.offsets[k]
+    finally:
+        index.close()
+    with open(arc_file, 'r+b') as file:
+        data = bytearray(file.read())
+        position = data.index(b".", start) + 1
+        data[position] = ord('9') if data[position] != ord('9') else ord('8')
+        file.seek(0)
+        file.write(data)
+
+def test_key_covers_the_pair_frames_and_extractor(synthetic_arc, stub_tinker, tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), synthetic_arc, stub_tinker)
+    key = cache.key((1, 7), (15, 21), (1, 6, 1))
+    assert key == cache.key([1, 7], [15, 21], [1, 6, 1])
+    others = [cache.key((1, 7), (22, 28), (1, 6, 1)),
+              cache.key((1, 7), (15, 21), (1, 6, 2)),
+              cache.key((1, 7), (15, 21), (1, 6, 1), extractor='native'),
+              cache.key((1, 7), (15, 21), (1, 6, 1), sampling={'stride': 2})]
+    assert len({key, *others}) == 5
+
+    with open(stub_tinker, 'a') as file:
+        file.write("vdwtype LENNARD-JONES\n")
+    assert ResultCache(str(tmp_path / "cache"), synthetic_arc, stub_tinker).key((1, 7), (15, 21), (1, 6, 1)) != key
+
+def test_key_follows_the_frames_in_range(synthetic_arc, stub_tinker, tmp_path):
+    def keys():
+        cache = ResultCache(str(tmp_path / "cache"), synthetic_arc, stub_tinker)
+        return cache.key((1, 7), (15, 21), (1, 3, 1)), cache.key((1, 7), (15, 21), (4, 6, 1))
+
+    first_half, second_half = keys()
+    rewrite_frame(synthetic_arc, 4)  # Frame 5 in the 1-indexed ranges
+    assert keys() == (first_half, keys()[1])
+    assert keys()[1] != second_half
+
+def test_put_and_get(synthetic_arc, stub_tinker, tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), synthetic_arc, stub_tinker)
+    key = cache.key((1, 7), (15, 21), (1, 6, 1))
+    assert cache.get(key) is None
+    cache.put(key, 1, 3, {"Intermolecular Energy": RunningStats(6, -1.5, 0.3)})
+    stats = cache.get(key)["Intermolecular Energy"]
+    assert (stats.count, stats.mean, stats.m2) == (6, -1.5, 0.3)
+
+def test_rerun_takes_every_pair_from_the_cache(synthetic_arc, stub_tinker, tmp_path, capsys):
+    _, _, residues = new_main.open_trajectory(synthetic_arc, binary_cache=False)
+    cache_dir = str(tmp_path / "cache")
+    first = new_main.archive_sep_pair(residues, stub_tinker, cache_dir=cache_dir)
+    assert len(first) == 15
+    with open("energy_analysis.txt") as file:
+        written = file.read()
+
+    capsys.readouterr()
+    second = new_main.archive_sep_pair(residues, stub_tinker, cache_dir=cache_dir)
+    assert "15 pairs were found in the cache, 0 left to evaluate." in capsys.readouterr().out
+    assert {pair: {c: s.to_dict() for c, s in components.items()} for pair, components in second.items()} == \
+        {pair: {c: s.to_dict() for c, s in components.items()} for pair, components in first.items()}
+    with open("energy_analysis.txt") as file:
+        assert sorted(file.read().splitlines()) == sorted(written.splitlines())
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import new_main
+from conftest import N_FRAMES
+from energy_parser import EnergySeriesStore
+from sampling import BlockConvergence, block_offsets
+from stats import RunningStats
+
+@pytest.mark.parametrize("stride", [1, 2, 3, 5, 8, 13])
+def test_block_offsets_cover_every_offset_once(stride):
+    offsets = block_offsets(stride)
+    assert sorted(offsets) == list(range(stride))
+    assert offsets[0] == 0
+
+def test_block_offsets_are_bit_reversed():
+    assert block_offsets(8) == [0, 4, 2, 6, 1, 5, 3, 7]
+
+def blocks(means):
+    monitor = BlockConvergence(se_threshold=0.1, strength_cutoff=1.0, min_blocks=3)
+    reasons = []
+    for mean in means:
+        monitor.add_block(RunningStats(10, mean, 0.0))
+        reasons.append(monitor.stop_reason())
+    return monitor, reasons
+
+def test_standard_error_of_the_block_means():
+    means = [-5.0, -5.3, -4.8, -5.1]
+    monitor, _ = blocks(means)
+    assert monitor.standard_error == pytest.approx(np.std(means, ddof=1) / np.sqrt(len(means)))
+    assert BlockConvergence().standard_error == float('inf')
+
+def test_stop_reasons():
+    assert blocks([-5.0, -5.01, -5.02])[1] == [None, None, 'converged']
+    assert blocks([-0.1, 0.3, -0.2])[1] == [None, None, 'weak']
+    assert blocks([-5.0, 5.0, -3.0, 8.0])[1] == [None, None, None, None]
+
+def test_adaptive_run_stops_after_the_first_blocks(synthetic_arc, stub_tinker, tmp_path, capsys):
+    _, _, residues = new_main.open_trajectory(synthetic_arc, binary_cache=False)
+    new_main.archive_sep_pair(residues, stub_tinker, pairs={(1, 2)}, series_dir=str(tmp_path / "series"))
+    series = EnergySeriesStore(str(tmp_path / "series")).load(1, 2, "Intermolecular Energy").astype(np.float64)
+
+    # One frame per block, a huge se_threshold stops after min_blocks blocks: frames 1, 5 and 3
+    adaptive = new_main.archive_sep_pair(residues, stub_tinker, pairs={(1, 2)}, sampling_stride=N_FRAMES,
+                                         se_threshold=1e6)
+    assert "Pair 1 - 2: 3 frames evaluated (converged" in capsys.readouterr().out
+    stats = adaptive[(1, 2)]["Intermolecular Energy"]
+    assert stats.count == 3
+    assert stats.mean == pytest.approx(series[[0, 4, 2]].mean(), abs=1e-3)
@@ -0,0 +1,68 @@
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pytest
+
+from scheduler import CostModel, run_scheduled, task_features
+
+def make_task(k, frames, atoms1, atoms2, gap=0, extractor='archive'):
+    return {'id': k, 'frames': (1, frames, 1), 'res1': (0, atoms1 - 1),
+            'res2': (atoms1 + gap, atoms1 + gap + atoms2 - 1), 'extractor': extractor}
+
+def make_tasks(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return [make_task(k, int(rng.integers(1, 50)), int(rng.integers(5, 30)), int(rng.integers(5, 30)),
+                      gap=int(rng.integers(0, 2)) * 10) for k in range(n)]
+
+def test_task_features():
+    assert list(task_features(make_task(0, 10, 4, 6))) == [1.0, 10.0, 100.0, 1000.0, 0.0]
+    assert task_features(make_task(0, 10, 4, 6, gap=3))[4] == 10.0
+    assert task_features(make_task(0, 10, 4, 6, gap=3, extractor='native'))[4] == 0.0
+    task = make_task(0, 10, 4, 6)
+    task['frames'] = (3, 10, 4)
+    assert task_features(task)[1] == 2.0
+
+@pytest.mark.parametrize("prior_weight, error", [(0.1, 0.02), (1e-6, 1e-5)])
+def test_cost_model_learns_linear_times(prior_weight, error):
+    tasks = make_tasks()
+    truth = np.array([0.5, 0.01, 2e-3, 1e-5, 0.05])
+    model = CostModel(tasks, prior_weight)
+    # Before any measurement the tasks are ranked by the cost of analyze
+    order = sorted(tasks, key=model.predict)
+    assert [task_features(t)[3] for t in order] == sorted(task_features(t)[3] for t in tasks)
+
+    refits = [model.update(task, float(task_features(task) @ truth)) for task in tasks * 4]
+    assert [k + 1 for k, refit in enumerate(refits) if refit] == [1, 2, 4, 8, 16, 32, 64, 128]
+    # The prior keeps pulling a little, the predictions are right on average
+    relative = [model.predict(task) / float(task_features(task) @ truth) - 1 for task in make_tasks(seed=1)]
+    assert np.mean(np.abs(relative)) < error
+    assert "mean prediction error" in model.summary()
+
+def timed(task):
+    """The task id, and a time proportional to the prior so the order never changes."""
+    return task['id'], float(task_features(task)[3]) * 1e-6
+
+@pytest.mark.parametrize("threads", [0, 1, 3])
+def test_run_scheduled_handles_every_task(threads):
+    tasks = make_tasks()
+    handled = []
+    if threads:
+        with ThreadPool(threads) as pool:
+            run_scheduled(pool, tasks, timed, CostModel(tasks), handled.append, 2 * threads)
+    else:
+        run_scheduled(None, tasks, timed, CostModel(tasks), handled.append, 1)
+    assert sorted(handled) == [task['id'] for task in tasks]
+    if threads <= 1:
+        cost = {task['id']: task_features(task)[3] for task in tasks}
+        assert [cost[k] for k in handled] == sorted(cost.values(), reverse=True)
+
+def test_run_scheduled_raises_task_errors():
+    def fail(task):
+        if task['id'] == 3:
+            raise RuntimeError("task 3 failed")
+        return timed(task)
+
+    tasks = make_tasks(10)
+    with ThreadPool(2) as pool:
+        with pytest.raises(RuntimeError, match="task 3"):
+            run_scheduled(pool, tasks, fail, CostModel(tasks), lambda output: None, 4)
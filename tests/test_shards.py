@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import new_main
+import shards
+from conftest import N_FRAMES, N_RESIDUES
+from stats import RunningStats
+
+def residue_lists(sizes):
+    return [[]] + [[None] * size for size in sizes]
+
+def test_balance_pairs_covers_every_pair_once():
+    residues = residue_lists([5, 12, 7, 30, 9, 14, 3])
+    pairs = [(i, j) for i in range(1, 8) for j in range(i + 1, 8)]
+    parts = shards.balance_pairs(residues, pairs, 4)
+    assert sorted(pair for part in parts for pair in part) == pairs
+    costs = [sum(shards.pair_cost(residues, *pair) for pair in part) for part in parts]
+    assert max(costs) - min(costs) <= max(shards.pair_cost(residues, *pair) for pair in pairs)
+    assert len(shards.balance_pairs(residues, pairs[:2], 4)) == 2
+
+@pytest.fixture
+def queue(synthetic_arc, stub_tinker, tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    shards.init_queue(queue_dir, synthetic_arc, stub_tinker, 3)
+    return queue_dir
+
+def test_claim_and_lease(queue, monkeypatch):
+    assert [shards.claim_shard(queue, "a", lease=None) for _ in range(4)] == [0, 1, 2, None]
+    assert shards.claim_shard(queue, "b", lease=60) is None
+
+    now = shards.time.time()
+    monkeypatch.setattr(shards.time, "time", lambda: now + 120)
+    assert shards.claim_shard(queue, "b", lease=60) == 0
+    assert shards.queue_status(queue) == {'running': 3}
+
+def test_shard_with_failed_pairs_is_tried_again(queue):
+    pairs = [(1, 2), (1, 3)]
+    good = {(1, 2): {"Intermolecular Energy": RunningStats(6, -1.0, 0.5)}}
+    for attempt in range(3):
+        k = shards.claim_shard(queue, "a")
+        assert k == 0
+        status = shards.complete_shard(queue, k, pairs, good, max_attempts=3)
+        assert status == ('pending' if attempt < 2 else 'failed')
+    with shards.locked_state(queue) as state:
+        assert state['shards'][0]['failed'] == [[1, 3]] and state['shards'][0]['attempts'] == 3
+
+    assert shards.complete_shard(queue, 1, pairs, {**good, (1, 3): good[(1, 2)]}) == 'done'
+
+def test_sharded_run_matches_a_single_run(queue, synthetic_arc, stub_tinker, tmp_path):
+    assert shards.run_worker(queue) == 3
+    assert shards.queue_status(queue) == {'done': 3}
+    merged = str(tmp_path / "merged.txt")
+    totals = shards.merge_results(queue, merged, matrix_dir=str(tmp_path / "matrix"))
+    assert totals["Intermolecular Energy"].count == N_RESIDUES * (N_RESIDUES - 1) // 2 * N_FRAMES
+    assert os.path.exists(tmp_path / "matrix")
+
+    _, _, residues = new_main.open_trajectory(synthetic_arc)
+    new_main.archive_sep_pair(residues, stub_tinker, extractor='native')
+    with open("energy_analysis.txt") as single, open(merged) as sharded:
+        assert sorted(single.read().splitlines()) == sorted(sharded.read().splitlines())
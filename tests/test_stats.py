@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from stats import RunningStats
+
+def pushed(values):
+    stats = RunningStats()
+    for value in values:
+        stats.push(float(value))
+    return stats
+
+def test_push_matches_numpy():
+    values = np.random.default_rng(1).normal(-3.0, 2.0, 500)
+    stats = pushed(values)
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.std == pytest.approx(values.std())  # Population standard deviation, ddof=0
+
+@pytest.mark.parametrize("sizes", [(1, 1), (10, 0), (0, 7), (3, 250, 40, 1), (100, 100, 100)])
+def test_merge_matches_numpy(sizes):
+    values = np.random.default_rng(len(sizes)).normal(50.0, 5.0, sum(sizes))
+    parts = np.split(values, np.cumsum(sizes)[:-1])
+
+    merged = RunningStats()
+    for part in parts:
+        merged.merge(pushed(part))
+    assert merged.count == len(values)
+    assert merged.mean == pytest.approx(values.mean())
+    assert merged.variance == pytest.approx(values.var())
+
+def test_round_trip_through_dict():
+    stats = pushed([1.0, 2.0, 4.0])
+    copy = RunningStats.from_dict(stats.to_dict())
+    assert (copy.count, copy.mean, copy.m2) == (stats.count, stats.mean, stats.m2)
+    assert RunningStats().std == 0.0
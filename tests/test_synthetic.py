@@ -0,0 +1,35 @@
+import subprocess
+
+import pytest
+
+from conftest import frame_texts
+from energy_parser import COLUMN, AnalyzeParser
+from synthetic import build_system, write_arc
+
+def test_system_layout():
+    symbols, types, bonds, coords = build_system(4, atoms_per_residue=6, n_waters=2)
+    assert len(symbols) == len(types) == len(coords) == 4 * 6 + 2 * 3
+    assert symbols[:6] == ['N', 'CA', 'C', 'O', 'H', 'CB']
+    assert (2, 6) in bonds  # Peptide bond C of residue 1 - N of residue 2
+    with pytest.raises(ValueError):
+        build_system(2, atoms_per_residue=4)
+
+def test_trajectory_frames(tmp_path):
+    path = str(tmp_path / "small.arc")
+    n_atoms = write_arc(path, 3, atoms_per_residue=5, n_frames=4)
+    frames = frame_texts(path)
+    assert len(frames) == 4
+    assert all(int(frame[0][0]) == n_atoms == len(frame) - 1 for frame in frames)
+    assert frames[0][1][:2] == ['1', 'N'] and frames[0][1][5:] == ['7', '2', '5']
+    assert write_arc(path, 3, atoms_per_residue=5, n_frames=4) == n_atoms
+    assert frame_texts(path) == frames  # Seeded
+
+def test_stub_analyze_output_is_parsed(tmp_path, stub_tinker):
+    path = str(tmp_path / "small.arc")
+    write_arc(path, 2, atoms_per_residue=5, n_frames=3)
+    output = subprocess.run(["analyze"], input=f"{path}\n{stub_tinker}\nE\n", text=True, check=True,
+                            capture_output=True).stdout
+    parser = AnalyzeParser()
+    rows = [row for row in map(parser.feed, output.splitlines()) if row is not None] + [parser.finish()]
+    assert len(rows) == 3
+    assert all(row[COLUMN["Intermolecular Energy"]] < 0 for row in rows)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from conftest import ATOMS_PER_RESIDUE, N_RESIDUES, N_WATERS
+from topology import Topology, connected_components, load_topology, topology_path
+
+def test_connected_components_label_by_smallest_node():
+    labels = connected_components(7, np.array([4, 1, 2, 6]), np.array([5, 2, 0, 3]))
+    assert list(labels) == [0, 0, 0, 3, 4, 4, 3]
+
+def test_residues_of_the_synthetic_protein(synthetic_arc):
+    topology = load_topology(synthetic_arc)
+    kinds = list(topology.residue_kind)
+    assert kinds == ['protein'] * N_RESIDUES + ['water'] * N_WATERS
+    assert list(topology.residue_chain) == [0] * N_RESIDUES + [-1] * N_WATERS
+
+    residues = topology.residue_list()
+    assert len(residues[0]) == 0
+    assert [len(r) for r in residues[1:]] == [ATOMS_PER_RESIDUE] * N_RESIDUES
+    assert [r[0]['atom_sym'] for r in residues[1:]] == ['N'] * N_RESIDUES
+    assert list(topology.protein_residue_numbers()) == list(range(1, N_RESIDUES + 1))
+    assert len(topology.residue_list(('protein', 'water'))) == N_RESIDUES + N_WATERS + 1
+
+def test_ligands_are_opt_in():
+    # Two residues (N, CA, C, O) joined by a peptide bond, then a three-atom ligand
+    atoms = np.zeros(11, dtype=[('atom_num', np.int32), ('atom_sym', 'U8'), ('atom_type', np.int32),
+                                ('xyz', np.float64, (3,))])
+    atoms['atom_num'] = np.arange(1, 12)
+    atoms['atom_sym'] = ['N', 'CA', 'C', 'O', 'N', 'CA', 'C', 'O', 'C1', 'C2', 'N3']
+    bonds = [(1, 2), (2, 3), (3, 4), (3, 5), (5, 6), (6, 7), (7, 8), (9, 10), (10, 11)]
+    connect = [[] for _ in range(11)]
+    for a, b in bonds:
+        connect[a - 1].append(b)
+        connect[b - 1].append(a)
+    connect_ptr = np.concatenate([[0], np.cumsum([len(c) for c in connect])])
+    topology = Topology.build(atoms, connect_ptr, np.array(sum(connect, []), dtype=np.int32))
+
+    assert list(topology.residue_kind) == ['protein', 'protein', 'ligand']
+    assert len(topology.residue_list()) == 3
+    with_ligands = topology.residue_list(('protein', 'ligand'))
+    assert [list(r['atom_num']) for r in with_ligands[1:]] == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]]
+
+def test_cached_topology_is_rebuilt_after_a_change(synthetic_arc):
+    load_topology(synthetic_arc)
+    with open(topology_path(synthetic_arc), 'rb') as file:
+        stored = file.read()
+    load_topology(synthetic_arc)
+    with open(topology_path(synthetic_arc), 'rb') as file:
+        assert file.read() == stored
+
+    with open(synthetic_arc, 'r+') as file:
+        text = file.read().replace("  H  ", "  HN ", 1)
+        file.seek(0)
+        file.write(text)
+    assert 'HN' in load_topology(synthetic_arc).atoms['atom_sym']
@@ -0,0 +1,50 @@
+import json
+
+import new_main
+from tracing import Tracer
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.stage("analyze", pair=(1, 2)) as span:
+        span.add(read=10)
+    assert tracer.events == []
+
+def test_spans_summary_and_chrome_trace(tmp_path):
+    tracer = Tracer(enabled=True)
+    for pair in [(1, 2), (1, 3)]:
+        with tracer.stage("archive", pair=pair) as span:
+            span.add(read=1000, written=200)
+            span.add(written=50)
+    with tracer.stage("header"):
+        pass
+
+    assert [(e['name'], e['pair'], e['bytes_read'], e['bytes_written']) for e in tracer.events] == \
+        [("archive", (1, 2), 1000, 250), ("archive", (1, 3), 1000, 250), ("header", None, 0, 0)]
+    assert all(e['wall'] >= 0 for e in tracer.events)
+    lines = tracer.summary().splitlines()
+    assert lines[0].split()[:2] == ["Stage", "Count"]
+    assert sorted(line.split()[:2] for line in lines[1:]) == [["archive", "2"], ["header", "1"]]
+
+    tracer.export_chrome(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as file:
+        events = json.load(file)['traceEvents']
+    assert [(e['name'], e['ph'], e['args'].get('pair')) for e in events] == \
+        [("archive", 'X', [1, 2]), ("archive", 'X', [1, 3]), ("header", 'X', None)]
+
+def test_drain_and_merge_move_events():
+    worker, parent = Tracer(enabled=True), Tracer(enabled=True)
+    with worker.stage("analyze", pair=(2, 3)):
+        pass
+    parent.merge(worker.drain())
+    assert worker.events == [] and [e['name'] for e in parent.events] == ["analyze"]
+
+def test_pipeline_trace_covers_every_pair(synthetic_arc, stub_tinker, tmp_path):
+    _, _, residues = new_main.open_trajectory(synthetic_arc, binary_cache=False)
+    trace_file = str(tmp_path / "trace.json")
+    results = new_main.archive_sep_pair(residues, stub_tinker, workers=2, trace_file=trace_file)
+    with open(trace_file) as file:
+        events = json.load(file)['traceEvents']
+    for stage in ("archive", "clean", "analyze", "record"):
+        pairs = sorted(tuple(e['args']['pair']) for e in events if e['name'] == stage)
+        assert pairs == sorted(results), stage
+    assert all(e['args']['bytes_read'] > 0 for e in events if e['name'] in ("archive", "analyze"))
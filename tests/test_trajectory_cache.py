@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+from atom_table import load_coordinates, parse_frame, read_atom_table
+from conftest import N_FRAMES
+from trajectory_cache import convert_trajectory, load_trajectory_cache, read_trajectory_cache
+
+def test_cache_holds_the_trajectory(synthetic_arc):
+    text = load_coordinates(synthetic_arc, use_cache=False)
+    atoms, connect_ptr, connect_idx = read_atom_table(synthetic_arc)
+    assert read_trajectory_cache(synthetic_arc) is None
+
+    cache = convert_trajectory(synthetic_arc, chunk=4)
+    assert len(cache) == N_FRAMES
+    assert cache.coords.dtype == np.float32
+    assert np.allclose(cache.coords, text, atol=1e-5)
+    assert cache.header.split()[0] == str(len(atoms)) and cache.title == "  Synthetic benchmark system"
+    assert cache.boxes is None
+    assert np.array_equal(cache.atoms, atoms)
+    assert np.array_equal(cache.connect_ptr, connect_ptr) and np.array_equal(cache.connect_idx, connect_idx)
+
+    # Readers go through the cache once it is up to date
+    assert load_coordinates(synthetic_arc).dtype == np.float32
+    assert np.allclose(read_atom_table(synthetic_arc, frame=3)[0]['xyz'], text[3], atol=1e-5)
+
+def test_cache_is_rebuilt_after_a_change(synthetic_arc):
+    load_trajectory_cache(synthetic_arc)
+    with open(synthetic_arc, 'a') as file:
+        file.write("\n")
+    assert read_trajectory_cache(synthetic_arc) is None
+    assert load_trajectory_cache(synthetic_arc) is not None
+
+def test_periodic_boxes(tmp_path):
+    path = str(tmp_path / "water.arc")
+    frames = []
+    for k in range(3):
+        frames.append(f"     2  water\n"
+                      f"   {20 + k:.6f}   20.000000   20.000000   90.000000   90.000000   90.000000\n"
+                      f"     1  O      {k:.6f}    0.000000    0.000000   247     2\n"
+                      f"     2  H      {k + 0.96:.6f}    0.000000    0.000000   248     1\n")
+    with open(path, 'w') as file:
+        file.write("".join(frames))
+
+    cache = convert_trajectory(path)
+    assert list(cache.boxes[:, 0]) == [20.0, 21.0, 22.0]
+    assert np.allclose(cache.coords[:, :, 0], [[0.0, 0.96], [1.0, 1.96], [2.0, 2.96]])
+    assert list(cache.atom_table()[0]['atom_sym']) == list(parse_frame(frames[0].encode())[0]['atom_sym'])
+    assert os.path.isdir(f"{path}.bin")
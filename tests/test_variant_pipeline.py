@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from apply_mutations import read_mutation_list, write_variants
+from list_mutformat import process_file
+from variant_pipeline import read_mutation_chunks, run_pipeline, split_table, table_columns
+
+SEQUENCE = "MSLVPATNYIYTPLNQLKGGTIVNVYGVVKFF"
+
+@pytest.fixture
+def table(tmp_path):
+    """A mutation table with extra columns, some malformed and out of range rows."""
+    rng = random.Random(5)
+    rows = ["Gene\tRrefAA\tPP\tAltAA\tScore"]
+    for k in range(300):
+        position = rng.randrange(1, len(SEQUENCE) + 3)
+        original = SEQUENCE[position - 1] if position <= len(SEQUENCE) and k % 17 else "W"
+        rows.append(f"g{k}\t{original}\t{position}\t{rng.choice('ACDEFGHIKLMNPQRSTVWY')}\t{rng.random():.3f}")
+    rows[40] = "g40\tA\tx\tV\t0.1"
+    path = tmp_path / "mutpot.txt"
+    path.write_text("\n".join(rows) + "\n")
+    return str(path)
+
+def test_ranges_cover_every_row_once(table):
+    first_row, columns = table_columns(table)
+    assert columns == [1, 2, 3]
+    whole = [m for chunk in read_mutation_chunks(table, columns, first_row, 10 ** 9, 7) for m in chunk]
+    assert len(whole) == 300
+    for n_parts in (2, 3, 8):
+        parts = [m for start, end in split_table(table, first_row, n_parts)
+                 for chunk in read_mutation_chunks(table, columns, start, end, 11) for m in chunk]
+        assert parts == whole
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("deltas", [False, True])
+def test_pipeline_matches_the_two_step_route(table, tmp_path, workers, deltas):
+    process_file(table, str(tmp_path / "output_file.txt"))
+    expected = str(tmp_path / "expected.fasta")
+    written = write_variants(SEQUENCE, read_mutation_list(str(tmp_path / "output_file.txt")), expected, deltas=deltas)
+
+    output = str(tmp_path / "variants.fasta")
+    rows, count, malformed, out_of_range, mismatched = run_pipeline(table, output, sequence=SEQUENCE, workers=workers,
+                                                                    chunk_size=16, deltas=deltas)
+    assert (rows, count, malformed) == (300, written, 1)
+    assert out_of_range > 0 and mismatched > 0
+    with open(output, 'rb') as a, open(expected, 'rb') as b:
+        assert a.read() == b.read()
+
+def test_missing_columns(tmp_path):
+    path = tmp_path / "bad.txt"
+    path.write_text("Ref\tPos\tAlt\nA\t1\tV\n")
+    with pytest.raises(ValueError):
+        table_columns(str(path))
@@ -0,0 +1,173 @@
+import hashlib
+import os
+
+import numpy as np
+
+from arc_index import load_frame_index
+from atom_table import parse_frame
+
+def topology_path(arc_file):
+    """Returns the path of the topology cache stored next to the arc file."""
+    return f"{arc_file}.topo.npz"
+
+def connected_components(n, a, b):
+    """
+    Labels the connected components of a graph with n nodes and edges (a, b).
+
+    Every node gets the smallest node index of its component. Roots are hooked
+    to the smallest neighbouring label and then pointer jumping flattens the
+    trees, so only O(log n) vectorized rounds are needed.
+    """
+    labels = np.arange(n)
+    while True:
+        la, lb = labels[a], labels[b]
+        low = np.minimum(la, lb)
+        hooked = labels.copy()
+        np.minimum.at(hooked, la, low)
+        np.minimum.at(hooked, lb, low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+class Topology:
+    """
+    Residues, chains and non-protein groups of a TINKER system.
+
+    Residues are the groups of atoms left connected once the peptide bonds
+    (C-N) and disulfide bonds (SG-SG) are removed. Every residue has a
+    (start, stop) atom index range, a kind ('protein', 'cap', 'water', 'ion'
+    or 'ligand') and a chain number (-1 for non-protein groups).
+    """
+
+    def __init__(self, atoms, connect_ptr, connect_idx, residue_start, residue_stop, residue_kind, residue_chain):
+        self.atoms = atoms
+        self.connect_ptr = connect_ptr
+        self.connect_idx = connect_idx
+        self.residue_start = residue_start
+        self.residue_stop = residue_stop
+        self.residue_kind = residue_kind
+        self.residue_chain = residue_chain
+
+    def __len__(self):
+        return len(self.residue_start)
+
+    @classmethod
+    def build(cls, atoms, connect_ptr, connect_idx):
+        n = len(atoms)
+        sym = atoms['atom_sym']
+        src = np.repeat(np.arange(n), np.diff(connect_ptr))
+        dst = connect_idx.astype(np.int64) - 1
+        keep = src < dst
+        src, dst = src[keep], dst[keep]
+
+        peptide = ((sym[src] == 'C') & (sym[dst] == 'N')) | ((sym[src] == 'N') & (sym[dst] == 'C'))
+        disulfide = (sym[src] == 'SG') & (sym[dst] == 'SG')
+        inside = ~(peptide | disulfide)
+        atom_group = connected_components(n, src[inside], dst[inside])
+        atom_chain = connected_components(n, src[~disulfide], dst[~disulfide])
+
+        # Components are labelled by their first atom, so sorting the labels orders the residues
+        groups, group_of_atom, sizes = np.unique(atom_group, return_inverse=True, return_counts=True)
+        stops = np.zeros(len(groups), dtype=np.int64)
+        np.maximum.at(stops, group_of_atom, np.arange(n) + 1)
+        if np.any(stops - groups != sizes):
+            print("Warning: Some residues are not contiguous in the atom list, their ranges include other atoms.")
+
+        def has(name):
+            found = np.zeros(len(groups), dtype=bool)
+            found[group_of_atom[sym == name]] = True
+            return found
+
+        count_o = np.bincount(group_of_atom, weights=np.char.startswith(sym, 'O'), minlength=len(groups))
+        count_h = np.bincount(group_of_atom, weights=np.char.startswith(sym, 'H'), minlength=len(groups))
+        bonded_by_peptide = np.zeros(len(groups), dtype=bool)
+        bonded_by_peptide[group_of_atom[src[peptide]]] = True
+        bonded_by_peptide[group_of_atom[dst[peptide]]] = True
+
+        kind = np.full(len(groups), 'ligand', dtype='U8')
+        kind[sizes == 1] = 'ion'
+        kind[(sizes == 3) & (count_o == 1) & (count_h == 2)] = 'water'
+        kind[bonded_by_peptide] = 'cap'
+        kind[has('N') & has('CA') & has('C')] = 'protein'
+
+        # Chains are numbered in atom order among the chains that hold protein residues
+        group_chain = atom_chain[groups]
+        protein_chains = np.unique(group_chain[kind == 'protein'])
+        chain = np.searchsorted(protein_chains, group_chain)
+        chain[~np.isin(group_chain, protein_chains)] = -1
+        return cls(atoms, connect_ptr, connect_idx, groups.astype(np.int64), stops, kind, chain)
+
+    def residue_list(self, kinds=('protein',)):
+        """
+        Returns the residues of the given kinds as views of the atom table.
+
+        residues[0] is an empty placeholder, so the residues are numbered from 1
+        like the N, CA, C based residue lists the pair loops were written for.
+        Only the protein residues are returned by default, the residues the
+        pair loops always had; adding 'ligand' to kinds also pairs the ligands
+        and renumbers the residues after them.
+        """
+        selected = np.flatnonzero(np.isin(self.residue_kind, kinds))
+        return [self.atoms[:0]] + [self.atoms[self.residue_start[k]:self.residue_stop[k]] for k in selected]
+
+    def protein_residue_numbers(self, kinds=('protein',)):
+        """
+        Returns the numbers, in residue_list(kinds), of the protein residues in
+        atom order, so entry k is the residue at sequence position k + 1 when
+        the structure starts at the first residue of the sequence.
+        """
+        selected = np.flatnonzero(np.isin(self.residue_kind, kinds))
+        return np.flatnonzero(self.residue_kind[selected] == 'protein') + 1
+
+    def summary(self):
+        kinds, counts = np.unique(self.residue_kind, return_counts=True)
+        n_chains = len(np.unique(self.residue_chain[self.residue_chain >= 0]))
+        groups = ", ".join(f"{count} {kind}" for kind, count in zip(kinds, counts))
+        return f"{len(self.atoms)} atoms, {n_chains} chains, {groups}"
+
+    def save(self, path, key):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, key=np.array(key), atoms=self.atoms, connect_ptr=self.connect_ptr,
+                 connect_idx=self.connect_idx, residue_start=self.residue_start, residue_stop=self.residue_stop,
+                 residue_kind=self.residue_kind, residue_chain=self.residue_chain)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """Loads a cached topology, returns None when it is missing or was built from another file."""
+        try:
+            with np.load(path) as data:
+                if str(data['key']) != key:
+                    return None
+                return cls(data['atoms'], data['connect_ptr'], data['connect_idx'], data['residue_start'],
+                           data['residue_stop'], data['residue_kind'], data['residue_chain'])
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            return None
+
+def load_topology(arc_file):
+    """
+    Returns the topology of the first frame of the arc file.
+
+    The topology is cached next to the trajectory, keyed by the SHA-256 of the
+    first frame, and only rebuilt when that frame changes.
+    """
+    index = load_frame_index(arc_file)
+    try:
+        first_frame = index.frame_bytes(0)
+    finally:
+        index.close()
+    key = hashlib.sha256(first_frame).hexdigest()
+    path = topology_path(arc_file)
+    topology = Topology.load(path, key)
+    if topology is None:
+        topology = Topology.build(*parse_frame(first_frame))
+        try:
+            topology.save(path, key)
+        except OSError as e:
+            print(f"Warning: Could not store the topology of {arc_file}. {e}")
+    return topology
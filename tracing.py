@@ -0,0 +1,129 @@
+import json
+import os
+import resource
+import time
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class Span:
+    """One timed stage. bytes_read / bytes_written are filled in by the code being timed."""
+
+    __slots__ = ('tracer', 'name', 'pair', 'bytes_read', 'bytes_written', '_ts', '_wall', '_cpu', '_children')
+
+    def __init__(self, tracer, name, pair):
+        self.tracer = tracer
+        self.name = name
+        self.pair = pair
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add(self, read=0, written=0):
+        self.bytes_read += read
+        self.bytes_written += written
+
+    def __enter__(self):
+        self._ts = time.time_ns() // 1000
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children = _children_cpu()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.events.append({
+            'name': self.name,
+            'pair': self.pair,
+            'pid': os.getpid(),
+            'ts': self._ts,
+            'wall': time.perf_counter() - self._wall,
+            'cpu': time.process_time() - self._cpu,
+            'children_cpu': _children_cpu() - self._children,  # CPU of the TINKER processes reaped in the stage
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+        })
+        return False
+
+class _NullSpan:
+    """Stand-in returned while tracing is disabled, so a stage costs one method call."""
+
+    __slots__ = ()
+
+    def add(self, read=0, written=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Tracer:
+    """
+    Records wall time, CPU time and bytes read/written of every stage of the pipeline.
+
+        with tracer.stage("analyze", pair=(i, j)) as span:
+            ...
+            span.add(read=size)
+
+    The stages of new_main.py are header (frame index), screen and energy
+    screen (pair pre-screens), extract (native extractor, one per batch),
+    archive, clean and analyze (per pair, analyze includes parsing its
+    output) and record (cache and energy_analysis.txt).
+
+    Workers return their events with drain() and the parent collects them
+    with merge(), so one trace covers the whole pool.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+
+    def stage(self, name, pair=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, pair)
+
+    def drain(self):
+        events, self.events = self.events, []
+        return events
+
+    def merge(self, events):
+        self.events.extend(events)
+
+    def summary(self):
+        """Returns a table with the totals of every stage."""
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event['name'], [0, 0.0, 0.0, 0.0, 0, 0])
+            total[0] += 1
+            total[1] += event['wall']
+            total[2] += event['cpu']
+            total[3] += event['children_cpu']
+            total[4] += event['bytes_read']
+            total[5] += event['bytes_written']
+        lines = [f"{'Stage':<12} {'Count':>8} {'Wall s':>10} {'Mean ms':>9} {'CPU s':>9} {'Child CPU s':>11} {'MB read':>9} {'MB written':>10}"]
+        for name, (count, wall, cpu, children_cpu, read, written) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<12} {count:>8} {wall:>10.3f} {1000 * wall / count:>9.2f} {cpu:>9.3f} "
+                         f"{children_cpu:>11.3f} {read / 1e6:>9.2f} {written / 1e6:>10.2f}")
+        return "\n".join(lines)
+
+    def export_chrome(self, path):
+        """Writes the events as a Chrome trace (chrome://tracing, Perfetto), one row per process."""
+        trace_events = []
+        for event in self.events:
+            args = {key: event[key] for key in ('cpu', 'children_cpu', 'bytes_read', 'bytes_written')}
+            if event['pair'] is not None:
+                args['pair'] = list(event['pair'])
+            trace_events.append({
+                'name': event['name'], 'cat': 'eda', 'ph': 'X',
+                'ts': event['ts'], 'dur': int(event['wall'] * 1e6),
+                'pid': event['pid'], 'tid': event['pid'], 'args': args,
+            })
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+
+# Tracer of this process, disabled unless a trace file is requested
+tracer = Tracer()
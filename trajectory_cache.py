@@ -0,0 +1,149 @@
+"""
+Binary copy of a TINKER ARC trajectory, built once and read memory-mapped afterwards.
+
+The cache is the directory <arc>.bin next to the trajectory:
+    coords.npy  float32 coordinates, shape (n_frames, n_atoms, 3)
+    table.npz   atom table and connectivity of the first frame, periodic boxes
+                of every frame and the frame offsets of the text file
+    meta.json   size and mtime of the arc file it was built from, header line,
+                title, atom and frame counts (written last)
+
+    python trajectory_cache.py EDA-test/test.arc
+"""
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from arc_index import load_frame_index
+
+def cache_path(arc_file):
+    """Returns the path of the binary cache stored next to the arc file."""
+    return f"{arc_file}.bin"
+
+class TrajectoryCache:
+    """
+    Coordinates, atoms, connectivity and boxes of a trajectory read from its binary cache.
+
+    coords is memory-mapped, so coords[k] only reads the 12 * n_atoms bytes
+    of frame k. boxes is None when the trajectory has no box lines.
+    """
+
+    def __init__(self, arc_file, meta, coords, atoms, connect_ptr, connect_idx, boxes, offsets):
+        self.arc_file = arc_file
+        self.meta = meta
+        self.coords = coords
+        self.atoms = atoms
+        self.connect_ptr = connect_ptr
+        self.connect_idx = connect_idx
+        self.boxes = boxes
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def header(self):
+        return self.meta['header']
+
+    @property
+    def title(self):
+        return self.meta['title']
+
+    def atom_table(self, frame=0):
+        """Returns (atoms, connect_ptr, connect_idx) like atom_table.parse_frame, with the coordinates of frame."""
+        atoms = self.atoms.copy()
+        if frame != 0:  # The table already holds the exact coordinates of the first frame
+            atoms['xyz'] = self.coords[frame]
+        return atoms, self.connect_ptr, self.connect_idx
+
+def convert_trajectory(arc_file, chunk=256):
+    """
+    Builds the binary cache of an arc file, chunk frames at a time, and returns it.
+
+    Coordinates are stored as float32, which keeps about 7 significant digits
+    (a few 1e-6 Angstrom for coordinates below 100).
+    """
+    # Imported here because atom_table reads through this module
+    from atom_table import is_box_line, load_coordinates, parse_frame
+
+    index = load_frame_index(arc_file)
+    try:
+        first_frame = index.frame_bytes(0)
+        atoms, connect_ptr, connect_idx = parse_frame(first_frame)
+        lines = first_frame.split(b"\n")
+        header = lines[0].decode().strip()
+        title = header.split(None, 1)
+        has_box = len(lines) > 1 and bool(lines[1].split()) and is_box_line(lines[1].split())
+        n_frames = len(index)
+        boxes = np.zeros((n_frames if has_box else 0, 6), dtype=np.float64)
+        if has_box:
+            for k in range(n_frames):
+                frame = index.frame_bytes(k)
+                start = frame.index(b"\n") + 1
+                boxes[k] = [float(value) for value in frame[start:frame.index(b"\n", start)].split()[:6]]
+        offsets = np.frombuffer(index.offsets, dtype=np.int64).copy()
+    finally:
+        index.close()
+
+    directory = cache_path(arc_file)
+    tmp_directory = f"{directory}.tmp{os.getpid()}"
+    os.makedirs(tmp_directory)
+    try:
+        coords = np.lib.format.open_memmap(os.path.join(tmp_directory, "coords.npy"), mode='w+', dtype=np.float32,
+                                           shape=(n_frames, len(atoms), 3))
+        for first in range(0, n_frames, chunk):
+            frames = range(first, min(first + chunk, n_frames))
+            coords[first:first + len(frames)] = load_coordinates(arc_file, frames=frames, use_cache=False)
+        coords.flush()
+        del coords
+        np.savez(os.path.join(tmp_directory, "table.npz"), atoms=atoms, connect_ptr=connect_ptr,
+                 connect_idx=connect_idx, boxes=boxes, offsets=offsets)
+        stat = os.stat(arc_file)
+        meta = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'header': header,
+                'title': f"  {title[1]}" if len(title) > 1 else "", 'n_atoms': len(atoms), 'n_frames': n_frames,
+                'box': bool(has_box)}
+        with open(os.path.join(tmp_directory, "meta.json"), 'w') as file:
+            json.dump(meta, file)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+    except BaseException:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        raise
+    return read_trajectory_cache(arc_file)
+
+def read_trajectory_cache(arc_file):
+    """Opens the binary cache of an arc file, returns None when it is missing or older than the trajectory."""
+    directory = cache_path(arc_file)
+    try:
+        with open(os.path.join(directory, "meta.json"), 'r') as file:
+            meta = json.load(file)
+        stat = os.stat(arc_file)
+        if meta['size'] != stat.st_size or meta['mtime_ns'] != stat.st_mtime_ns:
+            return None
+        coords = np.load(os.path.join(directory, "coords.npy"), mmap_mode='r')
+        with np.load(os.path.join(directory, "table.npz")) as table:
+            boxes = table['boxes'] if meta['box'] else None
+            return TrajectoryCache(arc_file, meta, coords, table['atoms'], table['connect_ptr'], table['connect_idx'],
+                                   boxes, table['offsets'])
+    except (FileNotFoundError, NotADirectoryError, ValueError, KeyError, OSError):
+        return None
+
+def load_trajectory_cache(arc_file):
+    """Returns the binary cache of the arc file, converting the trajectory on first use."""
+    cache = read_trajectory_cache(arc_file)
+    if cache is None:
+        try:
+            cache = convert_trajectory(arc_file)
+        except OSError as e:
+            print(f"Warning: Could not store the binary cache for {arc_file}. {e}")
+    return cache
+
+if __name__ == '__main__':
+    for arc_file in sys.argv[1:]:
+        cache = convert_trajectory(arc_file)
+        size = sum(os.path.getsize(os.path.join(cache_path(arc_file), name)) for name in os.listdir(cache_path(arc_file)))
+        print(f"{arc_file}: {len(cache)} frames of {cache.meta['n_atoms']} atoms, "
+              f"{os.path.getsize(arc_file) / 1e6:.1f} MB of text -> {size / 1e6:.1f} MB in {cache_path(arc_file)}")
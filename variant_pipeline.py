@@ -0,0 +1,130 @@
+"""
+Streams a tab-delimited mutation table (RrefAA, PP, AltAA columns, like
+mutpot1.txt) straight to mutated sequences, without the intermediate
+output_file.txt and without holding the table in memory.
+
+    python variant_pipeline.py mutpot1.txt mutated_sequences.fasta --workers 4
+"""
+import argparse
+import csv
+import os
+import shutil
+from multiprocessing import Pool
+
+import numpy as np
+
+from apply_mutations import parse_mutations, protein_sequence, validate_mutations, write_variant_records
+from list_mutformat import MUTATION_COLUMNS
+
+def table_columns(table_file):
+    """Returns the byte offset of the first row and the indices of the mutation columns."""
+    with open(table_file, 'rb') as infile:
+        header = infile.readline()
+        fields = next(csv.reader([header.decode()], delimiter='\t'))
+        try:
+            columns = [fields.index(column) for column in MUTATION_COLUMNS]
+        except ValueError:
+            raise ValueError(f"{table_file} needs the columns {', '.join(MUTATION_COLUMNS)}, found {', '.join(fields)}.")
+        return infile.tell(), columns
+
+def split_table(table_file, first_row, n_parts):
+    """Splits the rows of the table into n_parts byte ranges of about the same size."""
+    size = os.path.getsize(table_file)
+    bounds = np.linspace(first_row, size, n_parts + 1).astype(np.int64)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def read_mutation_chunks(table_file, columns, start, end, chunk_size):
+    """
+    Yields the mutation strings of the rows that start in the byte range [start, end), chunk_size at a time.
+
+    A row that crosses start belongs to the previous range, so the ranges of
+    split_table cover every row exactly once.
+    """
+    with open(table_file, 'rb') as infile:
+        if start > 0:
+            infile.seek(start - 1)
+            infile.readline()  # Rest of the row that started in the previous range
+        else:
+            infile.seek(start)
+        chunk = []
+        position = infile.tell()
+        while position < end:
+            line = infile.readline()
+            if not line:
+                break
+            position += len(line)
+            fields = line.rstrip(b"\r\n").split(b"\t")
+            if len(fields) > max(columns):
+                chunk.append(b"".join(fields[k].strip() for k in columns).decode())
+            else:
+                chunk.append("")  # Counted as malformed
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def process_range(table_file, columns, start, end, sequence, output_file, chunk_size=65536, deltas=False):
+    """
+    Validates and writes the variants of one byte range of the table.
+
+    Returns the counts (rows, written, malformed, out_of_range, mismatched).
+    """
+    wild_type = np.frombuffer(sequence.encode(), dtype=np.uint8)
+    buffer = bytearray(wild_type)
+    counts = np.zeros(5, dtype=np.int64)
+    with open(output_file, 'wb', buffering=1 << 20) as outfile:
+        for chunk in read_mutation_chunks(table_file, columns, start, end, chunk_size):
+            positions, original, new, names = parse_mutations(chunk, report=False)
+            in_range, mismatch = validate_mutations(wild_type, positions, original, names, max_warnings=0)
+            write_variant_records(outfile, buffer, positions, new, names, np.flatnonzero(in_range), deltas)
+            counts += (len(chunk), np.count_nonzero(in_range), len(chunk) - len(names),
+                       np.count_nonzero(~in_range), np.count_nonzero(mismatch))
+    return counts
+
+def _process_part(args):
+    return process_range(*args)
+
+def run_pipeline(table_file, output_file, sequence=protein_sequence, workers=1, chunk_size=65536, deltas=False):
+    """
+    Writes the variants of every row of a mutation table to output_file.
+
+    With workers > 1 the table is split into byte ranges that are processed
+    in parallel into part files, which are then joined in table order.
+    Returns the counts of process_range for the whole table.
+    """
+    first_row, columns = table_columns(table_file)
+    if workers <= 1:
+        counts = process_range(table_file, columns, first_row, os.path.getsize(table_file), sequence, output_file,
+                               chunk_size, deltas)
+    else:
+        parts = split_table(table_file, first_row, workers)
+        part_files = [f"{output_file}.part{k}" for k in range(len(parts))]
+        jobs = [(table_file, columns, start, end, sequence, part_file, chunk_size, deltas)
+                for (start, end), part_file in zip(parts, part_files)]
+        try:
+            with Pool(workers) as pool:
+                counts = sum(pool.map(_process_part, jobs))
+            with open(output_file, 'wb') as outfile:
+                for part_file in part_files:
+                    with open(part_file, 'rb') as infile:
+                        shutil.copyfileobj(infile, outfile, 1 << 20)
+        finally:
+            for part_file in part_files:
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+
+    rows, written, malformed, out_of_range, mismatched = (int(c) for c in counts)
+    print(f"{rows} rows: {written} variants written to {output_file}, {malformed} malformed, "
+          f"{out_of_range} out of range, {mismatched} do not match the wild type.")
+    return counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mutation table to mutated sequences in one streaming pass.")
+    parser.add_argument("table", nargs='?', default='mutpot1.txt', help="Tab-delimited table with RrefAA, PP and AltAA.")
+    parser.add_argument("output", nargs='?', default='mutated_sequences.fasta')
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=65536, help="Rows validated and written at a time.")
+    parser.add_argument("--deltas", action='store_true', help="Write the valid mutations (A12V) instead of full sequences.")
+    args = parser.parse_args()
+    run_pipeline(args.table, args.output, workers=args.workers, chunk_size=args.chunk_size, deltas=args.deltas)